@@ -20,9 +20,25 @@ class MarbleCounter:
         # Keep track of step counts
         self.leftoverStepCtr = 0
 
+        # Every step we've ever seen on the loopback pin since boot. Others (like the elevator's
+        # step verifier) read this, so the pin counter gets folded in here by pollSteps()
+        # rather than being read directly.
+        self.totalStepCtr = 0
+        # Steps pollSteps() has folded in that our marble counting loop hasn't used yet
+        self.unprocessedStepCtr = 0
+
         # Keep track of total marbles vended
         self.marbleCtr = 0
 
+        # How many steps it takes to vend one marble. See asyncTaskCountSteps() for the math.
+        self.stepsPerMarble = 1538
+
+        # All our step counts are in 8 microstep steps, which is what stepsPerMarble is based on.
+        # If the elevator switches the driver to coarser microstepping at speed, each pulse on the
+        # pin is worth more than one of our steps. The elevator tells us how many by setting this,
+        # after calling pollSteps() so the pulses from before the switch get counted at the old value.
+        self.stepMult = 1
+
         self.fileNameMarbleCtr = "marblectr.txt"
 
         # Now, re-read in the marble count from disk
@@ -72,6 +88,20 @@ class MarbleCounter:
             await asyncio.sleep(self.intervalSecsWriteMarbleCtrToDisk) # do every hour
             print("Just wrote marble count to disk. marbleCtr:", self.marbleCtr)
 
+    def pollSteps(self):
+        """Read the loopback pin counter, reset it, and add what we got to totalStepCtr and
+        unprocessedStepCtr. Anyone can call this as often as they like without stealing steps
+        from our marble counting loop. Returns the total step count."""
+
+        newStepsCtr = self.pinCtrObj.count
+        if newStepsCtr > 0:
+            # Immediately reset it so we lose as little step count as possible
+            self.pinCtrObj.reset()
+            newStepsCtr *= self.stepMult
+            self.totalStepCtr += newStepsCtr
+            self.unprocessedStepCtr += newStepsCtr
+        return self.totalStepCtr
+
     async def asyncTaskCountSteps(self): 
         """We create an infinite loop task to watch the pin counter. When we loop,
         we take the newStepsCtr we just got on the pin + the leftoverCtr from the previous 
@@ -82,7 +112,8 @@ class MarbleCounter:
         then reset the pin counter back to zero.
         
         The math to figure out how many steps it takes to launch one marble is:
-        It is 8 microsteps per full step. It takes 200 full steps to do a full rotation of
+        It is 8 microsteps per full step (if the elevator switches to coarser microstepping at
+        speed, pollSteps() scales the pulses back up to 8 microstep steps, see stepMult). It takes 200 full steps to do a full rotation of
         the stepper motor. The pulley is 320mm. It takes 80mm to get one marble launched.
         Thus it takes 1/4 of a turn of the pulley for one
         marble. Thus it takes 50 full steps. So 50*8 = 400 microsteps to get one marble.
@@ -91,13 +122,13 @@ class MarbleCounter:
 
         while True: 
 
-            # Get our latest pin ctr
-            newStepsCtr = self.pinCtrObj.count
+            # Get our latest pin ctr, plus anything someone else's pollSteps() already picked up
+            self.pollSteps()
+            newStepsCtr = self.unprocessedStepCtr
 
             if newStepsCtr > 0:
 
-                # Immediately reset it so we lose as little step count as possible
-                self.pinCtrObj.reset()
+                self.unprocessedStepCtr = 0
 
                 # If we had any leftovers from last time thru loop, add them here
                 # We will reset the new leftoverStepCtr at the end
@@ -118,7 +149,7 @@ class MarbleCounter:
                 # then 18/38 for gear 2 to 3 is 0.47. so 0.55 * 0.47 = 0.26. so for 1 turn in we get a 1/4 turn out which is 4:1 reduction
                 # so it now takes more steps to get 1 marble. the math is 400 / 0.26 = 1538.46, so round to integer
                 # stepsPerMarble = 400
-                stepsPerMarble = 1538
+                stepsPerMarble = self.stepsPerMarble
 
                 # Get integer value of marbles by modding.
                 newIncrementalMarbleCtr = totalStepsCtr // stepsPerMarble  # 50 full steps for one marble * 8 microsteps
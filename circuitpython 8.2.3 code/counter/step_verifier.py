@@ -0,0 +1,110 @@
+import time
+
+class StepVerifier:
+    """IO4 is physically wired to the elevator step pin IO7 so the MarbleCounter can count the
+    steps that really came out of the pin. This class uses that same loopback count to check
+    the elevator's work. Each tick the elevator tells us what frequency it's commanding, we
+    integrate that over time to get how many steps it should have emitted, and compare that
+    with how many steps the loopback counter actually saw.
+
+    If they drift apart by more than a small tolerance we flag a mismatch right away, since
+    that means the pwm glitched (for example a dropped or extra edge while changing frequency).
+    When the run ends we print a commanded vs emitted steps report and keep it in lastReport."""
+
+    def __init__(self, marbleCounter, onMismatchCb=None):
+
+        self.mc = marbleCounter
+        self.onMismatchCb = onMismatchCb
+
+        # How far apart commanded and emitted can be before we call it a mismatch. Some slop is
+        # normal since we only know our tick time, not exactly when the pwm hardware changed
+        # frequency, so allow a fixed number of steps plus a percentage of the run.
+        self.toleranceSteps = 20
+        self.tolerancePct = 0.02
+
+        self.isRunning = False
+        self.commandedSteps = 0.0
+        self.emittedSteps = 0
+        self.mismatchCtr = 0
+        # Worst abs(emitted - commanded) we saw during this run
+        self.maxDiffSteps = 0.0
+        self.lastReport = None
+
+        self._startTotalStepCtr = 0
+        self._startNs = 0
+        self._lastNs = 0
+        self._lastFreq = 0
+        self._isMismatched = False
+
+    def start(self, freq):
+        """Call this right when the motor starts stepping at freq."""
+
+        self._startTotalStepCtr = self.mc.pollSteps()
+        self._startNs = time.monotonic_ns()
+        self._lastNs = self._startNs
+        self._lastFreq = freq
+        self.commandedSteps = 0.0
+        self.emittedSteps = 0
+        self.mismatchCtr = 0
+        self.maxDiffSteps = 0.0
+        self._isMismatched = False
+        self.isRunning = True
+
+    def tick(self, freq):
+        """Call this each time thru the motor loop with the frequency we're stepping at from now
+        on (0 if off). Returns the emitted - commanded difference in steps."""
+
+        if not self.isRunning:
+            return 0
+
+        nowNs = time.monotonic_ns()
+        # Whatever frequency we had since our last tick is what we stepped at over that time
+        self.commandedSteps += self._lastFreq * (nowNs - self._lastNs) / 1000000000
+        self._lastNs = nowNs
+        self._lastFreq = freq
+
+        self.emittedSteps = self.mc.pollSteps() - self._startTotalStepCtr
+        diff = self.emittedSteps - self.commandedSteps
+        if abs(diff) > self.maxDiffSteps:
+            self.maxDiffSteps = abs(diff)
+
+        tolerance = self.toleranceSteps + self.tolerancePct * self.commandedSteps
+        if abs(diff) > tolerance:
+            # Only flag once per excursion so we don't flood the console every tick
+            if not self._isMismatched:
+                self._isMismatched = True
+                self.mismatchCtr += 1
+                print("StepVerifier MISMATCH!!! commanded:", int(self.commandedSteps), "emitted:", self.emittedSteps, "diff:", int(diff), "tolerance:", int(tolerance))
+                if self.onMismatchCb != None:
+                    self.onMismatchCb(diff)
+        else:
+            self._isMismatched = False
+
+        return diff
+
+    def stepsEmitted(self):
+        """Returns how many steps the loopback counter has seen so far this run, read fresh
+        from the counter rather than as of our last tick."""
+        if not self.isRunning:
+            return self.emittedSteps
+        return self.mc.pollSteps() - self._startTotalStepCtr
+
+    def stop(self):
+        """Call this right after the motor stops stepping. Prints and returns the report for the run."""
+
+        if not self.isRunning:
+            return self.lastReport
+
+        self.tick(0)
+        self.isRunning = False
+
+        self.lastReport = {
+            'secs': (self._lastNs - self._startNs) / 1000000000,
+            'commanded': int(self.commandedSteps + 0.5),
+            'emitted': self.emittedSteps,
+            'diff': self.emittedSteps - int(self.commandedSteps + 0.5),
+            'maxDiff': int(self.maxDiffSteps + 0.5),
+            'mismatches': self.mismatchCtr,
+        }
+        print("StepVerifier run report:", self.lastReport)
+        return self.lastReport
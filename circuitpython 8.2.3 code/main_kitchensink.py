@@ -7,6 +7,8 @@
 #   - Button Listener
 #   - Reboot Timer
 #   - Fan
+#   - Auto-Run
+#   - Scoop Sync (with the rocking agitator)
 
 # import sys
 # print("exiting immediately")
@@ -16,11 +18,21 @@ import asyncio
 from button.button import Button 
 # from button_mimic import ButtonMimic 
 from stepper.stepper_tmc2209_pwm import Stepper
+# On the older DRV8825 boards use this instead. Its M0/M1/M2/Sleep/Reset have to be jumpered,
+# since the display and button use those pins (see stepper/board_config.py).
+# from stepper.stepper_drv8825_pwm import Stepper
 from stepper.stepper_tmc2209_pa_pwmagitator import StepperAgitator
+# The rocking flapper agitator, if you set agitatorRocks in Dashboard
+from stepper.stepper_tmc2209_agitator import StepperAgitator as RockingAgitator
+from stepper.scoop_sync import ScoopSync
 import microcontroller
 from display.display import Display
 from display.display_bmp import DisplayBmp
 from counter.counter import MarbleCounter
+from counter.step_verifier import StepVerifier
+from stepper.speed_learner import SpeedLearner
+from stepper.auto_run import AutoRun
+from stepper.agitation_scheduler import AgitationScheduler
 import board 
 from fan.fan import Fan
 
@@ -28,7 +40,7 @@ from fan.fan import Fan
 PINS 
 
 Elevator Stepper Motor
-    In stepper/stepper_tmc2209_pwm.py
+    In stepper/ramp_engine.py
 
     self._pinEnablePin = board.IO5
     self._pinDirPin = board.IO6
@@ -99,15 +111,27 @@ class Dashboard:
         self._stepper = Stepper(onAccelCb=self.onAccelCb, 
                                 onMaxSpeedCb=self.onMaxCb, 
                                 onDecelCb=self.onDecelCb,
-                                onStoppedCb=self.onStoppedCb)
+                                onStoppedCb=self.onStoppedCb,
+                                onFaultCb=self.onFaultCb)
         # self._stepper.freqMax = 300
-        # self._stepper.freqStep = 30
+        # self._stepper.accel = 1200
+        # self._stepper.jerk = 2400
+        # Hold the belt for this many secs after a stop, so a quick press again doesn't wait for
+        # the marbles that fell back down. Off by default, see holdSecs in ramp_engine.py.
+        # self._stepper.holdSecs = 30
         # self._stepper.enable()
 
         # Create stepperAgitator object so we can call agitate on button press/release
-        self._stepperAgitator = StepperAgitator()
-        self._stepperAgitator.freqMax = 300
-        self._stepperAgitator.freqStep = 40
+        # Set agitatorRocks to True if the agitator is the rocking flapper rather than the PWM
+        # spinner. Then ScoopSync (below) times each half swing so it pushes a marble into the
+        # onramp pipe right before a scoop comes by. They use the same pins, so it's one or the other.
+        self.agitatorRocks = False
+        if self.agitatorRocks:
+            self._stepperAgitator = RockingAgitator()
+        else:
+            self._stepperAgitator = StepperAgitator()
+            self._stepperAgitator.freqMax = 300
+            self._stepperAgitator.freqStep = 40
         # self._stepperAgitator.enable()
 
         # Create spin task that spins the main motor to carry the marbles to the top
@@ -118,7 +142,10 @@ class Dashboard:
         # Create a rocking agitator task that helps the marbles drop down
         # into the onramp pipe to the elevator
         # We can just call start/stop to have the rocking commence/end
-        self.agitator_task = asyncio.create_task(self._stepperAgitator.spinAsyncTaskPwm())
+        if self.agitatorRocks:
+            self.agitator_task = asyncio.create_task(self._stepperAgitator.rockAsyncTask())
+        else:
+            self.agitator_task = asyncio.create_task(self._stepperAgitator.spinAsyncTaskPwm())
 
         # DISPLAY AND MARBLE COUNTER
 
@@ -136,6 +163,34 @@ class Dashboard:
         self.mc = MarbleCounter(self.onMarbleCount)
         # self.mc.marbleCtr = 1073741700
 
+        # The elevator probed its pwm calibration before the counter remounted the drive writable,
+        # so its table couldn't be saved then. Save it now so we don't re-probe every boot.
+        self._stepper.calibration.saveIfNeeded()
+
+        # Have the elevator check the steps it commands against the steps the loopback
+        # counter actually sees, so we find out about pwm glitches right away
+        self._stepper.setStepVerifier(StepVerifier(self.mc))
+
+        # Have the elevator learn how fast it can reliably go. It slowly speeds up over clean runs
+        # and backs off on any step mismatch or diag fault. Start from what it learned last boot.
+        # The counter above already remounted the drive writable so the learner can save.
+        # Learning stays off (isLearning) since our Stepper has no tmc, so the driver can't flag a
+        # stall and the learner would never see one. Pass a tmc, call driver.setStallThreshold()
+        # and set isLearning to True to turn it on.
+        self.speedLearner = SpeedLearner(self._stepper)
+        self.speedLearner.load()
+        self._stepper.setSpeedLearner(self.speedLearner)
+
+        # SCOOP SYNC
+
+        # With the rocking agitator, watch where the belt's scoops are from the loopback step
+        # count and trigger each half swing so it finishes right before a scoop passes the pipe.
+        # Tune scoopSync.scoopPhaseOffsetSteps on the wall, since the belt has no home sensor.
+        self.scoopSync = None
+        if self.agitatorRocks:
+            self.scoopSync = ScoopSync(self._stepper, self._stepperAgitator, self.mc)
+            self.scoop_sync_task = asyncio.create_task(self.scoopSync.asyncTaskSyncSwings())
+
         # Generate steps on IO7 as if user is pressing button to move steppers
         # Remember IO4 is physically wired to listen to IO7 to make this test frequency work
         # self.freqGen = self.turnOnTestFrequency()
@@ -159,6 +214,43 @@ class Dashboard:
         self.fan.freqGen.frequency = 300
         self.fan.turnOff()
 
+        # AGITATION SCHEDULER
+
+        # Only run the agitator when the onramp pipe needs marbles, rather than the whole time the
+        # elevator runs. Off for now, since the scheduler's pipe model (supplyPerSec, passivePerSec,
+        # pipeCapacity) hasn't been measured on the wall yet. Tune those, then set this to True.
+        # The scheduler doesn't see marbles, only loopback steps, so it can't tell if it starves
+        # the scoops. Watch its report() on the console for a while after turning it on.
+        self.agitateOnDemand = False
+        self.agitationScheduler = None
+        if not self.agitatorRocks:
+            self.agitationScheduler = AgitationScheduler(self._stepper, self._stepperAgitator, self.mc)
+            # Set what you measured here, like:
+            # self.agitationScheduler.supplyPerSec = 1.5
+            # self.agitationScheduler.passivePerSec = 0.1
+            self.agitation_scheduler_task = asyncio.create_task(self.agitationScheduler.asyncTaskSchedule())
+        elif self.agitateOnDemand:
+            # The scheduler sets the PWM agitator's speed, which the rocking one doesn't have
+            print("Agitate on demand needs the PWM agitator. Turning it off while we rock.")
+            self.agitateOnDemand = False
+
+        # AUTO-RUN
+
+        # Run on our own at a steady number of marbles per minute with nobody at the button,
+        # like at an exhibit. Set autoRunPerMin to the rate you want, or 0 to leave it to the button.
+        # While auto-run is on the button is ignored.
+        self.autoRunPerMin = 0
+        # With the rocking agitator ScoopSync already follows the elevator, so auto-run leaves it be
+        autoRunAgitator = self._stepperAgitator
+        if self.agitatorRocks:
+            autoRunAgitator = None
+        self.autoRun = AutoRun(self._stepper, autoRunAgitator, self.mc, self.startMotors, self.stopMotors)
+        if self.agitateOnDemand:
+            self.autoRun.setAgitationScheduler(self.agitationScheduler)
+        self.auto_run_task = asyncio.create_task(self.autoRun.asyncTaskAutoRun())
+        if self.autoRunPerMin > 0:
+            self.autoRun.start(self.autoRunPerMin)
+
         # Create an async timer that reboots the ESP32-S2 every 8 hours
         # self.reboot_timer_task = asyncio.create_task(self.rebootTimer(60))  # 1 minute for testing
         self.reboot_timer_task = asyncio.create_task(self.rebootTimer(60*60*8)) # 8 hours
@@ -177,24 +269,48 @@ class Dashboard:
         self._stepperAgitator.disable()
 
     def onPressCb(self):
+        if self.autoRun.isOn:
+            print("Got onPress. Ignoring since auto-run is on.")
+            return
         print("Got onPress. Spinning motor.")
+        self.startMotors()
+
+    def onReleaseCb(self):
+        if self.autoRun.isOn:
+            print("Got onRelease. Ignoring since auto-run is on.")
+            return
+        print("Got onRelease. Stopping motor.")
+        self.stopMotors()
 
+    def startMotors(self):
         # Enable the power to the steppers
         # self._stepper.enable()
-        self._stepperAgitator.enable()
 
         # start spinning
         self._stepper.spinAsyncStart()
-        self._stepperAgitator.spinAsyncStart()
+        if self.agitatorRocks:
+            # ScoopSync triggers each half swing once we're rocking
+            self._stepperAgitator.enable()
+            self._stepperAgitator.rockAsyncStart()
+        elif self.agitateOnDemand:
+            # The scheduler turns the agitator on and off as the pipe needs it
+            self.agitationScheduler.start()
+        else:
+            self._stepperAgitator.enable()
+            self._stepperAgitator.spinAsyncStart()
 
         # Turn on the fan to cool the stepper drivers
         self.fan.turnOn()
 
-    def onReleaseCb(self):
-        print("Got onRelease. Stopping motor.")
+    def stopMotors(self):
         # stop spinning
         self._stepper.spinAsyncStop()
-        self._stepperAgitator.spinAsyncStop()
+        if self.agitatorRocks:
+            self._stepperAgitator.rockAsyncStop()
+        elif self.agitateOnDemand:
+            self.agitationScheduler.stop()
+        else:
+            self._stepperAgitator.spinAsyncStop()
         # self._stepper.disable()
 
     def onMarbleCount(self, ctr):
@@ -229,6 +345,15 @@ class Dashboard:
         # This is our callback we get from the elevator motor when it starts decelerating
         self.dbmp.showDecel()
 
+    def onFaultCb(self):
+        # This is our callback we get from the elevator motor when its diag pin faults
+        # and it stopped the motor. Stop the agitator too, since the belt isn't taking marbles.
+        # Auto-run does that itself, and starts them both back up after a bit.
+        if self.autoRun.isOn:
+            self.autoRun.onFault()
+        else:
+            self.stopMotors()
+
     def onStoppedCb(self):
         # This is our callback we get from the elevator motor when it stops moving
         self.dbmp.showSplashScreensAgain()
@@ -258,7 +383,7 @@ async def main():
 
     # reboot_task = asyncio.create_task(d.rebootTimer(10))
 
-    await asyncio.gather(
+    tasks = [
         d.marble_count_task, 
         d.display_task,
         d.write_marblectr_todisk_task, 
@@ -266,8 +391,15 @@ async def main():
         d.elevator_task, 
         d.agitator_task,
         d.reboot_timer_task,
-        d.ww_task
-        )  # Don't forget the await!
+        d.ww_task,
+        d.auto_run_task,
+        ]
+    if d.agitationScheduler != None:
+        tasks.append(d.agitation_scheduler_task)
+    if d.scoopSync != None:
+        tasks.append(d.scoop_sync_task)
+
+    await asyncio.gather(*tasks)  # Don't forget the await!
 
     d.deinit()
     
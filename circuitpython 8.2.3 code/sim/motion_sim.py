@@ -0,0 +1,455 @@
+# Host side simulator for the elevator and agitator ramps
+# This runs on a normal computer with NumPy, not on the ESP32-S2. Run it from the
+# "circuitpython 8.2.3 code" folder like:
+#
+#   python sim/motion_sim.py
+#
+# It replays the same state machine as RampEngine.spinAsyncTaskPwm() in
+# stepper/ramp_engine.py and StepperAgitator.spinAsyncTaskPwm() in
+# stepper/stepper_tmc2209_pa_pwmagitator.py, but does it for thousands of button
+# press/release scenarios at once by keeping each scenario in its own row of a NumPy
+# array and working out each stretch between button presses in one go. That way you can try
+# out freqMax/accel/jerk/freqStep settings without flashing the board and watching the wall. The elevator includes the scoop
+# aligned stop and the hold window after it, so the stops and restarts match the wall too.
+
+import bisect
+import os
+import sys
+import time
+
+import numpy as np
+
+# Let us import the real ramp table code from the stepper folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stepper.motion_profile import MotionProfile
+
+# Same values as StepperState in ramp_engine.py
+ACCELERATING = 1
+MAXSPEED = 2
+DECELERATING = 3
+STOPPED = 4
+
+# Same as the counter. See MarbleCounter.asyncTaskCountSteps() for the gearing math.
+STEPS_PER_MARBLE = 1538
+
+def pressTimeline(presses, durationSecs, tickSecs=0.01):
+    """Turn a list of scenarios, each a list of (pressSecs, releaseSecs) pairs, into a
+    boolean array of shape (scenarios, ticks) that is True while the button is held."""
+
+    ticks = int(np.ceil(durationSecs / tickSecs))
+    t = np.arange(ticks) * tickSecs
+    held = np.zeros((len(presses), ticks), dtype=bool)
+    for row, pairs in enumerate(presses):
+        for pressSecs, releaseSecs in pairs:
+            held[row] |= (t >= pressSecs) & (t < releaseSecs)
+    return held
+
+def stateChanges(states, tickSecs=0.01):
+    """Returns a list per scenario of (secs, newState) for every tick where the elevator
+    state changed, which is when setState() would have called one of the callbacks."""
+
+    changed = np.zeros(states.shape, dtype=bool)
+    changed[:, 0] = states[:, 0] != STOPPED
+    changed[:, 1:] = states[:, 1:] != states[:, :-1]
+    rows, cols = np.nonzero(changed)
+    out = [[] for _ in range(states.shape[0])]
+    for row, col in zip(rows, cols):
+        out[row].append((round(float(col * tickSecs), 3), int(states[row, col])))
+    return out
+
+def heldSpans(held):
+    """Returns flat lists of (row, startTick, endTick, isHeld), one for each stretch where a
+    scenario's button stays the same, in order. That way we work out each stretch in one go
+    rather than a tick at a time."""
+
+    scenarios, ticks = held.shape
+    edges = np.zeros((scenarios, ticks + 1), dtype=bool)
+    edges[:, 0] = True
+    edges[:, ticks] = True
+    edges[:, 1:ticks] = held[:, 1:] != held[:, :-1]
+    rows, cols = np.nonzero(edges)
+    # Each edge starts a span that runs to the next edge in the same row
+    isStart = rows[:-1] == rows[1:]
+    starts = cols[:-1][isStart]
+    return (rows[:-1][isStart].tolist(), starts.tolist(), cols[1:][isStart].tolist(),
+            held[rows[:-1][isStart], starts].tolist())
+
+def fillRuns(shape, fill, rows, starts, counts, bases, slopes, dtype):
+    """Returns a (scenarios, ticks) array built from runs. Run r covers counts[r] ticks from
+    starts[r] in rows[r], and its value j ticks in is bases[r] + slopes[r] * j. Leave slopes as
+    None if every run stays the same. Ticks not in any run are fill. The runs have to be in order
+    (by row, then by tick) and not overlap.
+
+    Rather than writing every tick of every run, we only mark where each run starts, what it
+    jumps to and what slope it has, then a cumsum or two fills in the rest."""
+
+    size = shape[0] * shape[1]
+    starts = np.asarray(rows, dtype=np.int64) * shape[1] + np.asarray(starts, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    bases = np.asarray(bases, dtype=np.int64)
+    slopes = np.zeros(len(starts), dtype=np.int64) if slopes == None else np.asarray(slopes, dtype=np.int64)
+
+    # Put a run of fill in front of every run and after the last one, so the runs cover every
+    # tick, and drop any that come out empty
+    runs = len(starts)
+    allStarts = np.empty(2 * runs + 1, dtype=np.int64)
+    allCounts = np.empty(2 * runs + 1, dtype=np.int64)
+    allBases = np.full(2 * runs + 1, fill, dtype=np.int64)
+    allSlopes = np.zeros(2 * runs + 1, dtype=np.int64)
+    ends = starts + counts
+    allStarts[0::2] = np.concatenate(([0], ends))
+    allCounts[0::2] = np.concatenate((starts, [size])) - allStarts[0::2]
+    allStarts[1::2] = starts
+    allCounts[1::2] = counts
+    allBases[1::2] = bases
+    allSlopes[1::2] = slopes
+    keep = allCounts > 0
+    starts, counts, bases, slopes = allStarts[keep], allCounts[keep], allBases[keep], allSlopes[keep]
+
+    # Each tick is the one before plus an increment. Inside a run that's the run's slope, and on
+    # its first tick it's whatever gets us from the last run's final value to this run's base.
+    prevSlopes = np.concatenate(([0], slopes[:-1]))
+    prevLasts = np.concatenate(([0], (bases + slopes * (counts - 1))[:-1]))
+    inc = np.zeros(size, dtype=np.int32)
+    if slopes.any():
+        inc[starts] = slopes - prevSlopes
+        np.cumsum(inc, out=inc)
+    inc[starts] += bases - prevLasts - slopes
+    return np.cumsum(inc, out=inc).astype(dtype).reshape(shape)
+
+def simElevator(held, freqMin=10, freqMax=1200, accel=1200, jerk=2400, tickSecs=0.01,
+                scoopAlignedStop=True, scoopStopPhaseSteps=0, holdSecs=0):
+    """Run the elevator state machine against a (scenarios, ticks) button held array.
+    Returns a dict of (scenarios, ticks) arrays: freq, steps (cumulative), marbles
+    (cumulative), state and holding (True while the driver is holding the belt after a stop),
+    plus stopPhases, a list per scenario of how many steps past a scoop we stopped at.
+
+    Each tick mirrors one trip thru the while loop in RampEngine.spinAsyncTaskPwm(), assuming
+    our ticks are always on time (which the time based ramp makes true on the device).
+    On the device the loop only wakes every cruiseTickSecs at max speed, but a button press
+    or release wakes it right away, so ticking at tickSecs the whole time gives the same motion.
+
+    Letting go doesn't ramp down right away. Like RampEngine.planScoopStop(), we plan a ramp
+    down that ends with a scoop at the pop-out (scoopStopPhaseSteps), holding our speed a
+    little longer to get there, and updateLaunch() picks the ramp entry each tick. Pressing
+    again before we stop forgets the stop. Once stopped we hold the belt for holdSecs (off at 0,
+    like on the device), and a press in that window starts from hold. Set
+    scoopAlignedStop=False to get the old stop right away. The device counts steps with the loopback counter. We use our
+    commanded steps, which is what the loopback counter sees when no steps get lost.
+
+    Rather than stepping every scenario thru every tick, we go one button span at a time and
+    only keep track of runs: "from tick a, for n ticks, walk up (or down, or sit on) the ramp
+    table from entry e". While held, the ramp walks up one entry per tick, so a held span is
+    a run up the ramp and then a run sitting at the top. Letting go with a scoop stop is the only part that needs updateLaunch()'s planner,
+    and it mostly sits at one speed or walks down the ramp, so windDown() works those out a run
+    at a time too. Then fillRuns() writes every run of every scenario into the output arrays
+    with a handful of NumPy ops, so the only work per tick is those few whole array passes.
+    1000 one minute scenarios at 10ms ticks (elevator plus agitator, see main()) take about
+    0.5 secs on my laptop, so roughly 2000 scenarios/sec. Stepping every tick in a Python loop
+    did about 500 scenarios/sec."""
+
+    profile = MotionProfile(freqMin, freqMax, accel, jerk, tickSecs)
+    lastIdx = profile.lastIdx
+    table = [int(f) for f in profile.table]
+    # The extra 0 on the end is the freq for ramp entry -1, which is what we use for off
+    tableArr = np.array(table + [0], dtype=np.int32)
+
+    # We count position in steps / tickSecs, which is just the sum of the freqs we ran at each
+    # tick, so it stays a whole number and the planner's comparisons are exact
+    perStep = 1 / tickSecs
+    stopCost = [int(profile.freqs[i]) + int(round(profile.stopSteps[i] * perStep)) for i in range(lastIdx + 1)]
+    # The planner rounds its stop distance to whole steps (see planScoopStop())
+    stopRound = [int(round(int(c * tickSecs + 0.5) * perStep)) for c in stopCost]
+    # rampSum[c] is how far we go running one tick at each of ramp entries 0 to c-1
+    rampSum = [0]
+    for f in table:
+        rampSum.append(rampSum[-1] + f)
+    # Walking down the ramp from entry c0 to entry c takes rampSum[c0] - rampSum[c], and once
+    # there the planner holds that speed if what's left is at least stopCost[c]. So with
+    # k = remaining - rampSum[c0], we walk down till the first c where k >= holdAt[c].
+    holdAt = [stopCost[c] - rampSum[c] for c in range(lastIdx + 1)]
+    # holdAt goes up and down, but the first c we hit walking down from c0 has to be lower than
+    # every holdAt before it. So for each c0 keep just those new lows, in order walking down,
+    # along with -holdAt for each so we can bisect them.
+    lows = [([], [])]
+    for c0 in range(1, lastIdx + 1):
+        below, negHold = lows[c0 - 1]
+        keep = bisect.bisect_right(negHold, -holdAt[c0 - 1]) if c0 > 1 else 0
+        lows.append(([c0 - 1] + below[keep:], [-holdAt[c0 - 1]] + negHold[keep:]))
+    scoopUnits = int(round(STEPS_PER_MARBLE * perStep))
+    phaseUnits = int(round(scoopStopPhaseSteps * perStep))
+    holdTicks = int(round(holdSecs / tickSecs))
+
+    memo = {}
+
+    def windDown(i, remaining, st):
+        """updateLaunch() from ramp entry i with remaining to go. Returns a list of runs as
+        (startTick, ticks, entry, slope, state), where slope is 0 to sit on the entry or -1 to
+        walk down from it, and how many ticks we're still on for. The tick after those is the
+        one we turn off in."""
+
+        key = (i, remaining, st)
+        if key in memo:
+            return memo[key]
+
+        runs = []
+        t = 0
+        idx = i
+        cap = i
+        while True:
+            if remaining <= 0:
+                # We're there, so ramp down to a stop like normal
+                if idx > 0:
+                    runs.append((t, idx, idx - 1, -1, DECELERATING))
+                    t += idx
+                break
+
+            # Once winding down, never speed back up
+            if st == DECELERATING:
+                cap = min(cap, idx)
+            fits = bisect.bisect_right(stopCost, remaining) - 1
+            target = max(min(idx + 1, cap, fits), 0)
+
+            if idx == target:
+                # Hold this speed for as many ticks as the planner will let us
+                f = table[idx]
+                if idx == 0:
+                    n = -(-remaining // f)
+                else:
+                    n = (remaining - stopCost[idx]) // f + 1
+                if idx == lastIdx and st != DECELERATING:
+                    st = MAXSPEED
+                runs.append((t, n, idx, 0, st))
+                t += n
+                remaining -= n * f
+            elif idx < target:
+                idx += 1
+                st = ACCELERATING
+                runs.append((t, 1, idx, 0, st))
+                t += 1
+                remaining -= table[idx]
+            else:
+                # Walk down the ramp a tick at a time till the planner wants to hold a speed again
+                # (or we get to the bottom)
+                k = remaining - rampSum[idx]
+                below, negHold = lows[idx]
+                found = bisect.bisect_left(negHold, -k)
+                c = below[found] if found < len(below) else 0
+                runs.append((t, idx - c, idx - 1, -1, DECELERATING))
+                t += idx - c
+                st = DECELERATING
+                remaining = k + rampSum[c]
+                idx = c
+
+        memo[key] = (runs, t)
+        return runs, t
+
+    scenarios, ticks = held.shape
+    stopPhases = [[] for _ in range(scenarios)]
+
+    # Runs of ticks the motor is on, as row, start, ticks, ramp entry, slope and state
+    onRows, onStarts, onCounts, onEntries, onSlopes, onStates = [], [], [], [], [], []
+    # Runs of ticks we're holding the belt after a stop, as row, start and ticks
+    holdRows, holdStarts, holdCounts = [], [], []
+
+    def addRun(row, start, n, entry, slope, st):
+        """Note a run of the motor being on, and return how far it goes."""
+        onRows.append(row)
+        onStarts.append(start)
+        onCounts.append(n)
+        onEntries.append(entry)
+        onSlopes.append(slope)
+        onStates.append(st)
+        if slope == 0:
+            return n * table[entry]
+        if slope > 0:
+            return rampSum[entry + n] - rampSum[entry]
+        return rampSum[entry + 1] - rampSum[entry + 1 - n]
+
+    row = -1
+    for spanRow, a, b, isHeld in zip(*heldSpans(held)):
+
+        if spanRow != row:
+            row = spanRow
+            isOn = False
+            idx = 0
+            st = STOPPED
+            pos = 0
+
+        n = b - a
+
+        if isHeld:
+            if isOn and idx == lastIdx:
+                # Already at the top
+                if st != DECELERATING:
+                    st = MAXSPEED
+                pos += addRun(row, a, n, lastIdx, 0, st)
+            else:
+                # Walk up the ramp one entry per tick till the top. From a stop that starts at
+                # entry 0 on the press tick, otherwise (pressed again during a stop) from the next
+                # entry up.
+                first = idx + 1 if isOn else 0
+                up = min(n, lastIdx + 1 - first)
+                pos += addRun(row, a, up, first, 1, ACCELERATING)
+                idx = first + up - 1
+                st = ACCELERATING
+                if up < n:
+                    pos += addRun(row, a + up, n - up, lastIdx, 0, MAXSPEED)
+                    st = MAXSPEED
+            isOn = True
+            continue
+
+        if not isOn:
+            continue
+
+        if scoopAlignedStop:
+            # spinAsyncStop() plans the stop, then updateLaunch() takes us there
+            earliest = pos + stopRound[idx]
+            stopAt = earliest + (phaseUnits - earliest) % scoopUnits
+            runs, onTicks = windDown(idx, stopAt - pos, st)
+        else:
+            # Just walk back down the ramp
+            runs = [(0, idx, idx - 1, -1, DECELERATING)] if idx > 0 else []
+            onTicks = idx
+
+        for t, cnt, entry, slope, runState in runs:
+            if t >= n:
+                break
+            cnt = min(cnt, n - t)
+            pos += addRun(row, a + t, cnt, entry, slope, runState)
+            idx = entry + slope * (cnt - 1)
+            st = runState
+
+        if onTicks < n:
+            # Turned off. Note where the scoop is and hold the belt till they press again.
+            isOn = False
+            st = STOPPED
+            idx = 0
+            stopPhases[row].append(int(((pos - phaseUnits) % scoopUnits) * tickSecs))
+            holdFor = min(holdTicks, n - onTicks)
+            if holdFor > 0:
+                holdRows.append(row)
+                holdStarts.append(a + onTicks)
+                holdCounts.append(holdFor)
+
+    # Ramp entry we're at each tick, or -1 while the motor's off
+    shape = (scenarios, ticks)
+    rampIdx = fillRuns(shape, -1, onRows, onStarts, onCounts, onEntries, onSlopes, np.int16)
+    state = fillRuns(shape, STOPPED, onRows, onStarts, onCounts, onStates, None, np.int8)
+    holding = fillRuns(shape, 0, holdRows, holdStarts, holdCounts, [1] * len(holdRows), None, bool)
+
+    # Whatever freq we set each tick is what we step at until the next tick
+    freq = tableArr[rampIdx]
+    steps = np.cumsum(freq * tickSecs, axis=1)
+    return {
+        "freq": freq,
+        "steps": steps,
+        "marbles": np.floor(steps / STEPS_PER_MARBLE).astype(np.int32),
+        "state": state,
+        "holding": holding,
+        "stopPhases": stopPhases,
+    }
+
+def simAgitator(held, freqMin=10, freqMax=300, freqStep=40, freqStepSecs=0.1, tickSecs=0.01):
+    """Run the agitator state machine against a (scenarios, ticks) button held array.
+    The defaults are what Dashboard sets in main_kitchensink.py. Returns a dict of
+    (scenarios, ticks) arrays: freq and steps (cumulative).
+
+    Same idea as simElevator(), one button span at a time. The agitator's ramp is a straight
+    line, freqStep per freqStepSecs, so each span is a run up or down and maybe a run sitting at
+    freqMax or freqMin."""
+
+    # Same as StepperAgitator.rampStepHz()
+    rampStep = max(1, int(freqStep * tickSecs / freqStepSecs + 0.5))
+
+    scenarios, ticks = held.shape
+    rows, starts, counts, bases, slopes = [], [], [], [], []
+
+    def addRun(row, start, n, base, slope):
+        if n > 0:
+            rows.append(row)
+            starts.append(start)
+            counts.append(n)
+            bases.append(base)
+            slopes.append(slope)
+
+    row = -1
+    for spanRow, a, b, isHeld in zip(*heldSpans(held)):
+
+        if spanRow != row:
+            row = spanRow
+            isOn = False
+            f = freqMin
+
+        n = b - a
+
+        if isHeld:
+            # 1st turn on leaves freq alone that tick, then we go up till freqMax
+            base = f + rampStep if isOn else f
+            up = min(n, max(0, (freqMax - base) // rampStep + 1))
+            addRun(row, a, up, base, rampStep)
+            addRun(row, a + up, n - up, freqMax, 0)
+            f = min(base + rampStep * (n - 1), freqMax)
+            isOn = True
+
+        elif isOn:
+            # Walk down till freqMin (the last step down can land short of a whole rampStep),
+            # then turn off the tick after
+            down = -(-(f - freqMin) // rampStep)
+            cnt = min(down, n)
+            whole = min(cnt, (f - freqMin) // rampStep)
+            addRun(row, a, whole, f - rampStep, -rampStep)
+            addRun(row, a + whole, cnt - whole, freqMin, 0)
+            f = max(f - rampStep * cnt, freqMin)
+            if down < n:
+                isOn = False
+                f = freqMin
+
+    out = fillRuns((scenarios, ticks), 0, rows, starts, counts, bases, slopes, np.int32)
+
+    return {
+        "freq": out,
+        "steps": np.cumsum(out * tickSecs, axis=1),
+    }
+
+def main():
+
+    # Make up a bunch of random press/release timelines over a minute
+    scenarios = 1000
+    durationSecs = 60
+    tickSecs = 0.01
+    rng = np.random.default_rng(0)
+    presses = []
+    for _ in range(scenarios):
+        pairs = []
+        t = rng.uniform(0, 5)
+        while t < durationSecs:
+            hold = rng.uniform(0.2, 15)
+            pairs.append((t, t + hold))
+            t += hold + rng.uniform(0.5, 10)
+        presses.append(pairs)
+    held = pressTimeline(presses, durationSecs, tickSecs)
+
+    startSecs = time.perf_counter()
+    elev = simElevator(held, tickSecs=tickSecs, holdSecs=30)
+    agit = simAgitator(held, tickSecs=tickSecs)
+    elapsedSecs = time.perf_counter() - startSecs
+
+    print("Simulated", scenarios, "scenarios of", durationSecs, "secs in", round(elapsedSecs, 3), "secs",
+          "(", int(scenarios / elapsedSecs), "scenarios/sec )")
+    print("Elevator marbles per scenario. min:", elev["marbles"][:, -1].min(),
+          "mean:", round(float(elev["marbles"][:, -1].mean()), 1),
+          "max:", elev["marbles"][:, -1].max())
+    print("Agitator steps per scenario. mean:", int(agit["steps"][:, -1].mean()))
+
+    # How close to a scoop at the pop-out each stop ended up, and how many presses caught the
+    # belt still holding (so no scoop to lift again)
+    phases = np.array([p for row in elev["stopPhases"] for p in row])
+    phaseErr = np.minimum(phases, STEPS_PER_MARBLE - phases)
+    print("Stops:", len(phases), "worst steps from a scoop:", int(phaseErr.max()) if len(phases) else 0)
+    presses = held[:, 1:] & ~held[:, :-1]
+    print("Presses during the hold window:", int((presses & elev["holding"][:, :-1]).sum()), "of", int(presses.sum()))
+    print("State changes for scenario 0:", stateChanges(elev["state"][:1], tickSecs)[0])
+
+if __name__ == "__main__":
+    main()
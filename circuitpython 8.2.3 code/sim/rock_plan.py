@@ -0,0 +1,58 @@
+# Host side planner for the agitator's rock ramp
+# This runs on a normal computer, no NumPy needed. Run it from the
+# "circuitpython 8.2.3 code" folder like:
+#
+#   python sim/rock_plan.py
+#   python sim/rock_plan.py 121.5 1400 3000
+#
+# The args are swingDeg, peakHz, accel and dwellSecs, all optional. It builds the same
+# RockProfile the agitator uses on the board (see stepper/rock_profile.py), prints the
+# segments, and compares how long a rock takes against the old hand written table in
+# stepper_tmc2209_agitator.py. When you like what you see, put the same numbers in
+# RockProfile() on the board and hand it to StepperAgitator.setRockProfile().
+
+import os
+import sys
+
+# Let us import the real rock profile code from the stepper folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stepper.rock_profile import RockProfile
+
+# Same as StepperAgitator._minPulseWidth
+MIN_PULSE_WIDTH = 0.00055
+
+# One half swing of the old hand written table, as (steps, pw)
+HAND_SWING = [(45, 0.01), (45, 0.008), (45, 0.006), (135, 0.004), (135, 0.004), (45, 0.006), (45, 0.008), (45, 0.01)]
+HAND_PAUSES = [0.1, 0.1, 0.1, 0.1, 0.2]
+
+def handSecs():
+    """How long the old hand written table takes for a full rock."""
+    swing = 0
+    for steps, pw in HAND_SWING:
+        swing += steps * (MIN_PULSE_WIDTH + pw * 0.1)
+    return 4 * swing + sum(HAND_PAUSES)
+
+def main():
+    args = [float(a) for a in sys.argv[1:]]
+    names = ['swingDeg', 'peakHz', 'accel', 'dwellSecs']
+    kwargs = dict(zip(names, args))
+
+    p = RockProfile(**kwargs)
+    p.dump()
+
+    handSteps = sum(steps for steps, pw in HAND_SWING)
+    print()
+    print("Hand table swing steps:", handSteps, "deg:", handSteps / p.microsteps * p.stepDeg, "rockSecs:", round(handSecs(), 3))
+    print("Profile swing steps:", p.swingSteps, "deg:", p.swingDeg, "rockSecs:", round(p.rockSecs(), 3))
+
+    # Show what the agitator would get, so you can paste it in if you want a fixed table
+    print()
+    print("rockRamp:")
+    for seg in p.rockRamp(MIN_PULSE_WIDTH):
+        if 'pause' in seg:
+            print("  ", seg)
+        else:
+            print("  ", {'pw':round(seg['pw'], 5), 'steps':seg['steps'], 'dir':seg['dir']})
+
+if __name__ == "__main__":
+    main()
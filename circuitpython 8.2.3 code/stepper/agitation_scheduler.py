@@ -0,0 +1,181 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This only runs the agitator when the onramp pipe needs more marbles
+
+import asyncio
+import time
+
+class AgitationScheduler:
+    """The agitator used to run the whole time the elevator ran, even with the onramp pipe
+    already full. That heats up its driver and burns loop time for nothing. This runs it only
+    when the pipe needs marbles, and only as hard as it needs to.
+
+    Nothing on the wall sees marbles in the pipe, so we keep a running estimate of how many are
+    in it. Every stepsPerMarble steps on the marble counter's loopback another scoop goes by and
+    takes a marble, if there is one. The agitator pushes marbles in at supplyPerSec per second
+    when it runs at supplyFreq (in proportion at other speeds), and a few roll in on their own at
+    passivePerSec. emptyScoops counts the scoops we think came up empty, but that's only our
+    own estimate. The marble counter counts loopback steps, not marbles, so nothing tells us
+    whether a scoop really got one. An empty pipe is below lowWater anyway, so we don't need a
+    separate starvation check.
+
+    Below lowWater we agitate hard at freqHigh. Between lowWater and highWater we keep going at
+    freqLow if we're already going. Above highWater we stop. When the elevator stops nothing
+    gets used up, so we stop too.
+
+    Tune supplyPerSec and passivePerSec on the wall. If the elevator ever comes up empty,
+    supplyPerSec is too high. Auto-run (see auto_run.py) may change freqHigh to match the
+    elevator's speed.
+
+    Dashboard in main_kitchensink.py always creates us and runs asyncTaskSchedule() as a task,
+    but we're off until you set its agitateOnDemand to True. Then startMotors() and stopMotors()
+    call our start() and stop() rather than running the agitator the whole time, and auto-run
+    gets handed us too. Leave it False until the pipe numbers above are measured, since if
+    they're off the scoops starve and nothing here can tell."""
+
+    def __init__(self, elevator, agitator, marbleCounter):
+
+        self.elevator = elevator
+        self.agitator = agitator
+        self.mc = marbleCounter
+
+        # How many marbles the onramp pipe holds, and our fill thresholds
+        self.pipeCapacity = 12
+        self.lowWater = 4
+        self.highWater = 10
+        # Start out assuming it's half full, so we agitate a bit on the first run
+        self.level = self.pipeCapacity / 2
+
+        # Marbles/sec the agitator pushes into the pipe at supplyFreq, and that roll in without it
+        self.supplyPerSec = 1.0
+        self.supplyFreq = agitator.freqMax
+        self.passivePerSec = 0.05
+
+        # Agitator speeds (step Hz) for hard and gentle agitation
+        self.freqHigh = agitator.freqMax
+        self.freqLow = 150
+
+        self.periodSecs = 0.5
+
+        self.isOn = False
+        # True while we're counting scoops, which goes on thru the elevator's ramp down after stop()
+        self._isTracking = False
+        self.isAgitating = False
+        self._isAgitatorEnabled = False
+        # Scoops we think came up empty (our estimate, not counted)
+        self.emptyScoops = 0
+        # How long the elevator ran and how much of that we agitated, to see what we save
+        self.runSecs = 0.0
+        self.agitateSecs = 0.0
+        self._lastSteps = 0
+        self._lastNs = 0
+
+        self._wakeEvent = asyncio.Event()
+
+    def start(self):
+        """Call when the elevator starts."""
+        self.isOn = True
+        if not self._isTracking:
+            self._isTracking = True
+            self._lastSteps = self.mc.pollSteps()
+            self._lastNs = time.monotonic_ns()
+        # Decide right away rather than waiting for our first tick
+        self.decide()
+        self._wakeEvent.set()
+
+    def stop(self):
+        """Call when the elevator is told to stop. We stop agitating right away, but keep
+        counting scoops until the elevator has ramped down."""
+        self.isOn = False
+        self.agitateOff()
+
+    def agitateOn(self, freq):
+        if self.agitator.freqMax != freq:
+            self.agitator.setFreqMax(freq)
+        if not self.isAgitating:
+            self.isAgitating = True
+            self._isAgitatorEnabled = True
+            self.agitator.enable()
+            self.agitator.spinAsyncStart()
+            print("Agitation scheduler agitating. level:", round(self.level, 1), "freq:", freq)
+
+    def agitateOff(self):
+        if self.isAgitating:
+            self.isAgitating = False
+            self.agitator.spinAsyncStop()
+            print("Agitation scheduler resting. level:", round(self.level, 1))
+
+    def decide(self):
+        """Pick how hard to agitate for our pipe level estimate."""
+
+        if self.level <= self.lowWater:
+            self.agitateOn(self.freqHigh)
+        elif self.level >= self.highWater:
+            self.agitateOff()
+        elif self.isAgitating:
+            self.agitateOn(min(self.freqLow, self.freqHigh))
+
+    def tick(self):
+        """Update our pipe level estimate for the time since last tick, then decide."""
+
+        steps = self.mc.pollSteps()
+        nowNs = time.monotonic_ns()
+        secs = (nowNs - self._lastNs) / 1000000000
+        scoops = (steps - self._lastSteps) / self.mc.stepsPerMarble
+        self._lastSteps = steps
+        self._lastNs = nowNs
+
+        self.runSecs += secs
+
+        # Marbles in. The agitator's real freq tells us how hard it's going right now.
+        supply = self.passivePerSec
+        if self.isAgitating:
+            self.agitateSecs += secs
+            supply += self.supplyPerSec * self.agitator.freq / self.supplyFreq
+        self.level = min(self.level + supply * secs, self.pipeCapacity)
+
+        # Marbles out. Each scoop takes one if there's one to take.
+        if scoops > 0:
+            taken = min(scoops, self.level)
+            self.level -= taken
+            self.emptyScoops += scoops - taken
+
+        if self.isOn:
+            self.decide()
+
+        if not self.isAgitating and self._isAgitatorEnabled and self.agitator.isIdle():
+            # Done ramping down, so cut the power to let its driver cool off while we rest
+            self._isAgitatorEnabled = False
+            self.agitator.disable()
+
+    def report(self):
+        pct = 0
+        if self.runSecs > 0:
+            pct = round(100 * self.agitateSecs / self.runSecs)
+        stats = {
+            'level': round(self.level, 1),
+            'emptyScoops': int(self.emptyScoops),
+            'agitatePct': pct,
+        }
+        print("Agitation scheduler report:", stats)
+        return stats
+
+    async def asyncTaskSchedule(self):
+        """Infinite loop task that keeps our pipe estimate up to date while the elevator runs."""
+
+        print("Starting infinite async agitation scheduler task...")
+
+        while True:
+
+            if not self.isOn and self.elevator.isIdle():
+                if self._isTracking:
+                    # Count the last scoops from the ramp down
+                    self.tick()
+                    self._isTracking = False
+                    self.report()
+                # Park until start() wakes us up
+                self._wakeEvent.clear()
+                await self._wakeEvent.wait()
+                continue
+
+            self.tick()
+            await asyncio.sleep(self.periodSecs)
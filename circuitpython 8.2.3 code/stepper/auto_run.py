@@ -0,0 +1,270 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This runs the marble run on its own at a steady number of marbles per minute
+
+import asyncio
+import time
+from stepper.stepper_tmc2209_pwm import StepperState
+
+class AutoRun:
+    """For exhibits nobody is standing at the button, so auto-run keeps the marble run going
+    on its own at targetPerMin marbles per minute.
+
+    We measure the marble rate from the marble counter's loopback steps (stepsPerMarble steps
+    is one marble) and run a PI controller on it. The elevator's cruise speed is the feed
+    forward for the target rate, plus kp times the rate error, plus the integral of ki times the
+    rate error. We hand that to the elevator's setTargetSpeed(), which eases over to it without
+    stopping the belt. The agitator runs with the elevator, faster the faster the elevator
+    goes, so marbles get pushed into the onramp as fast as the scoops carry them away.
+
+    We never ask for more than safeFreq, or the elevator's freqMax if that's lower (the speed
+    learner may have backed it off). When we're pinned at that ceiling we stop integrating, so
+    we don't wind up and overshoot once things free up.
+
+    If the elevator stops on us, like a diag fault from the belt stalling or slipping, we stop
+    the agitator too (thru stopCb, since the belt isn't taking marbles), reset the integral and
+    start them both again after restartDelaySecs. If it faults maxFaults times within
+    faultWindowSecs something is really wrong, so we stop auto-run and leave it stopped.
+
+    The loopback counts steps we sent to the elevator, not marbles that actually went up, so an
+    empty reservoir looks the same as a full one to us. That's why the agitator speed follows
+    the elevator, it's what keeps the scoops fed. If there's an agitation scheduler (see
+    setAgitationScheduler()) it decides when to agitate, and we just tell it how hard. Pass None
+    as agitator to leave its speed alone, like with the rocking agitator, where ScoopSync (see
+    scoop_sync.py) follows the elevator for us.
+
+    Dashboard passes in its own start/stop callbacks so the fan and display follow along the
+    same as with the button. Call start() to turn auto-run on and stop() to turn it off, and
+    run asyncTaskAutoRun() as a task."""
+
+    def __init__(self, elevator, agitator, marbleCounter, startCb, stopCb):
+
+        self.elevator = elevator
+        self.agitator = agitator
+        self.mc = marbleCounter
+        self.startCb = startCb
+        self.stopCb = stopCb
+
+        self.targetPerMin = 30
+
+        # Never command the elevator above this (step Hz). It also never goes above its freqMax.
+        self.safeFreq = elevator.freqMax
+        # Don't crawl along slower than this while running (step Hz)
+        self.floorFreq = 100
+
+        # PI gains. kp is step Hz per marble/min of error. ki is step Hz per marble/min of error
+        # per sec. One marble/min is about 25 step Hz.
+        self.kp = 12
+        self.ki = 12
+
+        # How often we measure and correct
+        self.periodSecs = 0.5
+        # How much we smooth the measured rate. The loopback counts in bursts, so a little
+        # smoothing keeps us from chasing noise, but keep it short so we react in seconds.
+        self.filterSecs = 1.0
+        # Don't bother the elevator with tiny speed changes, each one is an S-curve transition
+        self.deadbandHz = 5
+
+        # The agitator runs between these (step Hz) as the elevator goes from floorFreq to safeFreq
+        self.agitatorFreqMin = 150
+        self.agitatorFreqMax = 0
+        if agitator != None:
+            self.agitatorFreqMax = agitator.freqMax
+        self.scheduler = None
+
+        self.restartDelaySecs = 3
+        self.maxFaults = 3
+        self.faultWindowSecs = 5 * 60
+
+        self.isOn = False
+        self.rate = None
+        self._isSettling = True
+        self.integral = 0
+        self.cmdFreq = 0
+        self.faultCtr = 0
+        self.restartCtr = 0
+        self._faultTimesNs = []
+        self._restartAtNs = None
+        self._lastSteps = 0
+        self._lastNs = 0
+
+        self._wakeEvent = asyncio.Event()
+
+    def start(self, targetPerMin=None):
+        if targetPerMin != None:
+            self.targetPerMin = targetPerMin
+        print("Auto-run starting. targetPerMin:", self.targetPerMin)
+
+        self.isOn = True
+        self.integral = 0
+        self._faultTimesNs = []
+        self._restartAtNs = None
+        self.startMotors()
+        self._wakeEvent.set()
+
+    def stop(self):
+        print("Auto-run stopping.", self.report())
+        self.isOn = False
+        self.stopCb()
+        # Next time the button runs the elevator, go back to cruising at freqMax
+        self.elevator.setTargetSpeed(None)
+
+    def setAgitationScheduler(self, scheduler):
+        """Give us an AgitationScheduler (see stepper/agitation_scheduler.py) and we'll set its
+        freqHigh rather than running the agitator speed ourselves."""
+        self.scheduler = scheduler
+
+    def ceilingFreq(self):
+        """The fastest we're allowed to ask for right now."""
+        return min(self.safeFreq, self.elevator.freqMax)
+
+    def feedForwardFreq(self):
+        """The elevator step Hz that vends targetPerMin marbles per minute."""
+        return self.targetPerMin * self.mc.stepsPerMarble / 60
+
+    def startMotors(self):
+        self.rate = None
+        self.cmdFreq = 0
+        self._lastSteps = self.mc.pollSteps()
+        self._lastNs = time.monotonic_ns()
+        self.command(self.feedForwardFreq() + self.integral)
+        self.startCb()
+
+    def onFault(self):
+        """Dashboard calls this when the elevator's diag pin faults."""
+
+        if not self.isOn:
+            return
+
+        nowNs = time.monotonic_ns()
+        self.faultCtr += 1
+        self._faultTimesNs.append(nowNs)
+        windowNs = self.faultWindowSecs * 1000000000
+        self._faultTimesNs = [t for t in self._faultTimesNs if nowNs - t < windowNs]
+
+        # Whatever we'd built up was wrong for a stalled belt
+        self.integral = 0
+
+        if len(self._faultTimesNs) >= self.maxFaults:
+            print("Auto-run too many elevator faults. Giving up. faults in window:", len(self._faultTimesNs))
+            self.stop()
+            return
+
+        print("Auto-run elevator faulted. Restarting in", self.restartDelaySecs, "secs. faultCtr:", self.faultCtr)
+        self.scheduleRestart()
+
+    def scheduleRestart(self):
+        """The elevator stopped on us. Stop the agitator along with it, and start them both back
+        up after restartDelaySecs."""
+        self.stopCb()
+        self._restartAtNs = time.monotonic_ns() + self.restartDelaySecs * 1000000000
+
+    def command(self, freq):
+        """Clamp freq to what we're allowed and send it to the elevator and agitator if it
+        moved enough to matter. Returns the clamped freq."""
+
+        ceiling = self.ceilingFreq()
+        freq = int(min(max(freq, self.floorFreq), ceiling))
+
+        if abs(freq - self.cmdFreq) >= self.deadbandHz or (freq == ceiling and self.cmdFreq != ceiling):
+            self.cmdFreq = freq
+            self.elevator.setTargetSpeed(freq)
+
+            span = max(ceiling - self.floorFreq, 1)
+            frac = (freq - self.floorFreq) / span
+            agitatorFreq = int(self.agitatorFreqMin + frac * (self.agitatorFreqMax - self.agitatorFreqMin))
+            if self.scheduler != None:
+                self.scheduler.freqHigh = agitatorFreq
+            elif self.agitator != None:
+                self.agitator.setFreqMax(agitatorFreq)
+
+        return freq
+
+    def measure(self):
+        """Update our smoothed marble rate (marbles/min) from the loopback steps since last time."""
+
+        steps = self.mc.pollSteps()
+        nowNs = time.monotonic_ns()
+        secs = (nowNs - self._lastNs) / 1000000000
+        if secs <= 0:
+            return
+        rateNow = (steps - self._lastSteps) / self.mc.stepsPerMarble / secs * 60
+        self._lastSteps = steps
+        self._lastNs = nowNs
+
+        if self.rate == None:
+            self.rate = rateNow
+        else:
+            self.rate += (rateNow - self.rate) * secs / (self.filterSecs + secs)
+        return secs
+
+    def tick(self):
+        """One measure and correct step of the controller."""
+
+        secs = self.measure()
+        if secs == None:
+            return
+
+        if self.elevator.state != StepperState.MAXSPEED:
+            # Ramping up or easing between speeds, so a low rate is expected. Hold what we have
+            # and start measuring fresh once we're at speed.
+            self.rate = None
+            self._isSettling = True
+            return
+
+        if self._isSettling:
+            # This sample still has some of the ramp in it, so toss it
+            self._isSettling = False
+            self.rate = None
+            return
+
+        err = self.targetPerMin - self.rate
+        ff = self.feedForwardFreq()
+        want = ff + self.kp * err + self.integral + self.ki * err * secs
+        ceiling = self.ceilingFreq()
+
+        # Only integrate if it doesn't push us further past our limits
+        if not (want > ceiling and err > 0) and not (want < self.floorFreq and err < 0):
+            self.integral += self.ki * err * secs
+            # Never need more than what it takes to get from the feed forward to our limits
+            self.integral = min(max(self.integral, self.floorFreq - ff), ceiling - ff)
+
+        self.command(ff + self.kp * err + self.integral)
+
+    def report(self):
+        return {
+            'targetPerMin': self.targetPerMin,
+            'ratePerMin': None if self.rate == None else round(self.rate, 1),
+            'cmdFreq': self.cmdFreq,
+            'integral': round(self.integral, 1),
+            'faults': self.faultCtr,
+            'restarts': self.restartCtr,
+        }
+
+    async def asyncTaskAutoRun(self):
+        """Infinite loop task that runs the controller while auto-run is on."""
+
+        print("Starting infinite async auto-run task...")
+
+        while True:
+
+            if not self.isOn:
+                # Park until start() wakes us up
+                self._wakeEvent.clear()
+                await self._wakeEvent.wait()
+                continue
+
+            if self._restartAtNs != None:
+                if time.monotonic_ns() >= self._restartAtNs and self.elevator.isIdle():
+                    self._restartAtNs = None
+                    self.restartCtr += 1
+                    print("Auto-run restarting elevator. restartCtr:", self.restartCtr)
+                    self.startMotors()
+
+            elif self.elevator.isIdle():
+                # It stopped without telling us thru onFault(), so start it back up the same way
+                self.scheduleRestart()
+
+            else:
+                self.tick()
+
+            await asyncio.sleep(self.periodSecs)
@@ -0,0 +1,31 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This says which pins the DRV8825's extra inputs are wired to on each kind of board
+
+import board
+
+# The DRV8825 has M0/M1/M2 for microstepping, and Sleep/Reset that have to be held high to run.
+# None means that input is jumpered on the board rather than wired to a pin: M2 to GND and M1/M0
+# to 3.3V for 8 microsteps, and Sleep/Reset to 3.3V. Pass one of these to Drv8825Driver(**pins).
+
+# The boards with the display and button. Those use IO9/IO10/IO11 (display SPI) and IO21
+# (button), so everything extra is jumpered and microstepping is fixed at 8.
+DRV8825_PINS_DASHBOARD = {
+    'pinM0': None,
+    'pinM1': None,
+    'pinM2': None,
+    'pinSleep': None,
+    'pinReset': None,
+}
+
+# The original DRV8825 boards, with no display or button, had everything wired to pins. Only use
+# this with a main that doesn't create the Display or Button.
+DRV8825_PINS_ORIGINAL = {
+    'pinM0': board.IO9,
+    'pinM1': board.IO10,
+    'pinM2': board.IO11,
+    'pinSleep': board.IO18,
+    'pinReset': board.IO21,
+}
+
+# What stepper_drv8825_pwm.Stepper uses if you don't pass it a driver
+DRV8825_PINS = DRV8825_PINS_DASHBOARD
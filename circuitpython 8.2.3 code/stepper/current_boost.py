@@ -0,0 +1,96 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This boosts the elevator's motor current while it accelerates
+
+import time
+
+class CurrentBoost:
+    """Accelerating the loaded belt takes a lot more torque than cruising does, so we raise the
+    TMC2209's run current (IRUN) over UART while accelerating and drop it back once we're at
+    speed. With the extra torque you can run a steeper ramp (raise accel on the elevator) and
+    get the first marble out sooner.
+
+    Running boosted heats up the driver, so boosting spends a budget. The budget starts at
+    budgetSecsMax seconds of boost. It drains by 1 per second while boosted and refills by
+    refillSecsPerSec per second while not. If it runs out mid-ramp we drop back to the normal
+    current right away. We don't start a boost unless there's at least minBudgetSecs left.
+
+    Currents are the TMC2209 current scale (CS) values, 0 to 31. See TMC_2209.setCurrent() to
+    work out the CS for a current in mA.
+
+    We set the current thru the elevator's Tmc2209Driver (see driver_tmc2209.py), which does one
+    unchecked register write per change, so a boost doesn't stall the ramp.
+
+    The elevator calls onState() on each state change and tick() each time thru its loop (see
+    Stepper.setCurrentBoost())."""
+
+    def __init__(self, driver, irun=16, boostIrun=24, ihold=8, iholdDelay=10):
+
+        self.driver = driver
+
+        self.irun = irun
+        self.boostIrun = boostIrun
+        self.ihold = ihold
+        self.iholdDelay = iholdDelay
+
+        self.budgetSecsMax = 4.0
+        self.refillSecsPerSec = 0.25
+        self.minBudgetSecs = 0.5
+        self.budgetSecs = self.budgetSecsMax
+
+        self.isBoosted = False
+        self.boostCtr = 0
+        # How many times the budget ran out mid-boost. If this keeps going up, the ramp needs
+        # more boost than we can afford, so lower accel or budgetSecsMax.
+        self.budgetOutCtr = 0
+
+        self._lastNs = time.monotonic_ns()
+
+        # Start out at our normal current
+        self.apply(self.irun)
+
+    def apply(self, irun):
+        self.driver.setCurrent(self.ihold, irun, self.iholdDelay)
+
+    def update(self):
+        """Drain or refill our budget for the time since we last looked."""
+
+        nowNs = time.monotonic_ns()
+        secs = (nowNs - self._lastNs) / 1000000000
+        self._lastNs = nowNs
+
+        if self.isBoosted:
+            self.budgetSecs -= secs
+        else:
+            self.budgetSecs = min(self.budgetSecs + secs * self.refillSecsPerSec, self.budgetSecsMax)
+
+    def onState(self, isAccelerating):
+        """Call this when the motor changes state. We boost while accelerating and go back to
+        our normal current otherwise."""
+
+        self.update()
+
+        if isAccelerating and not self.isBoosted:
+            if self.budgetSecs < self.minBudgetSecs:
+                print("Current boost skipped, not enough budget. budgetSecs:", self.budgetSecs)
+                return
+            self.isBoosted = True
+            self.boostCtr += 1
+            self.apply(self.boostIrun)
+            # print("Current boost on. budgetSecs:", self.budgetSecs)
+
+        elif not isAccelerating and self.isBoosted:
+            self.isBoosted = False
+            self.apply(self.irun)
+            # print("Current boost off. budgetSecs:", self.budgetSecs)
+
+    def tick(self):
+        """Call this each time thru the motor loop so we drop the boost as soon as the budget runs out."""
+
+        self.update()
+
+        if self.isBoosted and self.budgetSecs <= 0:
+            self.budgetSecs = 0
+            self.isBoosted = False
+            self.budgetOutCtr += 1
+            self.apply(self.irun)
+            print("Current boost budget ran out. Back to normal current. budgetOutCtr:", self.budgetOutCtr)
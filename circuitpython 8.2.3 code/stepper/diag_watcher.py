@@ -0,0 +1,129 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This watches the DIAG pin on a TMC2209 (or the nFAULT pin on a DRV8825) driver for faults
+
+import asyncio
+import keypad
+import supervisor
+
+class DiagWatcher:
+    """The TMC2209 drives its DIAG pin high when it sees a fault (stall, over temp, short, etc).
+    Rather than polling the pin with a DigitalInOut from the motor loop, we let keypad scan the
+    pin in the background every 1ms. keypad queues up each edge with a timestamp, so we never
+    miss a fault, and we know when it really happened even if our task gets called back late.
+
+    Our async task drains those edges and calls onFaultCb right away, no matter what the motor
+    loop is doing. While the driver is disabled there's nothing to watch, so call arm() when you
+    enable the driver and disarm() when you disable it, and the task parks in between.
+
+    If the driver stays enabled while the motor stands still (like the elevator's hold window),
+    call setMoving(False) and the task parks then too, rather than waking every pollSecs for
+    nothing. keypad keeps queueing edges while we're parked, so a fault from the hold still
+    gets handled once setMoving(True) says we're moving again.
+
+    keypad timestamps its events with supervisor.ticks_ms(), so all our fault times are whole
+    ms. lastFaultLatencyMs is how long after the scan saw the edge we handled it, to the nearest
+    ms, so 0 means under a ms rather than no wait at all. How late we see a fault is up to
+    the 1ms scan plus pollSecs.
+
+    The DRV8825's nFAULT pin works the other way round: it's open drain and pulls low on a
+    fault. Pass activeHigh=False for it and we turn on the pin's pull up."""
+
+    def __init__(self, pin, name, onFaultCb=None, activeHigh=True):
+
+        self.name = name
+        self.onFaultCb = onFaultCb
+
+        # A fault is a "press". DIAG is active high and driven, nFAULT is active low and needs a pull up.
+        self._keys = keypad.Keys((pin,), value_when_pressed=activeHigh, pull=not activeHigh, interval=0.001, max_events=16)
+
+        # Reuse one event object so draining the queue doesn't allocate
+        self._event = keypad.Event()
+
+        # How often our task drains the keypad queue while armed and moving
+        self.pollSecs = 0.005
+
+        self.isFaulted = False
+        self.faultCtr = 0
+        # supervisor.ticks_ms() of when the scanner saw the last fault edge, and how long it took
+        # us to handle it after that. Both in whole ms, since that's all ticks_ms gives us.
+        self.lastFaultTicksMs = 0
+        self.lastFaultLatencyMs = 0
+        # Keep the last few faults around so we can look at them later as (ticksMs, latencyMs)
+        self.faultLog = []
+        self.faultLogMax = 10
+
+        self._isArmed = False
+        self._isMoving = True
+        self._armEvent = asyncio.Event()
+
+    def arm(self):
+        """Start watching for faults. Call this when you enable the driver."""
+        if not self._isArmed:
+            # Forget any edges from while we were disarmed. reset() also makes keypad report the
+            # pin as a new edge if it's already high, so a fault that's already there isn't missed.
+            self._keys.reset()
+            self._keys.events.clear()
+            self.isFaulted = False
+            self._isArmed = True
+            self._isMoving = True
+            self._armEvent.set()
+
+    def disarm(self):
+        """Stop watching for faults. Call this when you disable the driver."""
+        self._isArmed = False
+
+    def setMoving(self, isMoving):
+        """Tell us if the motor is moving. While armed but not moving we don't poll, and any
+        fault edges wait in keypad's queue until we're moving again."""
+        self._isMoving = isMoving
+        if isMoving:
+            self._armEvent.set()
+
+    def poll(self):
+        """Handle any fault edges keypad has queued up. Returns True if we saw a new fault."""
+
+        gotFault = False
+
+        while self._keys.events.get_into(self._event):
+
+            if self._event.pressed:
+                # ticks_ms wraps at 2**29, so mask the subtraction
+                self.lastFaultTicksMs = self._event.timestamp
+                self.lastFaultLatencyMs = (supervisor.ticks_ms() - self._event.timestamp) & 0x1FFFFFFF
+                self.isFaulted = True
+                self.faultCtr += 1
+                gotFault = True
+
+                self.faultLog.append((self.lastFaultTicksMs, self.lastFaultLatencyMs))
+                if len(self.faultLog) > self.faultLogMax:
+                    self.faultLog.pop(0)
+
+                print(self.name, "Diag Pin FAULT!!! ticksMs:", self.lastFaultTicksMs, "latencyMs:", self.lastFaultLatencyMs, "faultCtr:", self.faultCtr)
+
+                if self.onFaultCb != None:
+                    self.onFaultCb()
+
+            else:
+                self.isFaulted = False
+                print(self.name, "Diag Pin cleared")
+
+        return gotFault
+
+    async def asyncTaskWatchDiag(self):
+        """Infinite loop task that handles fault edges as soon as keypad sees them."""
+
+        print(self.name, "Starting infinite async diag watcher task...")
+
+        while True:
+
+            if self._isArmed and self._isMoving:
+                self.poll()
+                await asyncio.sleep(self.pollSecs)
+            else:
+                # Driver is disabled, or the motor is standing still, so park until arm() or
+                # setMoving() wakes us back up
+                self._armEvent.clear()
+                await self._armEvent.wait()
+
+    def deinit(self):
+        self._keys.deinit()
@@ -0,0 +1,91 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This is the DRV8825 driver backend for the elevator's ramp engine
+
+import digitalio
+
+class Drv8825Driver:
+    """The DRV8825 specific bits of spinning the elevator (see ramp_engine.py), for the older
+    boards in the field.
+
+    The DRV8825 has no UART. Microstepping is set by its M0/M1/M2 pins, which it reads on every
+    step, so we can switch microstepping on the fly just by changing the pins. Current is set by
+    the Vref pot on the board, so we can't drop to a hold current and there's no StallGuard.
+    Sleep and Reset are active low, so we hold them high to keep the chip running.
+
+    Which pins those are wired to depends on the board, so pass them in (see board_config.py).
+    Pass None for any that are jumpered on the board instead. Without all three M pins we can't
+    switch microstepping, and the jumpers have to set 8 microsteps.
+
+    nFAULT is active low (open drain)."""
+
+    def __init__(self, pinM0=None, pinM1=None, pinM2=None, pinSleep=None, pinReset=None):
+
+        self.diagActiveHigh = False
+
+        # M2 M1 M0 for each microstep setting. 8 microsteps is what our step counts are based on.
+        self.modePins = {
+            1: (False, False, False),
+            2: (False, False, True),
+            4: (False, True, False),
+            8: (False, True, True),
+            16: (True, False, False),
+            32: (True, False, True),
+        }
+
+        self._pinM0 = self.openOutput(pinM0, False)
+        self._pinM1 = self.openOutput(pinM1, False)
+        self._pinM2 = self.openOutput(pinM2, False)
+        if self.canSwitchMicrosteps():
+            self.setMicrosteps(8)
+
+        # For Drv8825 we had Sleep and Reset pins as well
+        # They both are active low, so we must pull them high to enable the chip
+        self._pinSleep = self.openOutput(pinSleep, True) # Pulled high
+        self._pinReset = self.openOutput(pinReset, True) # Pulled high
+
+    def openOutput(self, pin, value):
+        """Open pin as an output set to value, or None if it's jumpered on the board."""
+        if pin == None:
+            return None
+        p = digitalio.DigitalInOut(pin)
+        p.direction = digitalio.Direction.OUTPUT
+        p.value = value
+        return p
+
+    def canSwitchMicrosteps(self):
+        return self._pinM0 != None and self._pinM1 != None and self._pinM2 != None
+
+    def setMicrosteps(self, microsteps):
+        m2, m1, m0 = self.modePins[microsteps]
+        self._pinM2.value = m2
+        self._pinM1.value = m1
+        self._pinM0.value = m0
+
+    def setCurrent(self, ihold, irun, iholdDelay):
+        """The Vref pot sets our current, so we can't. Returns False."""
+        return False
+
+    def setHoldCurrent(self, ihold):
+        """Same deal. Returns None."""
+        return None
+
+    def canDetectStall(self):
+        """nFAULT only flags over current and over temp, never a stall."""
+        return False
+
+    def readStallGuard(self):
+        """No StallGuard on the DRV8825, so always None."""
+        return None
+
+    def dump(self):
+        print("Driver: DRV8825")
+        for name, p in (("M0", self._pinM0), ("M1", self._pinM1), ("M2", self._pinM2), ("Sleep", self._pinSleep), ("Reset", self._pinReset)):
+            if p == None:
+                print(name + ": jumpered")
+            else:
+                print(name + ":", p.value)
+
+    def deinit(self):
+        for p in (self._pinM0, self._pinM1, self._pinM2, self._pinSleep, self._pinReset):
+            if p != None:
+                p.deinit()
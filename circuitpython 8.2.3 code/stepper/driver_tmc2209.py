@@ -0,0 +1,120 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This is the TMC2209 driver backend for the elevator's ramp engine
+
+import math
+from stepper.tmc2209.tmc import tmc_2209_reg as reg
+
+class Tmc2209Driver:
+    """The TMC2209 specific bits of spinning the elevator (see ramp_engine.py).
+
+    Our MS1/MS2 pins are wired to GND, which is 8 microsteps. Everything else (switching
+    microstepping on the fly, setting the run/hold current, reading the StallGuard load) goes
+    over UART thru an optional TMC_2209 object (see stepper/tmc2209/tmc). Without one we just do
+    step/dir/enable like always and skip the UART based features.
+
+    Microstep switches happen mid-ramp, so they can't go thru TMC_2209.setMicrosteppingResolution(),
+    which does about 9 register reads plus a checked write (~85 ms of blocking sleeps). Instead we
+    read CHOPCONF and turn on mstep_reg_select once here at boot, and each switch is then a single
+    unchecked CHOPCONF write from our cached copy (~5 ms, mostly the UART's communication_pause).
+    If you change other CHOPCONF bits thru the tmc after this, call cacheChopconf() again.
+
+    Current changes happen mid-ramp too (see current_boost.py), so setCurrent() is the same deal.
+    TMC_2209.setIRun_Ihold() does a checked write, which reads IFCNT before and after (~15 ms of
+    blocking sleeps). We do a single unchecked IHOLD_IRUN write instead, and skip it entirely if
+    the value hasn't changed since our last one.
+
+    DIAG is active high."""
+
+    def __init__(self, tmc=None):
+
+        self.tmc = tmc
+        self.diagActiveHigh = True
+        # SGTHRS we set on the driver with setStallThreshold(), or None if we never did. Without
+        # it the driver never flags a stall on DIAG.
+        self.stallThreshold = None
+
+        # Our copy of CHOPCONF, so microstep switches don't have to read it first
+        self._chopconf = None
+        # Last IHOLD_IRUN we wrote. The register is write only, so we don't know it until we write it.
+        self._iholdIrun = None
+        if tmc != None:
+            self.cacheChopconf()
+
+        # NOW just setting these pins to GND via wires, instead of using up ports
+        # self._pinMs1Pin = board.IO9
+        # self._pinMs2Pin = board.IO15
+        # # set ms1/ms2 pins to gnd to do 8 microsteps
+        # self._pinMs1 = digitalio.DigitalInOut(self._pinMs1Pin)
+        # self._pinMs1.direction = digitalio.Direction.OUTPUT
+        # self._pinMs1.value = False #GND
+        # # self._pinMs1.pull = digitalio.Pull.DOWN
+        # self._pinMs2 = digitalio.DigitalInOut(self._pinMs2Pin)
+        # self._pinMs2.direction = digitalio.Direction.OUTPUT
+        # self._pinMs2.value = False #GND
+        # # self._pinMs2.pull = digitalio.Pull.DOWN
+
+    def canSwitchMicrosteps(self):
+        return self.tmc != None
+
+    def cacheChopconf(self):
+        """Let the driver take its microstepping from CHOPCONF rather than the MS1/MS2 pins, and
+        read CHOPCONF into our cache. Slow (several checked register reads and writes), so only
+        at boot."""
+        self.tmc.setMStepResolutionRegSelect(True)
+        self._chopconf = self.tmc.tmc_uart.read_int(reg.CHOPCONF)
+
+    def setMicrosteps(self, microsteps):
+        # MRES is 8 for full steps down to 0 for 256 microsteps, in bits 24-27
+        mres = 8 - int(math.log(microsteps, 2) + 0.5)
+        self._chopconf = (self._chopconf & ~(0x0F << 24)) | (mres << 24)
+        self.tmc.tmc_uart.write_reg(reg.CHOPCONF, self._chopconf)
+
+    def setCurrent(self, ihold, irun, iholdDelay):
+        """Set the hold and run current scale (CS 0-31). Returns False if we can't."""
+        if self.tmc == None:
+            return False
+        val = ihold | irun << 8 | iholdDelay << 16
+        if val != self._iholdIrun:
+            self.tmc.tmc_uart.write_reg(reg.IHOLD_IRUN, val)
+            self._iholdIrun = val
+        return True
+
+    def setHoldCurrent(self, ihold):
+        """Change just the hold current (IHOLD, CS 0-31), keeping the IRUN and IHOLDDELAY from our
+        last setCurrent(). Returns the IHOLD it replaced, or None if we can't. IHOLD_IRUN is write
+        only, so if nobody has called setCurrent() yet we don't know the run current, and we leave
+        the register alone rather than clobber it."""
+        if self.tmc == None or self._iholdIrun == None:
+            return None
+        oldIhold = self._iholdIrun & 0x1F
+        self.setCurrent(ihold, (self._iholdIrun >> 8) & 0x1F, (self._iholdIrun >> 16) & 0x0F)
+        return oldIhold
+
+    def setStallThreshold(self, sgthrs):
+        """Set SGTHRS so the driver flags a stall on DIAG once SG_RESULT drops to 2 * sgthrs.
+        Returns False if we can't."""
+        if self.tmc == None:
+            return False
+        self.tmc.setStallguard_Threshold(sgthrs)
+        self.stallThreshold = sgthrs
+        return True
+
+    def canDetectStall(self):
+        """True if a stall would actually show up as a diag fault."""
+        return self.stallThreshold != None
+
+    def readStallGuard(self):
+        """Returns the driver's SG_RESULT, or None if we can't read it."""
+        if self.tmc == None:
+            return None
+        return self.tmc.getStallguard_Result()
+
+    def dump(self):
+        print("Driver: TMC2209 UART:", self.tmc != None)
+        # print("MS1:", self._pinMs1.value)
+        # print("MS2:", self._pinMs2.value)
+
+    def deinit(self):
+        # self._pinMs1.deinit()
+        # self._pinMs2.deinit()
+        pass
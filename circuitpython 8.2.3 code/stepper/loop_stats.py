@@ -0,0 +1,53 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This keeps track of how often a motor's spin loop wakes up and how smooth its ramps are
+
+class LoopStats:
+    """Our spin loops tick fast while ramping and slow while cruising or stopped. This counts
+    how many times the loop woke up in each state, so you can see the slow tick really saves
+    wakeups, and how big each frequency change was while ramping, so you can see the fast
+    tick really makes the ramp smoother.
+
+    Call reset() when the motor turns on, wake() each time thru the loop, rampStep() each
+    time the loop changes frequency while ramping, and report() when the motor turns off."""
+
+    def __init__(self, name):
+
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        # Wakeups per state name, e.g. {"accel": 120, "maxspeed": 16, ...}
+        self.wakeCtrs = {}
+        # Ramp smoothness. How many freq changes we did while ramping, the biggest one,
+        # and the total so we can get the average.
+        self.rampStepCtr = 0
+        self.rampStepMaxHz = 0
+        self.rampStepTotalHz = 0
+
+    def wake(self, stateName):
+        self.wakeCtrs[stateName] = self.wakeCtrs.get(stateName, 0) + 1
+
+    def rampStep(self, prevFreq, newFreq):
+        jump = abs(newFreq - prevFreq)
+        if jump == 0:
+            return
+        self.rampStepCtr += 1
+        self.rampStepTotalHz += jump
+        if jump > self.rampStepMaxHz:
+            self.rampStepMaxHz = jump
+
+    def report(self):
+        """Prints and returns our stats since the last reset()."""
+
+        avg = 0
+        if self.rampStepCtr > 0:
+            avg = self.rampStepTotalHz / self.rampStepCtr
+
+        stats = {
+            'wakeups': self.wakeCtrs,
+            'rampSteps': self.rampStepCtr,
+            'rampStepMaxHz': self.rampStepMaxHz,
+            'rampStepAvgHz': round(avg, 1),
+        }
+        print(self.name, "loop stats:", stats)
+        return stats
@@ -0,0 +1,126 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This precomputes the acceleration ramp for the elevator stepper motor
+
+import math
+from array import array
+
+class MotionProfile:
+    """This class computes a jerk-limited (S-curve) frequency ramp one time into a
+    compact array('H') table. Entry 0 is freqMin and the last entry is freqMax, with one
+    entry per tickSecs of ramp time.
+
+    To accelerate, play the table forward one entry per tick. To decelerate, play the
+    same table backwards, so the decel always mirrors the accel no matter where in the
+    ramp we turn around.
+
+    Set jerk to 0 to get a plain trapezoid (linear ramp at accel Hz/s).
+
+    If you pass in a PwmCalibration, the table holds the frequency to request from the pwm
+    hardware so that the pin really runs at the ramp frequency."""
+
+    def __init__(self, freqMin=10, freqMax=1200, accel=1200, jerk=2400, tickSecs=0.1, calibration=None):
+
+        # Our frequencies are step frequencies in Hz, which is steps/sec.
+        # accel is in Hz/sec, i.e. how fast the step frequency is allowed to change.
+        # jerk is in Hz/sec/sec, i.e. how fast the accel itself is allowed to change.
+        # The old linear ramp did 30 Hz every 0.1 secs, which is 300 Hz/sec with infinite jerk.
+        self.freqMin = freqMin
+        self.freqMax = freqMax
+        self.accel = accel
+        self.jerk = jerk
+        self.tickSecs = tickSecs
+        self.calibration = calibration
+
+        # These get filled in by build()
+        self.table = None
+        # The step frequency each entry really runs at, i.e. table before calibration
+        self.freqs = None
+        self.lastIdx = 0
+        # stopSteps[i] is how many more steps it takes to ramp all the way down to a stop once
+        # we've done our tick at table[i]
+        self.stopSteps = None
+
+        self.build()
+
+    def build(self):
+        """Compute the ramp table from freqMin to freqMax. Call this again if you change
+        any of the profile settings."""
+
+        deltaFreq = self.freqMax - self.freqMin
+        accel = self.accel
+
+        if deltaFreq <= 0:
+            # Nothing to ramp, so the table is just the one frequency
+            jerkSecs = 0
+            accelSecs = 0
+        elif self.jerk <= 0:
+            # Trapezoid. No jerk phase, just constant accel the whole way.
+            jerkSecs = 0
+            accelSecs = deltaFreq / accel
+        else:
+            # S-curve. If we don't have room to reach full accel before we need to start
+            # easing off again, then we never get to full accel. So lower the peak accel
+            # to what the jerk limit lets us reach in half the ramp.
+            if deltaFreq < accel * accel / self.jerk:
+                accel = math.sqrt(deltaFreq * self.jerk)
+            jerkSecs = accel / self.jerk
+            accelSecs = deltaFreq / accel - jerkSecs
+
+        totalSecs = 2 * jerkSecs + accelSecs
+
+        # One entry per tick, plus one more so we always land exactly on freqMax
+        cnt = int(math.ceil(totalSecs / self.tickSecs)) + 1
+
+        table = array('H')
+        freqs = array('H')
+        stopSteps = array('L')
+        stepsSoFar = 0.0
+        for i in range(cnt):
+            t = i * self.tickSecs
+            if t < jerkSecs:
+                # Easing into the ramp. Accel grows linearly, so freq grows with t squared.
+                f = self.jerk * t * t / 2
+            elif t < jerkSecs + accelSecs:
+                # Constant accel in the middle of the ramp
+                f = accel * jerkSecs / 2 + accel * (t - jerkSecs)
+            elif t < totalSecs:
+                # Easing out of the ramp. Mirror image of easing in.
+                u = totalSecs - t
+                f = deltaFreq - self.jerk * u * u / 2
+            else:
+                f = deltaFreq
+            f = self.freqMin + f
+
+            # Ramping down after our tick at entry i means one tick at each of entries i-1, ... 0
+            stopSteps.append(int(stepsSoFar + 0.5))
+            stepsSoFar += f * self.tickSecs
+            freqs.append(int(f + 0.5))
+
+            if self.calibration != None:
+                table.append(self.calibration.requestFor(f))
+            else:
+                table.append(int(f + 0.5))
+
+        # Make sure rounding doesn't leave us short of (or over) our max
+        if self.calibration != None:
+            table[cnt - 1] = self.calibration.requestFor(self.freqMax)
+        else:
+            table[cnt - 1] = self.freqMax
+        freqs[cnt - 1] = self.freqMax
+
+        self.table = table
+        self.freqs = freqs
+        self.stopSteps = stopSteps
+        self.lastIdx = cnt - 1
+
+        print("Built motion profile. freqMin:", self.freqMin, "freqMax:", self.freqMax, "accel:", accel, "jerk:", self.jerk, "rampSecs:", totalSecs, "entries:", cnt)
+
+    def isStale(self, freqMin, freqMax, accel, jerk, tickSecs):
+        """Returns True if this profile was built with different settings than the ones
+        given, so the caller knows to rebuild."""
+        return (self.freqMin != freqMin or self.freqMax != freqMax
+                or self.accel != accel or self.jerk != jerk or self.tickSecs != tickSecs)
+
+    def rampSecs(self):
+        """How long a full ramp from freqMin to freqMax takes when played back at tickSecs."""
+        return self.lastIdx * self.tickSecs
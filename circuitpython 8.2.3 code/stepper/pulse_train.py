@@ -0,0 +1,154 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This sends a number of step pulses at a given rate as a PWM burst
+
+import asyncio
+import time
+import pwmio
+
+class PulseTrain:
+    """Toggling the step pin ourselves with time.sleep() between edges tops out around 500
+    steps/sec, and awaiting between edges means thousands of trips thru the event loop per move.
+    Instead we run the step pin as a PWM burst at the step rate, so the pwm hardware makes the
+    pulses, and only wake up when the burst should be over. That's the same trick the agitator's
+    rock ramp uses (see rockSegmentStart() in stepper_tmc2209_agitator.py).
+
+    (We tried pulseio.PulseOut first, but PulseOut.send() blocks the whole board until its
+    pulses are out, and the RMT carrier on the ESP32-S2 can't go as slow as our 500 Hz
+    defaultRate anyway.)
+
+    The burst starts with a rising edge, so step n rises at (n-1) periods in. We aim to end the
+    burst half a period after the last step's rising edge. We sleep most of the way with
+    asyncio.sleep() so other tasks run, then time.sleep() the last few ms so we don't overshoot
+    by however late the event loop wakes us. If you give us a countPin wired back to the step
+    pin (like the elevator's loopback), we count the pulses with countio instead and end the
+    burst on the count. lastSteps is how many steps we think really went out.
+
+    To run at one rate for a long time, like spinning, call start(rate) once, then run() to
+    turn the pulses on and halt() to turn them off as often as you like, then stop().
+
+    The pwm needs the step pin to itself, so deinit() any DigitalInOut on the pin before start()
+    (or send()) and re-create it after stop()."""
+
+    def __init__(self, pin, countPin=None):
+
+        self.pin = pin
+        self.countPin = countPin
+
+        # We sleep with asyncio until this long before the burst should end, then finish off with
+        # a blocking time.sleep() (or by watching the counter)
+        self.slackSecs = 0.003
+
+        # Stats about the last move so you can see what we did
+        self.lastSteps = 0
+        self.lastRate = 0
+
+        # The pwm (and counter) between start() and stop()
+        self._pwm = None
+        self._counter = None
+        self._freq = 0
+        self._startNs = 0
+        self._countStart = 0
+
+    def isStarted(self):
+        return self._pwm != None
+
+    def start(self, rate):
+        """Take over the step pin and get ready to step at rate steps/sec."""
+
+        if rate <= 0:
+            raise ValueError("PulseTrain rate must be above 0: " + str(rate))
+
+        self._pwm = pwmio.PWMOut(self.pin, frequency=int(rate + 0.5), duty_cycle=0, variable_frequency=True)
+        # The pwm can't always hit the exact frequency, so time things off what it really does
+        self._freq = self._pwm.frequency
+        if self.countPin != None:
+            import countio
+            self._counter = countio.Counter(self.countPin, edge=countio.Edge.RISE)
+        self.lastRate = self._freq
+        self.lastSteps = 0
+
+    def stop(self):
+        """Give the step pin back."""
+        if self._pwm != None:
+            self.halt()
+            self._pwm.deinit()
+            self._pwm = None
+        if self._counter != None:
+            self._counter.deinit()
+            self._counter = None
+
+    def run(self):
+        """Start stepping at the start() rate until halt()."""
+        if self._pwm.duty_cycle == 0:
+            self._startNs = time.monotonic_ns()
+            if self._counter != None:
+                self._countStart = self._counter.count
+            self._pwm.duty_cycle = 2 ** 15
+
+    def halt(self):
+        """Stop stepping, and add however many steps went out since run() to lastSteps."""
+        if self._pwm.duty_cycle == 0:
+            return
+        self._pwm.duty_cycle = 0
+        self.lastSteps += self.stepsSinceRun()
+
+    def stepsSinceRun(self):
+        if self._counter != None:
+            return self._counter.count - self._countStart
+        # Steps rise at the start of each period, so we've done one as soon as we start
+        return int((time.monotonic_ns() - self._startNs) * self._freq / 1000000000) + 1
+
+    def secsLeft(self, steps):
+        """How long until we're half a period past the rising edge of step number steps."""
+        return (self._startNs - time.monotonic_ns()) / 1000000000 + (steps - 0.5) / self._freq
+
+    def sendSteps(self, steps):
+        """Emit steps steps at the start() rate. Blocks until they're out."""
+
+        if steps <= 0:
+            return
+        self.run()
+        if self._counter != None:
+            while self.stepsSinceRun() < steps:
+                pass
+        else:
+            time.sleep(max(self.secsLeft(steps), 0))
+        self.halt()
+
+    async def sendStepsAsync(self, steps):
+        """Emit steps steps at the start() rate, letting other tasks run while they go out."""
+
+        if steps <= 0:
+            return
+        self.run()
+        await asyncio.sleep(max(self.secsLeft(steps) - self.slackSecs, 0))
+        if self._counter != None:
+            # Watch the counter for the last few steps
+            while self.stepsSinceRun() < steps:
+                await asyncio.sleep(0)
+        else:
+            # Only the last few ms are left, so wait them out right here rather than risk the
+            # event loop waking us late
+            time.sleep(max(self.secsLeft(steps), 0))
+        self.halt()
+
+    def sendBlocking(self, steps, rate):
+        """Emit steps step pulses at rate steps/sec. Returns when they're all out."""
+        if steps <= 0:
+            return
+        self.start(rate)
+        try:
+            self.sendSteps(steps)
+        finally:
+            self.stop()
+
+    async def send(self, steps, rate):
+        """Emit steps step pulses at rate steps/sec, letting other tasks run while they go out.
+        Returns when they're all out."""
+        if steps <= 0:
+            return
+        self.start(rate)
+        try:
+            await self.sendStepsAsync(steps)
+        finally:
+            self.stop()
@@ -0,0 +1,198 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This figures out what frequency the PWM hardware really gives us for each frequency we ask for
+
+from array import array
+
+class PwmCalibration:
+    """The PWM hardware can't hit every frequency exactly, so when we set pwm.frequency = 1200
+    we may really get something a bit different. This class sweeps the requested frequencies
+    from freqMin to freqMax in stepHz increments, records what pwm.frequency reports back, and
+    caches that requested->actual lookup table in a small text file on flash so we only have
+    to probe once.
+
+    Use actualFor() to find out what we'll really get for a requested frequency, and requestFor()
+    to find out what to ask for to really get a given frequency."""
+
+    def __init__(self, pinName, freqMin, freqMax, stepHz=10):
+
+        self.pinName = pinName
+        self.freqMin = freqMin
+        self.freqMax = freqMax
+        self.stepHz = stepHz
+
+        self.fileName = "pwmcal_" + pinName + ".txt"
+
+        # Parallel arrays. requested[i] is what we asked for, actual[i] is what we got.
+        self.requested = array('H')
+        self.actual = array('f')
+        # True once our table is on flash, either because we loaded it or saved it
+        self.isSaved = False
+
+    def loadOrProbe(self, pwm):
+        """Load our table from flash if we have one for the same freqMin/freqMax/stepHz.
+        Otherwise probe the pin and save the results. At boot the drive usually isn't writable
+        yet, so call saveIfNeeded() again once it's been remounted."""
+
+        if self.load():
+            self.isSaved = True
+        else:
+            self.probe(pwm)
+            self.save()
+
+    def saveIfNeeded(self):
+        """Save our table if it isn't on flash yet, like when we probed before the drive got
+        remounted writable."""
+        if not self.isSaved:
+            self.save()
+
+    def probe(self, pwm):
+        """Sweep the pwm frequency from freqMin to freqMax and record what it actually gets set to.
+        Only call this while the motor is off (duty_cycle of 0), since we're changing frequency a lot."""
+
+        print("PWM cal probing", self.pinName, "from", self.freqMin, "to", self.freqMax, "every", self.stepHz, "Hz...")
+
+        # Put the pin back the way we found it when we're done
+        origFreq = pwm.frequency
+
+        self.requested = array('H')
+        self.actual = array('f')
+        unachievable = 0
+
+        for freq in range(self.freqMin, self.freqMax + 1, self.stepHz):
+            try:
+                pwm.frequency = freq
+            except ValueError:
+                # The pwm hardware can't do this frequency at all
+                unachievable += 1
+                continue
+            self.requested.append(freq)
+            self.actual.append(pwm.frequency)
+
+        pwm.frequency = origFreq
+
+        if unachievable > 0:
+            print("PWM cal", self.pinName, "could not set", unachievable, "of the requested frequencies")
+
+        self.report()
+
+    def load(self):
+        """Read our table back from flash. Returns False if there is no file or it was probed
+        with different settings, in which case you need to probe again."""
+
+        try:
+            f = open(self.fileName, "r")
+        except OSError:
+            print("PWM cal no table on disk yet for", self.pinName)
+            return False
+
+        # First line is our settings so we can tell if the table is stale
+        header = f.readline().strip()
+        if header != "{},{},{}".format(self.freqMin, self.freqMax, self.stepHz):
+            f.close()
+            print("PWM cal table on disk for", self.pinName, "is for different settings:", header)
+            return False
+
+        self.requested = array('H')
+        self.actual = array('f')
+        for line in f:
+            vals = line.strip().split(",")
+            if len(vals) == 2:
+                self.requested.append(int(vals[0]))
+                self.actual.append(float(vals[1]))
+        f.close()
+
+        print("PWM cal loaded", len(self.requested), "entries from disk for", self.pinName)
+        return len(self.requested) > 0
+
+    def save(self):
+        """Write our table to flash. This needs the drive remounted as writable, so if it's not
+        we just skip saving and will probe again next boot."""
+
+        try:
+            f = open(self.fileName, "w")
+            f.write("{},{},{}\n".format(self.freqMin, self.freqMax, self.stepHz))
+            for i in range(len(self.requested)):
+                f.write("{},{}\n".format(self.requested[i], self.actual[i]))
+            f.flush()
+            f.close()
+            print("PWM cal saved table to disk for", self.pinName)
+            self.isSaved = True
+        except OSError as e:
+            print("PWM cal could not save table to disk for", self.pinName, "err:", e)
+
+    def report(self):
+        """Print the achievable range and resolution we found for this pin. The resolution is the
+        biggest jump between neighboring actual frequencies, i.e. how coarsely we can really
+        change speed. The error is how far off the pin was from what we asked for."""
+
+        cnt = len(self.requested)
+        if cnt == 0:
+            print("PWM cal", self.pinName, "has no entries")
+            return
+
+        maxErr = 0
+        resolution = 0
+        for i in range(cnt):
+            err = abs(self.actual[i] - self.requested[i])
+            if err > maxErr:
+                maxErr = err
+            if i > 0:
+                gap = self.actual[i] - self.actual[i - 1]
+                if gap > resolution:
+                    resolution = gap
+
+        print("PWM cal", self.pinName, "range:", min(self.actual), "to", max(self.actual), "Hz",
+              "resolution:", resolution, "Hz", "max error:", maxErr, "Hz", "entries:", cnt)
+
+    def actualFor(self, freq):
+        """Returns the frequency the pin will really run at if we request freq. We interpolate
+        between the probed entries. If we have no table we just assume we get what we ask for."""
+
+        cnt = len(self.requested)
+        if cnt == 0:
+            return freq
+        if freq <= self.requested[0]:
+            return self.actual[0]
+        if freq >= self.requested[cnt - 1]:
+            return self.actual[cnt - 1]
+
+        # Entries are evenly spaced by stepHz (unless some were unachievable), so start with a
+        # good guess at the index and walk to the right spot
+        i = min((freq - self.requested[0]) // self.stepHz, cnt - 2)
+        while i > 0 and self.requested[i] > freq:
+            i -= 1
+        while i < cnt - 2 and self.requested[i + 1] < freq:
+            i += 1
+
+        r0 = self.requested[i]
+        r1 = self.requested[i + 1]
+        return self.actual[i] + (self.actual[i + 1] - self.actual[i]) * (freq - r0) / (r1 - r0)
+
+    def requestFor(self, freq):
+        """Returns what frequency we should request so the pin really runs at freq. This is the
+        inverse of actualFor(). If we have no table we just request what we want."""
+
+        cnt = len(self.actual)
+        if cnt == 0:
+            return int(freq)
+        if freq <= self.actual[0]:
+            return self.requested[0]
+        if freq >= self.actual[cnt - 1]:
+            return self.requested[cnt - 1]
+
+        # Binary search for the pair of actual entries that surround freq
+        lo = 0
+        hi = cnt - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.actual[mid] <= freq:
+                lo = mid
+            else:
+                hi = mid
+
+        a0 = self.actual[lo]
+        a1 = self.actual[hi]
+        if a1 == a0:
+            return self.requested[lo]
+        r = self.requested[lo] + (self.requested[hi] - self.requested[lo]) * (freq - a0) / (a1 - a0)
+        return int(r + 0.5)
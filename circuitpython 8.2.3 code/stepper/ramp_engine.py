@@ -0,0 +1,1085 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This is the PWM ramp engine for the main elevator stepper motor, for any driver board
+
+import digitalio
+import board
+import time
+import asyncio
+import pwmio
+from stepper.diag_watcher import DiagWatcher
+from stepper.loop_stats import LoopStats
+from stepper.motion_profile import MotionProfile
+from stepper.pwm_calibration import PwmCalibration
+# import enum
+
+class StepperState():
+    ACCELERATING = 1
+    MAXSPEED = 2
+    DECELERATING = 3
+    STOPPED = 4
+    # Short names for printing
+    NAMES = {ACCELERATING: "accel", MAXSPEED: "maxspeed", DECELERATING: "decel", STOPPED: "stopped"}
+
+class RampEngine:
+    """Everything about spinning the elevator that doesn't care which driver chip is on the
+    board: the S-curve PWM ramp, cruise speed changes, launches, scoop aligned stops, the hold
+    window, the state callbacks and the async spin task.
+
+    The driver specific bits go thru a driver backend object (see driver_tmc2209.py and
+    driver_drv8825.py). The backend tells us if the driver can switch microstepping on the fly,
+    switches it, sets the run/hold current if the driver can do that, reads the StallGuard load
+    if the driver has one, and says which way its fault pin goes. Don't create this directly,
+    use the Stepper for your board (stepper_tmc2209_pwm.py or stepper_drv8825_pwm.py)."""
+
+    def __init__(self, driver, onAccelCb=None, onMaxSpeedCb=None, onDecelCb=None, onStoppedCb=None, onFaultCb=None):
+
+        print("Initting Elevator Stepper library...")
+
+        # Setup callbacks
+        self.onAccelCb = onAccelCb
+        self.onMaxSpeedCb = onMaxSpeedCb
+        self.onDecelCb = onDecelCb
+        self.onStoppedCb = onStoppedCb
+        self.onFaultCb = onFaultCb
+
+        # Our driver backend, for the things that differ between driver chips
+        self.driver = driver
+
+        # Setup our state
+        self.state = StepperState.STOPPED
+
+        # Setup pins
+        self._pinEnablePin = board.IO5
+        self._pinDirPin = board.IO6
+        self._pinStepPin = board.IO7
+        self._pinDiagPin = board.IO8
+
+        self._minPulseWidth = 0.001 #0.00055
+
+        # open pins
+        self._pinEnable = digitalio.DigitalInOut(self._pinEnablePin)
+        self._pinEnable.direction = digitalio.Direction.OUTPUT
+        self._pinDir = digitalio.DigitalInOut(self._pinDirPin)
+        self._pinDir.direction = digitalio.Direction.OUTPUT
+        # self._pinStep = digitalio.DigitalInOut(self._pinStepPin)
+        # self._pinStep.direction = digitalio.Direction.OUTPUT
+        # Watch the diag pin for driver faults in the background rather than polling it each tick
+        self.diag = DiagWatcher(self._pinDiagPin, "Elevator", self.onDiagFault, driver.diagActiveHigh)
+
+        # setup pinStep as PWM output
+        self.freqMin = 10   # we can't go below this (pwm hardware won't support it)
+        # v2 has 3 gears: 10 teeth to 18 to 38, so 10/18 = 0.55 turns on gear 2 for 1 turn on gear 1 (the stepper motor)
+        # then 18/38 for gear 2 to 3 is 0.47. so 0.55 * 0.47 = 0.26. so for 1 turn in we get a 1/4 turn out which is 4:1 reduction
+        # so 300 rpm in v1 to have same speed in v2 is 300 * 4 = 1200
+        self.freqMax = 1200 #1200 for v2 with gearing #300 for v1 with straight stepper rather than with gearing #700 #1000 # we can't go above as motor would turn too fast
+        # The highest frequency we ever ask the pin for. freqMax can get raised on the fly (see
+        # SpeedLearner), but never above maxFineFreq(), which takes microstep switching into account.
+        self.freqCeiling = 1600
+        # The ramp used to be a linear 30 Hz per 0.1 sec tick, which took ~4 secs to get to freqMax
+        # and tended to stall the loaded motor near the top. Now we use an S-curve so the accel
+        # eases in and out. accel is in Hz/sec, jerk is in Hz/sec/sec. Set jerk to 0 for a plain trapezoid.
+        self.accel = 1200
+        self.jerk = 2400
+        # How long we sleep each time thru our async spin loop while ramping. The ramp table has one
+        # entry per tick, so a short tick means lots of small freq changes and a smoother ramp.
+        self.tickSecs = 0.01
+        # While cruising at max speed (or stopped) there's nothing to ramp, so we only wake up this
+        # often. spinAsyncStart()/spinAsyncStop() wake us right away so we don't react late.
+        self.cruiseTickSecs = 0.25
+        # How long we asked to sleep last time thru the loop
+        self._sleepSecs = self.tickSecs
+        # Wakeups per state and ramp smoothness for each run
+        self.loopStats = LoopStats("Elevator")
+        self._pinStep = pwmio.PWMOut(
+            self._pinStepPin, 
+            frequency=self.freqMax, # Not allowed to set to 0, so use duty_cycle as our method of turning off stepper
+            duty_cycle=0, #2 ** 15,  # Cycles the pin with 50% duty cycle (half of 2 ** 16) 
+            variable_frequency=True
+            )
+        # track our own frequency since the actual frequency of the pin ends up at a different number
+        # than what we originally set it to, so our math gets screwed up unless we track on our own.
+        # freq is what we asked the pin for. fineFreq is the step rate we're going for in 8 microstep
+        # steps, which is the same thing unless we've switched to coarser microstepping (see stepMult).
+        self.freq = self.freqMin
+        self.fineFreq = self.freqMin
+
+        # The driver starts out at 8 microsteps, and all our freqs, ramps and step counts are in
+        # 8 microstep steps. If the driver can switch on the fly, above coarseAboveFreq we switch it
+        # to microsteps / coarseMult and run the pin coarseMult times slower for the same
+        # belt speed, then switch back below fineBelowFreq. That way the pwm's frequency range goes
+        # coarseMult times further and the low speed accel stays smooth.
+        self.microsteps = 8
+        self.microstepSwitching = True
+        self.coarseMult = 2
+        self.coarseAboveFreq = 800
+        self.fineBelowFreq = 700
+        # How many 8 microstep steps each pulse on the pin is worth right now
+        self.stepMult = 1
+
+        # Probe (or load from flash) what frequency the pin really gives us for each one we ask for.
+        # Our ramp table then asks for whatever gets us the real frequency we want, and
+        # getActualFreq() tells us the real step rate for the current self.freq.
+        # We probe all the way to freqCeiling so the table still covers us if freqMax gets raised.
+        self.calibration = PwmCalibration("IO7", self.freqMin, self.freqCeiling)
+        self.calibration.loadOrProbe(self._pinStep)
+
+        # The speed setTargetSpeed() wants us to cruise at. None means cruise at freqMax.
+        self.targetFreq = None
+
+        # Precompute our accel/decel ramp table. We walk forward thru it to accelerate
+        # and backward thru it to decelerate, so _rampIdx is where we're at in the ramp.
+        # The table tops out at our cruise speed (see cruiseFreq()).
+        self.profile = None
+        self.buildProfile()
+        self._rampIdx = 0
+        # Where in the ramp table we're headed while spinning. Normally the top (freqMax), but
+        # launch() moves it around so we end up stopped in exactly the right number of steps.
+        self._rampTargetIdx = self.profile.lastIdx
+
+        # When the cruise speed changes while we're at speed, we move to the new speed on its own
+        # S-curve ramp table, from the slower speed to the faster one. We walk it forward to speed
+        # up or backward to slow down. None if we're not changing cruise speed.
+        self._transition = None
+        self._transIdx = 0
+        self._transUp = True
+
+        # If True, we figure out how far to move thru the ramp table from the actual time that went
+        # by since our last tick, rather than assuming each asyncio.sleep(tickSecs) took exactly tickSecs.
+        # That way if the display or wifi tasks hog the loop, we catch up on the next tick and the
+        # ramp still takes the same amount of time. Set to False for the old one entry per tick behavior.
+        self.rampTimeBased = True
+        self._lastTickNs = time.monotonic_ns()
+        self._rampCarryNs = 0
+        # How late our last tick was vs tickSecs, and the worst lateness we saw this run (in ms)
+        self.tickLatenessMs = 0
+        self.tickLatenessMaxMs = 0
+
+        # Optional StepVerifier that checks the steps we command against the loopback counter.
+        # Set it with setStepVerifier() since the counter gets created after us.
+        self.verifier = None
+
+        # Optional SpeedLearner that tunes freqMax/accel from how each run went. Set it with
+        # setSpeedLearner(). cruiseSecs is how long this run has spent cruising at freqMax.
+        self.learner = None
+        self.cruiseSecs = 0
+        self._lastIntervalNs = 0
+
+        # Optional CurrentBoost that raises the motor current over UART while we accelerate.
+        # Set it with setCurrentBoost().
+        self.currentBoost = None
+
+        # When we stop, rather than disabling the driver right away (which lets the belt back-drive
+        # and the marbles fall back down), we can keep it enabled for holdSecs so the belt stays put
+        # in case they press again soon. Off (0) unless you set it, since the driver sits powered
+        # the whole window. If the driver can set its current we drop just the hold current (IHOLD)
+        # to holdIhold (CS 0-31) while holding, and put it back after. The run current (IRUN) is
+        # left alone. IHOLD_IRUN is write only, so that only works once the driver knows your
+        # currents, meaning you've called driver.setCurrent() or set a CurrentBoost. Otherwise we
+        # hold at whatever hold current the driver already has.
+        self.holdSecs = 0
+        self.holdIhold = 4
+        self._isHolding = False
+        # The IHOLD we replaced with holdIhold, to put back when the hold is over
+        self._runIhold = None
+        self._holdUntilNs = 0
+
+        # Time from a start to the first marble popping out, kept separately for starts from a hold
+        # and starts from disabled, so you can see what the hold buys you. See firstMarbleReport().
+        self.firstMarbleStats = {'hold': [0, 0.0], 'noHold': [0, 0.0]}
+        self.lastFirstMarbleSecs = 0
+        self._firstMarbleSteps = None
+        self._firstMarbleStartNs = 0
+        self._firstMarbleFromHold = False
+
+        # If True (and the driver has StallGuard), we read the driver's StallGuard result each tick while
+        # accelerating and slow down how fast we walk thru the ramp table as the load gets close to
+        # stalling. An empty belt goes thru the ramp at full speed and a full one eases into it.
+        # Since this only ever slows the ramp down, raise accel when you turn this on.
+        # SG_RESULT goes down as load goes up, and the driver calls it a stall at 2 * SGTHRS.
+        self.adaptiveAccel = False
+        self.sgThreshold = 50   # SGTHRS on the driver
+        self.sgMargin = 100     # How far above the stall level of SG_RESULT we want to stay
+        self.sgResult = -1      # Last SG_RESULT we read
+        self.adaptiveScale = 1  # Last ramp speed scale we used, 0 to 1
+        self._rampFrac = 0.0
+        # Reading SG_RESULT is a blocking UART read of ~9 ms, which is most of a 10 ms tick. So we
+        # only read it every sgSampleTicks ticks and keep using the last scale in between.
+        self.sgSampleTicks = 5
+        self._sgTickCtr = 0
+
+        # For launch(). How many steps we want to move (None if not launching), where the step
+        # count was when the launch started, and an event to tell launch() we're done.
+        self._launchTargetSteps = None
+        self._launchStartSteps = 0
+        self._launchDoneEvent = asyncio.Event()
+        self.launchedSteps = 0
+        # How long we can cruise before the launch has to check on things again
+        self._launchSlackSecs = 0
+        # How far up the ramp a launch is allowed to go
+        self._launchCapIdx = 0
+
+        # If True (and we have a step verifier), when spinAsyncStop() is called we don't just ramp
+        # down wherever we are. We plan the ramp down so the belt stops with a scoop at the pop-out
+        # position, so the marble it's carrying doesn't fall back and the next start delivers it
+        # right away. It's done like a launch() to the next scoop position we can stop at, and never
+        # speeds up. scoopStopPhaseSteps is how many steps past a multiple of stepsPerMarble (in the
+        # loopback counter's total) a scoop is at the pop-out. There's no home sensor, so tune it on the wall.
+        self.scoopAlignedStop = True
+        self.scoopStopPhaseSteps = 0
+        # How many steps past the pop-out a scoop can be and still count as at the pop-out
+        self.scoopStopToleranceSteps = 40
+        self._isScoopStop = False
+
+        # ensure disabled since GND=on and default state of pin is GND, thus drive would be on
+        self.disable()
+
+        # ensure fwd
+        self.fwd()
+
+        # For our async spin method, let's create a boolean that we can watch
+        # so if it becomes True, we can exit the async process
+        self._isAsyncSpinning = False
+
+        # While the motor is fully stopped our async spin task parks on this event rather
+        # than waking up every tick. spinAsyncStart() sets it to wake the task back up.
+        self._wakeEvent = asyncio.Event()
+
+        # print vals of pins on init
+        self.dump()
+
+    def dump(self):
+        # print vals of pins on init
+        print("---Elevator DUMP----")
+        print("Enable:", self._pinEnable.value)
+        print("Dir:", self._pinDir.value)
+        print("Step: Freq:", self._pinStep.frequency, "Duty:", self._pinStep.duty_cycle)
+        print("Diag: Faulted:", self.diag.isFaulted, "FaultCtr:", self.diag.faultCtr)
+        self.driver.dump()
+        print("-------")
+
+    def step(self):
+        
+        # print("Stepping...")
+        self._pinStep.value = True
+        time.sleep(self._minPulseWidth)
+        self._pinStep.value = False
+        time.sleep(self._minPulseWidth)
+
+    def steps(self, cnt):
+        print("Stepping", cnt, "steps...")
+        for i in range(cnt):
+            self.step()
+        print("Done stepping", cnt, "steps")
+
+    # Do steps, but enable/disable as part of it
+    def stepsEnDis(self, cnt):
+        self.enable()
+        print("Enabling. Stepping", cnt, "steps...")
+        for i in range(cnt):
+            self.step()
+        self.disable()
+        print("Disabled. Done stepping", cnt, "steps")
+
+    def enable(self):
+        # Enable Motor Outputs (GND=on, VIO=off)
+        # enable driver
+        self._pinEnable.value = False 
+        # self._pinEnable.pull = digitalio.Pull.DOWN
+        print("Elevator Enabled")
+        # Now that the driver is on, start watching for faults
+        self.diag.arm()
+
+    def disable(self):
+        # Enable Motor Outputs (GND=on, VIO=off)
+        # enable driver
+        self._pinEnable.value = True 
+        # self._pinEnable.pull = digitalio.Pull.UP
+        print("Elevator Disabled")
+        self.diag.disarm()
+
+    def fwd(self):
+        print("Elevator Going fwd")
+        self._pinDir.value = True
+
+    def rev(self):
+        print("Elevator Going rev")
+        self._pinDir.value = False
+
+    def setMinPulseWidth(self, seconds):
+        print("Set min pulse width:", seconds)
+        self._minPulseWidth = seconds
+
+    def deinit(self):
+        self._pinEnable.deinit()
+        self._pinDir.deinit()
+        self._pinStep.deinit()
+        self.diag.deinit()
+        self.driver.deinit()
+        print("Elevator Deinitted")
+
+    def buildProfile(self, freqTop=None):
+        """Compute the accel/decel ramp table from freqMin up to freqTop (our cruise speed if you
+        don't give one) using accel and jerk. This gets called for you when the motor turns on,
+        or when it's at speed, if you changed any of those settings."""
+        if freqTop == None:
+            freqTop = self.cruiseFreq()
+        self.profile = MotionProfile(self.freqMin, freqTop, self.accel, self.jerk, self.tickSecs, self.calibration)
+
+    def cruiseFreq(self):
+        """The speed we cruise at while spinning. That's whatever setTargetSpeed() asked for,
+        but never above freqMax."""
+        if self.targetFreq == None or self.targetFreq > self.freqMax:
+            return self.freqMax
+        return self.targetFreq
+
+    def setTargetSpeed(self, freq):
+        """Change the speed we cruise at to freq (step Hz). Call this any time. If we're at speed
+        we ease over to the new speed on an S-curve without stopping the belt. If we're still
+        ramping up we finish that first and then ease over. If we're stopped or stopping, the
+        next start just ramps up to the new speed. Pass None to go back to cruising at freqMax."""
+
+        if freq != None:
+            freq = int(min(max(freq, self.freqMin), self.maxFineFreq()))
+        self.targetFreq = freq
+        print("Elevator target speed:", freq, "cruise freq:", self.cruiseFreq())
+
+        # If we're cruising on the slow tick, wake up and start changing speed now
+        self._wakeEvent.set()
+
+    def startTransition(self):
+        """We're at speed and our cruise speed changed, so set up the ramp to the new one."""
+
+        curFreq = self.profile.freqMax
+        newFreq = self.cruiseFreq()
+
+        if newFreq == curFreq:
+            # Only accel/jerk changed, so just rebuild our table. Our speed doesn't change.
+            self.endTransition(curFreq)
+            return
+
+        self._transition = MotionProfile(min(curFreq, newFreq), max(curFreq, newFreq), self.accel, self.jerk, self.tickSecs, self.calibration)
+        self._transUp = newFreq > curFreq
+        print("Elevator changing cruise speed from", curFreq, "to", newFreq)
+
+        if self._transUp:
+            self._transIdx = 0
+            self.setState(StepperState.ACCELERATING)
+        else:
+            self._transIdx = self._transition.lastIdx
+            self.setState(StepperState.DECELERATING)
+
+    def stepTransition(self, rampTicks):
+        """Walk thru our cruise speed change ramp by rampTicks entries. Returns the new freq."""
+
+        t = self._transition
+        if self._transUp:
+            self._transIdx = min(self._transIdx + rampTicks, t.lastIdx)
+            isDone = self._transIdx == t.lastIdx
+            doneFreq = t.freqMax
+        else:
+            self._transIdx = max(self._transIdx - rampTicks, 0)
+            isDone = self._transIdx == 0
+            doneFreq = t.freqMin
+
+        self.setRampFreq(t, self._transIdx)
+
+        if isDone:
+            self.endTransition(doneFreq)
+        return self.fineFreq
+
+    def endTransition(self, freqReal):
+        """Go back to our normal ramp table, rebuilt to top out at freqReal which is the speed we're
+        at now, so from here a stop ramps all the way down on an S-curve."""
+
+        self._transition = None
+        self.buildProfile(freqReal)
+        self._rampIdx = self.profile.lastIdx
+        self._rampTargetIdx = self.profile.lastIdx
+        if self.profile.freqs[self._rampIdx] != self.fineFreq:
+            self.setRampFreq(self.profile, self._rampIdx)
+
+    def calibratePwm(self):
+        """Re-probe the step pin's real frequencies from freqMin to freqMax, save them to flash
+        and rebuild our ramp to use them. Only works while the motor is stopped."""
+
+        if self._pinStep.duty_cycle != 0:
+            print("Elevator can't calibrate pwm while motor is running")
+            return False
+
+        self.calibration = PwmCalibration("IO7", self.freqMin, self.freqCeiling)
+        self.calibration.probe(self._pinStep)
+        self.calibration.save()
+        self.buildProfile()
+        return True
+
+    def setStepVerifier(self, verifier):
+        """Give us a StepVerifier (see counter/step_verifier.py) and we'll feed it our commanded
+        frequency each tick so it can compare against the steps the loopback counter sees."""
+        self.verifier = verifier
+
+    def setSpeedLearner(self, learner):
+        """Give us a SpeedLearner (see stepper/speed_learner.py) and we'll tell it how each run
+        went so it can tune freqMax and accel."""
+        self.learner = learner
+
+    def startHold(self):
+        """The motor just stopped. Keep the driver enabled at a low hold current for holdSecs."""
+
+        self._isHolding = True
+        self._holdUntilNs = time.monotonic_ns() + int(self.holdSecs * 1000000000)
+
+        self._runIhold = self.driver.setHoldCurrent(self.holdIhold)
+        if self._runIhold == None:
+            print("Elevator can't lower the hold current, so holding at the driver's normal hold current")
+
+        # Nothing's moving, so no need to keep checking diag. A fault while holding gets handled
+        # when we start moving again.
+        self.diag.setMoving(False)
+
+        print("Elevator holding belt for", self.holdSecs, "secs before disabling")
+
+    def endHold(self):
+        """Hold window is over, so disable the driver."""
+        self.leaveHold()
+        self.disable()
+
+    def leaveHold(self):
+        """Done holding, so put the hold current back how it was."""
+        self._isHolding = False
+        if self._runIhold != None:
+            self.driver.setHoldCurrent(self._runIhold)
+            self._runIhold = None
+
+    def startFirstMarbleTimer(self):
+        """Called at 1st turn on. Works out how many steps it will take until a marble pops out,
+        so the loop can time it. We go by the loopback count: the next marble pops when the next
+        scoop reaches the pop-out (see scoopStopPhaseSteps). If the driver was disabled, the belt may
+        have back-driven and the top marble fallen out, so we also have to lift one more scoop.
+        That part is an estimate, since nothing on the wall actually sees the marble."""
+
+        self._firstMarbleSteps = None
+        if self.verifier == None:
+            return
+
+        mc = self.verifier.mc
+        phase = (mc.pollSteps() - self.scoopStopPhaseSteps) % mc.stepsPerMarble
+        steps = (mc.stepsPerMarble - phase) % mc.stepsPerMarble
+        if phase <= self.scoopStopToleranceSteps:
+            # A scoop stop can overshoot by a few steps, but that scoop is still sitting at the pop-out
+            steps = 0
+        if not self._isHolding:
+            steps += mc.stepsPerMarble
+
+        self._firstMarbleSteps = steps
+        self._firstMarbleStartNs = time.monotonic_ns()
+        self._firstMarbleFromHold = self._isHolding
+
+    def checkFirstMarbleTimer(self):
+        """Called each tick while running. Records the time to first marble once we've gone far enough."""
+
+        if self._firstMarbleSteps == None or self.verifier.stepsEmitted() < self._firstMarbleSteps:
+            return
+
+        self.lastFirstMarbleSecs = (time.monotonic_ns() - self._firstMarbleStartNs) / 1000000000
+        self._firstMarbleSteps = None
+
+        key = 'noHold'
+        if self._firstMarbleFromHold: key = 'hold'
+        self.firstMarbleStats[key][0] += 1
+        self.firstMarbleStats[key][1] += self.lastFirstMarbleSecs
+
+        print("Elevator time to first marble:", self.lastFirstMarbleSecs, "secs. From hold:", self._firstMarbleFromHold)
+        self.firstMarbleReport()
+
+    def firstMarbleReport(self):
+        """Prints and returns the average time to first marble with and without hold."""
+
+        report = {}
+        for key in self.firstMarbleStats:
+            cnt, total = self.firstMarbleStats[key]
+            avg = None
+            if cnt > 0: avg = round(total / cnt, 2)
+            report[key] = {'starts': cnt, 'avgSecs': avg}
+        print("Elevator time to first marble report:", report)
+        return report
+
+    def setCurrentBoost(self, boost):
+        """Give us a CurrentBoost (see stepper/current_boost.py) and we'll boost the motor current
+        while accelerating. Only works on a TMC2209, since it sets the current over UART."""
+        self.currentBoost = boost
+
+    def runDone(self):
+        """Called once the motor stops, after the step verifier has made its report."""
+        if self.learner != None:
+            report = None
+            if self.verifier != None: report = self.verifier.lastReport
+            self.learner.runDone(report, self.cruiseSecs)
+
+    def getActualFreq(self):
+        """Returns the real step frequency the pin is running at for our current self.freq,
+        based on our pwm calibration table, in 8 microstep steps."""
+        return self.calibration.actualFor(self.freq) * self.stepMult
+
+    def maxFineFreq(self):
+        """The fastest we can go in 8 microstep steps without asking the pin for more than
+        freqCeiling. That's higher if we can switch to coarser microstepping."""
+        if self.microstepSwitching and self.driver.canSwitchMicrosteps():
+            return self.freqCeiling * self.coarseMult
+        return self.freqCeiling
+
+    def setRampFreq(self, profile, idx):
+        """Set the step pin to run at entry idx of a ramp table. Switches microstepping first if
+        that entry crosses our thresholds."""
+
+        fineFreq = profile.freqs[idx]
+
+        if self.microstepSwitching and self.driver.canSwitchMicrosteps():
+            if self.stepMult == 1 and fineFreq >= self.coarseAboveFreq:
+                self.setStepMult(self.coarseMult, fineFreq)
+            elif self.stepMult != 1 and fineFreq < self.fineBelowFreq:
+                self.setStepMult(1, fineFreq)
+
+        self.fineFreq = fineFreq
+        if self.stepMult == 1:
+            # The table already has the calibrated frequency to ask for
+            self.freq = profile.table[idx]
+        else:
+            self.freq = self.calibration.requestFor(fineFreq / self.stepMult)
+        self._pinStep.frequency = self.freq
+
+    def setStepMult(self, mult, fineFreq=None):
+        """Switch the driver to microsteps / mult. If we're stepping, also change the pin
+        frequency so the belt speed stays at fineFreq.
+
+        The pin and the driver can't change at the same instant, so for the moment the switch
+        takes, the motor runs at the wrong speed. On the TMC2209 that's one unchecked UART write,
+        about 5 ms, and the event loop is blocked for it too. On the DRV8825 it's just setting the
+        mode pins. We order things so that's always a brief slow down rather than a speed up:
+        going coarse we slow the pin down first, going fine we switch the driver first. The loopback counter gets polled right at
+        the switch so pulses get counted at the right value."""
+
+        mc = None
+        if self.verifier != None: mc = self.verifier.mc
+
+        print("Elevator switching microsteps from", self.microsteps // self.stepMult, "to", self.microsteps // mult, "at", fineFreq, "Hz")
+
+        if mult > self.stepMult and fineFreq != None:
+            self._pinStep.frequency = self.calibration.requestFor(fineFreq / mult)
+
+        if mc != None:
+            mc.pollSteps()
+        self.driver.setMicrosteps(self.microsteps // mult)
+        self.stepMult = mult
+        if mc != None:
+            mc.stepMult = mult
+
+    def rampTicksElapsed(self):
+        """Call this once per loop. Returns how many ramp table entries we should move by.
+        In time based mode this is however many ramp ticks really went by since our last
+        call, carrying over any leftover fraction of a tick to next time. Also records how
+        late this tick was in tickLatenessMs."""
+
+        nowNs = time.monotonic_ns()
+        intervalNs = nowNs - self._lastTickNs
+        self._lastTickNs = nowNs
+        self._lastIntervalNs = intervalNs
+
+        # Track how late we got called back vs what we asked asyncio.sleep() for. A cruise tick can
+        # get woken early on purpose, so only ramp ticks count.
+        if self._sleepSecs > self.tickSecs:
+            self.tickLatenessMs = 0
+        else:
+            self.tickLatenessMs = (intervalNs - int(self._sleepSecs * 1000000000)) / 1000000
+            if self.tickLatenessMs > self.tickLatenessMaxMs:
+                self.tickLatenessMaxMs = self.tickLatenessMs
+
+        if not self.rampTimeBased:
+            return 1
+
+        if self._sleepSecs > self.tickSecs:
+            # We were cruising, so that time wasn't spent ramping. Whatever changed (a stop, a new
+            # target) just happened, so start the ramp with a single entry.
+            self._rampCarryNs = 0
+            return 1
+
+        tickNs = int(self.profile.tickSecs * 1000000000)
+        elapsedNs = intervalNs + self._rampCarryNs
+        ticks = elapsedNs // tickNs
+        self._rampCarryNs = elapsedNs - (ticks * tickNs)
+        return ticks
+
+    def adaptiveRampScale(self):
+        """Returns how much of this tick's ramp progress to actually take, from 0 (hold our
+        current freq, we're right at the stall margin) up to 1 (full ramp speed, plenty of
+        margin). Always 1 unless adaptiveAccel is on and the driver has StallGuard to read from.
+        We only read StallGuard every sgSampleTicks calls, and return the last scale otherwise."""
+
+        if not self.adaptiveAccel:
+            return 1
+
+        # Only read the driver every sgSampleTicks ticks
+        ctr = self._sgTickCtr
+        self._sgTickCtr = (ctr + 1) % self.sgSampleTicks
+        if ctr != 0:
+            return self.adaptiveScale
+
+        sgResult = self.driver.readStallGuard()
+        if sgResult == None:
+            return 1
+        self.sgResult = sgResult
+        margin = self.sgResult - (2 * self.sgThreshold)
+
+        if margin >= self.sgMargin:
+            return 1
+        if margin <= 0:
+            return 0
+        return margin / self.sgMargin
+
+    async def launch(self, n):
+        """Launch exactly n marbles, then stop. This does a full accel, cruise, decel move
+        that covers n * stepsPerMarble steps, using the loopback step counter to decide when to
+        start ramping down. Await this and it returns the number of marbles launched once the
+        motor has stopped after the last one popped out. Needs a step verifier (see
+        setStepVerifier()) since that's how we count steps."""
+
+        if self.verifier == None:
+            print("Elevator can't launch without a step verifier to count steps")
+            return 0
+
+        stepsPerMarble = self.verifier.mc.stepsPerMarble
+
+        # If we're already moving, count from where we're at now
+        if self._pinStep.duty_cycle > 0:
+            self._launchStartSteps = self.verifier.stepsEmitted()
+        else:
+            self._launchStartSteps = 0
+        self._launchTargetSteps = n * stepsPerMarble
+        self._launchCapIdx = self.profile.lastIdx
+        self._isScoopStop = False
+        self._launchDoneEvent.clear()
+
+        print("Elevator launching", n, "marbles. steps:", self._launchTargetSteps)
+        self.spinAsyncStart()
+
+        await self._launchDoneEvent.wait()
+
+        return self.launchedSteps // stepsPerMarble
+
+    def updateLaunch(self, rampTicks):
+        """Called each tick while a launch is moving. Picks the fastest ramp entry we can run
+        at for the coming tick and still ramp down to a stop in the steps we have left, and makes
+        that our ramp target. Early on that's further up the ramp than we are so we accelerate,
+        then we cruise, and near the end it's lower so we decelerate. If we're a few steps short
+        at the bottom of the ramp we creep the rest of the way at freqMin."""
+
+        remaining = self._launchTargetSteps - (self.verifier.stepsEmitted() - self._launchStartSteps)
+
+        if remaining <= 0:
+            # We're there. Ramp down to a stop from wherever we're at (normally freqMin already).
+            self._isAsyncSpinning = False
+            return
+
+        # Once we've started winding down, never speed back up, or the state would flip back
+        # and forth between decel and accel (and fire all their callbacks) as we ramp down.
+        if self.state == StepperState.DECELERATING:
+            self._launchCapIdx = min(self._launchCapIdx, self._rampIdx)
+
+        # We can't get any further up the ramp than rampTicks entries this tick. The ramp table may
+        # have been rebuilt shorter since the launch set its cap, so never go past its top either.
+        idx = min(self._rampIdx + rampTicks, self._launchCapIdx, self.profile.lastIdx)
+        while idx > 0 and self.profile.freqs[idx] * self.tickSecs + self.profile.stopSteps[idx] > remaining:
+            idx -= 1
+        self._rampTargetIdx = idx
+
+        # If we end up cruising, this is how long we can go before we have to look again. That
+        # lets us use the slow cruise tick without overshooting where decel needs to start.
+        freq = self.profile.freqs[idx]
+        self._launchSlackSecs = (remaining - self.profile.stopSteps[idx]) / freq - self.tickSecs
+
+    def nextTickSecs(self):
+        """How long to sleep before our next time thru the spin loop. Short while ramping so the
+        ramp is smooth, long while cruising or stopped since there's nothing to do. During a
+        launch() we cut the cruise tick short if it's almost time to ramp down."""
+
+        isHoldingSpeed = self._launchTargetSteps != None and self._rampIdx == self._rampTargetIdx
+        if self.state == StepperState.MAXSPEED or self.state == StepperState.STOPPED or isHoldingSpeed:
+            secs = self.cruiseTickSecs
+            if self._launchTargetSteps != None:
+                secs = min(secs, max(self.tickSecs, self._launchSlackSecs))
+            return secs
+        return self.tickSecs
+
+    def finishLaunch(self):
+        """Called once the motor stops during a launch, so launch() can return."""
+
+        self.launchedSteps = self.verifier.emittedSteps - self._launchStartSteps
+        if self._isScoopStop:
+            mc = self.verifier.mc
+            print("Elevator scoop aligned stop done. target steps:", self._launchTargetSteps, "moved steps:", self.launchedSteps,
+                  "scoop phase:", (mc.pollSteps() - self.scoopStopPhaseSteps) % mc.stepsPerMarble)
+        else:
+            print("Elevator launch done. target steps:", self._launchTargetSteps, "launched steps:", self.launchedSteps)
+        self._launchTargetSteps = None
+        self._isScoopStop = False
+        self._launchDoneEvent.set()
+
+    def planScoopStop(self):
+        """Set up a ramp down that ends with a scoop at the pop-out position. We work out the
+        fewest steps we can stop in from where we are, then go a bit further to the next scoop
+        position, and let the launch planner do the rest."""
+
+        if self._transition != None:
+            # We were changing cruise speed. Go back to our normal table from the speed we're at.
+            self.endTransition(int(self.getActualFreq() + 0.5))
+
+        mc = self.verifier.mc
+        stepsPerScoop = mc.stepsPerMarble
+
+        nowSteps = mc.pollSteps()
+        self._launchStartSteps = self.verifier.stepsEmitted()
+
+        # Steps for the tick we're in plus the whole ramp down from here
+        minStopSteps = self.profile.freqs[self._rampIdx] * self.tickSecs + self.profile.stopSteps[self._rampIdx]
+        earliestSteps = nowSteps + int(minStopSteps + 0.5)
+        extraSteps = (self.scoopStopPhaseSteps - earliestSteps) % stepsPerScoop
+
+        self._launchTargetSteps = earliestSteps + extraSteps - nowSteps
+        # Never speed back up to get there, just hold our speed a little longer
+        self._launchCapIdx = self._rampIdx
+        self._isScoopStop = True
+
+        print("Elevator planning scoop aligned stop. min stop steps:", int(minStopSteps), "extra steps:", extraSteps)
+
+    def spinAsyncStop(self):
+        if (self.scoopAlignedStop and self.verifier != None and self._isAsyncSpinning
+                and self._pinStep.duty_cycle > 0 and self._launchTargetSteps == None):
+            # Keep spinning and let the launch planner bring us to a stop at the next scoop
+            self.planScoopStop()
+        elif not self._isScoopStop:
+            self._isAsyncSpinning = False
+        # If we're cruising on the slow tick, wake up and start ramping down now
+        self._wakeEvent.set()
+
+    def spinAsyncStart(self):
+        if self._isScoopStop:
+            # They want to go again before we finished stopping, so forget the stop
+            self._launchTargetSteps = None
+            self._isScoopStop = False
+            self._rampTargetIdx = self.profile.lastIdx
+        self._isAsyncSpinning = True
+        self._wakeEvent.set()
+
+    def isIdle(self):
+        """Returns True if the motor is fully stopped and nobody wants it spinning, which
+        means our async spin task can park until spinAsyncStart() is called."""
+        return not self._isAsyncSpinning and self._pinStep.duty_cycle == 0
+
+    def setState(self, state:StepperState):
+        """Tell us what state you're setting and we will produce the callbacks if there
+        was a change of state."""
+
+        lastState = self.state
+
+        # Set our state
+        self.state = state
+
+        if state != lastState:
+            # We have a state change
+
+            # Boost the motor current while accelerating, back to normal for everything else
+            if self.currentBoost != None: self.currentBoost.onState(state == StepperState.ACCELERATING)
+
+            # Call the callback
+            if state == StepperState.ACCELERATING:
+                if self.onAccelCb != None: self.onAccelCb()
+            elif state == StepperState.MAXSPEED:
+                if self.onMaxSpeedCb != None: self.onMaxSpeedCb()
+            elif state == StepperState.DECELERATING:
+                if self.onDecelCb != None: self.onDecelCb()
+            elif state == StepperState.STOPPED:
+                if self.onStoppedCb != None: self.onStoppedCb()
+
+    async def spinAsyncTaskPwm(self):
+        """This method starts an infinite loop task to spin the stepper motor.
+        It does not actually spin the motor when first called, rather just starts the watch loop.
+        To start the motor call spinAsyncStart(). To stop the motor call
+        spinAsyncStop().
+        
+        This method is unique in that it's using PWM to generate the steps rather than a tight
+        loop. It can also increase the frequency as it moves along and decrease the frequency
+        as it stops."""
+
+        print("Elevator Starting infinite async spin PWM task...")
+
+        # Start our diag fault watcher. It runs on its own so faults get handled right away
+        # rather than waiting for our next tick.
+        self._diagTask = asyncio.create_task(self.diag.asyncTaskWatchDiag())
+        
+        # define preFreq out here so it doesn't get recreated each time thru while loop
+        prevFreq = -1
+
+        while True:
+
+            # print("in while loop of spinAsyncTask. isAsyncSpinning:", self._isAsyncSpinning)
+
+            # Track previous frequency so we can make some comparisons in this loop
+            # For example, we have these scenarios...
+            
+            # Prev          New     Desc
+            # ------------- ------- ----------
+            # INCREASING
+            # off (duty 0)  table[0] 1st turn on. Need to turn on duty cycle to 50%. Then set freq.
+            # table[i]      table[i+1] Just increase freq by walking fwd thru ramp table
+            # table[last]   table[last] At max. Leave at this.
+            # DECREASING
+            # table[i]      table[i-1] Just decrease freq by walking back thru ramp table
+            # table[0]      table[0] Back at freqMin. Turn duty cycle to 0 to turn off motor.
+
+            prevFreq = self.freq
+            prevFineFreq = self.fineFreq
+
+            # See how many ramp entries we should move by based on how much time really went by
+            rampTicks = self.rampTicksElapsed()
+
+            # Count this wakeup against the state we were sleeping in
+            self.loopStats.wake(StepperState.NAMES[self.state])
+
+            # If we're doing a launch(), see if it's time to start ramping down
+            if self._launchTargetSteps != None and self._pinStep.duty_cycle > 0:
+                self.updateLaunch(rampTicks)
+                
+            # each time through loop we should check if they want to start or stop steps
+            if self._isAsyncSpinning:
+
+                # They want increased speed
+                # print("Increasing freq")
+
+                if self._pinStep.duty_cycle == 0:
+                    # 1st turn on. 
+                    
+                    # If they changed freqMax/accel/jerk on us since we last built the ramp, rebuild it now
+                    # while the motor is still off
+                    if self.profile.isStale(self.freqMin, self.cruiseFreq(), self.accel, self.jerk, self.tickSecs):
+                        self.buildProfile()
+
+                    # Start timing how long it takes to get the first marble out
+                    self.startFirstMarbleTimer()
+
+                    # Enable stepper. in v1 we left the motor on all the time, so this is a diff approach
+                    # so we don't burn out the driver running 24x7. If we were holding, it's already on.
+                    if self._isHolding:
+                        self.leaveHold()
+                        self.diag.setMoving(True)
+                    else:
+                        self.enable()
+
+                    # Start at the bottom of our ramp table
+                    self._rampIdx = 0
+                    self._rampTargetIdx = self.profile.lastIdx
+                    # A launch() from a stop can go all the way up whatever table we just built
+                    if self._launchTargetSteps != None: self._launchCapIdx = self.profile.lastIdx
+                    self._rampCarryNs = 0
+                    self._rampFrac = 0.0
+                    self.adaptiveScale = 1
+                    self._sgTickCtr = 0
+                    self.tickLatenessMaxMs = 0
+                    self.loopStats.reset()
+                    self.cruiseSecs = 0
+
+                    # Need to turn on duty cycle to 50%. Then set freq.
+                    self._pinStep.duty_cycle = 32768
+                    self.setRampFreq(self.profile, 0)
+                    
+                    print("Elevator 1st turn on. Setting duty to 50%. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency, "duty:", self._pinStep.duty_cycle)
+
+                    # Start counting commanded vs emitted steps for this run
+                    if self.verifier != None: self.verifier.start(self.getActualFreq())
+
+                    # Set our state. We can call this multiple times. It will automatically only generate one callback.
+                    self.setState(StepperState.ACCELERATING)
+
+                elif self._transition != None:
+                    # We're easing over to a new cruise speed
+                    self.stepTransition(rampTicks)
+                    self.loopStats.rampStep(prevFineFreq, self.fineFreq)
+
+                elif (self._rampIdx == self._rampTargetIdx and self._rampIdx == self.profile.lastIdx
+                        and self._launchTargetSteps == None
+                        and self.profile.isStale(self.freqMin, self.cruiseFreq(), self.accel, self.jerk, self.tickSecs)):
+                    # We're at speed, but setTargetSpeed() (or a change to freqMax/accel/jerk) gave us
+                    # a new cruise speed. Start easing over to it.
+                    self.startTransition()
+
+                elif self._rampIdx == self._rampTargetIdx:
+                    # They are at max speed (or the speed launch() or a scoop stop wants). So leave alone.
+                    # Don't let time spent at max speed count towards the decel ramp.
+                    self._rampCarryNs = 0
+                    if self._rampIdx == self.profile.lastIdx and self.profile.freqMax == self.freqMax:
+                        self.cruiseSecs += self._lastIntervalNs / 1000000000
+                    # print("At max freq. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
+                    # pass 
+                    # Only call it max speed if we're really at the top of the ramp. A launch() or scoop
+                    # stop that's winding down catches up with its target every few ticks on the way
+                    # down, and we don't want to flip between maxspeed and decel (and fire their callbacks
+                    # each time), so once we're decelerating we stay that way until we stop.
+                    if self._rampIdx == self.profile.lastIdx and self.state != StepperState.DECELERATING:
+                        # Set our state. We can call this multiple times. It will automatically only generate one callback.
+                        self.setState(StepperState.MAXSPEED)
+
+                elif self._rampIdx < self._rampTargetIdx:
+                    # If the load is getting close to stalling, only take part of this tick's ramp
+                    # progress, carrying the fraction over so slow ramps still move along
+                    self.adaptiveScale = self.adaptiveRampScale()
+                    if self.adaptiveScale < 1:
+                        self._rampFrac += rampTicks * self.adaptiveScale
+                        rampTicks = int(self._rampFrac)
+                        self._rampFrac -= rampTicks
+                        # print("Elevator adaptive accel. sgResult:", self.sgResult, "scale:", self.adaptiveScale)
+
+                    # Just increase freq to the next entry in our ramp. If we got called late,
+                    # jump ahead however many entries we missed, but don't go past our target.
+                    self._rampIdx = min(self._rampIdx + rampTicks, self._rampTargetIdx)
+                    self.setRampFreq(self.profile, self._rampIdx)
+                    self.loopStats.rampStep(prevFineFreq, self.fineFreq)
+                    # print("Increase freq. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
+                    # Set our state. We can call this multiple times. It will automatically only generate one callback.
+                    self.setState(StepperState.ACCELERATING)
+
+                else:
+                    # We're above our target, which happens when launch() is winding down. Walk back
+                    # down the ramp, but don't go below our target.
+                    self._rampIdx = max(self._rampIdx - rampTicks, self._rampTargetIdx)
+                    self.setRampFreq(self.profile, self._rampIdx)
+                    self.loopStats.rampStep(prevFineFreq, self.fineFreq)
+                    # Set our state. We can call this multiple times. It will automatically only generate one callback.
+                    self.setState(StepperState.DECELERATING)
+
+            else:
+                # print("Decreasing freq")
+
+                if self._transition != None:
+                    # They let go while we were changing cruise speed. Switch back to our normal ramp
+                    # table, rebuilt from the speed we're at now, and ramp down that.
+                    self.endTransition(int(self.getActualFreq() + 0.5))
+                
+                if self._rampIdx == 0:
+                    # We need to stop motor by setting duty to 0
+                    if self._pinStep.duty_cycle > 0:
+                        self._pinStep.duty_cycle = 0
+                        print("Elevator Just turned off motor. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency, "duty:", self._pinStep.duty_cycle, "worst tick lateness ms:", self.tickLatenessMaxMs)
+
+                        # Run is over, so print our commanded vs emitted steps report
+                        if self.verifier != None: self.verifier.stop()
+                        self.loopStats.report()
+                        self.runDone()
+
+                        # If this was a launch(), let it know we're done
+                        if self._launchTargetSteps != None: self.finishLaunch()
+                    else:
+                        # do nothing as motor is off and we should just ignore
+                        # print("Motor is idle. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
+                        pass
+
+                    # Nothing to ramp while stopped, so don't carry idle time into the next accel
+                    self._rampCarryNs = 0
+                                        
+                    # Set our state. We can call this multiple times. It will automatically only generate one callback.
+                    self.setState(StepperState.STOPPED)
+
+                    # disable motor. in v1 we left the motor on all the time, so this is a diff approach
+                    # so we don't burn out the driver running 24x7. If we have a hold window, hold the
+                    # belt at low current first and our parking below disables once it's over.
+                    if self._pinEnable.value != True and not self._isHolding:
+                        if self.holdSecs > 0:
+                            self.startHold()
+                        else:
+                            self.disable()
+
+                else:
+                    # Decrease freq by walking back down the same ramp table we accelerated on.
+                    # Same as accel, catch up on any entries we missed but don't go below the start.
+                    self._rampIdx = max(self._rampIdx - rampTicks, 0)
+                    self.setRampFreq(self.profile, self._rampIdx)
+                    self.loopStats.rampStep(prevFineFreq, self.fineFreq)
+                    # print("Decrease freq. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
+                    
+                    # Set our state. We can call this multiple times. It will automatically only generate one callback.
+                    self.setState(StepperState.DECELERATING)
+
+            # Tell our step verifier what we're stepping at now so it can check the loopback count
+            if self.verifier != None and self._pinStep.duty_cycle > 0:
+                self.verifier.tick(self.getActualFreq())
+                self.checkFirstMarbleTimer()
+
+            # Drop the current boost if it's used up its budget
+            if self.currentBoost != None and self.currentBoost.isBoosted:
+                self.currentBoost.tick()
+
+            # Yield to other events
+            # await asyncio.sleep(0)
+            if self.isIdle() and self._isHolding:
+                # Holding the belt. Wait out the rest of the hold window, unless spinAsyncStart() wakes us.
+                self._wakeEvent.clear()
+                try:
+                    await asyncio.wait_for(self._wakeEvent.wait(), max(0, self._holdUntilNs - time.monotonic_ns()) / 1000000000)
+                except asyncio.TimeoutError:
+                    print("Elevator hold window over")
+                    self.endHold()
+                self._sleepSecs = self.tickSecs
+                self._lastTickNs = time.monotonic_ns() - int(self.tickSecs * 1000000000)
+            elif self.isIdle():
+                # Motor is fully stopped, so there's nothing to ramp. Rather than waking up every tick
+                # all day long, park here until spinAsyncStart() wakes us back up.
+                print("Elevator spin task parking until next start")
+                self._wakeEvent.clear()
+                await self._wakeEvent.wait()
+                # Pretend our last tick ended right on time so the wait doesn't show up as tick lateness
+                self._sleepSecs = self.tickSecs
+                self._lastTickNs = time.monotonic_ns() - int(self.tickSecs * 1000000000)
+            else:
+                self._sleepSecs = self.nextTickSecs()
+                if self._sleepSecs > self.tickSecs:
+                    # Cruising, so wake up on the slow tick, or right away if spinAsyncStart()/spinAsyncStop()
+                    # gets called
+                    self._wakeEvent.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeEvent.wait(), self._sleepSecs)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    # Ramping, so come back quick for the next ramp entry
+                    await asyncio.sleep(self.tickSecs)
+
+    async def spinAsyncExitTimer(self, duration):
+        print("Starting timer")
+        self.spinAsyncStart()
+        await asyncio.sleep(duration) # don't forget the await
+        self.spinAsyncStop()
+        print("Ended timer")
+
+    def onDiagFault(self):
+        """Our diag watcher calls this as soon as the driver flags a fault. Keeping on stepping
+        into a stall just makes it worse, so we stop the motor right away rather than ramping down."""
+
+        print("Elevator Diag Pin FAULT!!! Stopping motor. freq:", self.freq, "state:", self.state)
+
+        self._isAsyncSpinning = False
+        self._pinStep.duty_cycle = 0
+        self._transition = None
+        self._rampIdx = 0
+        self.freq = self.profile.table[0]
+        self.fineFreq = self.profile.freqs[0]
+        if self.verifier != None: self.verifier.stop()
+        # Start back up in fine microstepping next time
+        if self.stepMult != 1: self.setStepMult(1)
+        if self._launchTargetSteps != None: self.finishLaunch()
+        if self.learner != None: self.learner.fault()
+        self.runDone()
+
+        # Set our state. It will automatically only generate one callback.
+        self.setState(StepperState.STOPPED)
+        if self._isHolding: self.leaveHold()
+        self._firstMarbleSteps = None
+        self.disable()
+
+        if self.onFaultCb != None: self.onFaultCb()
@@ -0,0 +1,125 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This works out the agitator's rock ramp from the swing we want, rather than by hand
+
+import math
+
+class RockProfile:
+    """The agitator's rock ramp (see rockRamp in stepper_tmc2209_agitator.py) used to be typed
+    in by hand, 45 steps here, pw 0.006 there, and guessed at until it looked right. This
+    builds it for you from what you actually care about:
+
+        swingDeg   how far the flapper swings each way from base (degrees)
+        peakHz     the fastest we step (step Hz)
+        accel      how fast we're allowed to change speed (step Hz per sec)
+        startHz    the speed we can jump straight to from a standstill and stop from without
+                   losing steps, i.e. the motor's pull-in speed (step Hz)
+        dwellSecs  how long we pause at each end of a swing and at base
+
+    The fastest way to get swingSteps over there and stop is to speed up as hard as accel lets
+    us, coast at peakHz, and slow down as hard as accel lets us. If the swing is too short to
+    reach peakHz we turn around in the middle and never coast. That's the ideal, in idealSecs.
+
+    The agitator runs each segment as a pwm burst at one speed, so we chop the ramps into
+    segments of about segSteps steps. Each segment runs at the slowest speed the ideal profile
+    has anywhere in it, so we never accelerate harder than accel, and segments at the same speed
+    get merged so the coast is one long segment. That costs a little time over the ideal, see
+    swingSecs. Smaller segSteps gets closer to the ideal but wakes the rock task more often.
+
+    There's nothing CircuitPython specific in here, so you can run it on your computer too,
+    like sim/rock_plan.py does, to try out settings before flashing the board."""
+
+    def __init__(self, swingDeg=45, peakHz=1050, accel=1500, startHz=645, dwellSecs=0.1, stepDeg=1.8, microsteps=8, segSteps=25):
+
+        self.swingDeg = swingDeg
+        self.peakHz = peakHz
+        self.accel = accel
+        self.startHz = startHz
+        self.dwellSecs = dwellSecs
+        # Our stepper motor is 1.8deg per step, and the agitator runs at 8 microsteps
+        self.stepDeg = stepDeg
+        self.microsteps = microsteps
+        self.segSteps = segSteps
+
+        # These get filled in by build()
+        self.swingSteps = 0
+        # One half swing (base out to the end, or back) as a list of (steps, freq)
+        self.segs = None
+        self.topHz = 0
+        self.idealSecs = 0
+        self.swingSecs = 0
+
+        self.build()
+
+    def build(self):
+        """Work out the segments for a half swing. Call this again if you change any of the
+        settings."""
+
+        # 45 degrees = 45/1.8 = 25 steps * 8 microsteps = 200
+        s = int(self.swingDeg / self.stepDeg * self.microsteps + 0.5)
+        a = self.accel
+        v0 = min(self.startHz, self.peakHz)
+
+        # How far it takes to get from startHz up to peakHz. If speeding up and slowing back
+        # down takes more than the whole swing, we top out wherever the two ramps meet.
+        rampSteps = (self.peakHz * self.peakHz - v0 * v0) / (2 * a)
+        if 2 * rampSteps > s:
+            top = math.sqrt(v0 * v0 + a * s)
+            rampSteps = s / 2
+        else:
+            top = self.peakHz
+
+        # Ideal time is the two ramps plus the coast in between
+        self.idealSecs = 2 * (top - v0) / a + (s - 2 * rampSteps) / top
+
+        # Chop the half swing into nearly even segments and run each at the ideal speed at
+        # whichever of its two ends is slower
+        def speedAt(pos):
+            return min(top, math.sqrt(v0 * v0 + 2 * a * pos), math.sqrt(v0 * v0 + 2 * a * (s - pos)))
+
+        cnt = max(1, int(math.ceil(s / self.segSteps)))
+        segs = []
+        last = 0
+        for i in range(1, cnt + 1):
+            pos = (s * i + cnt // 2) // cnt
+            freq = int(min(speedAt(last), speedAt(pos)))
+            if len(segs) > 0 and segs[-1][1] == freq:
+                segs[-1] = (segs[-1][0] + pos - last, freq)
+            else:
+                segs.append((pos - last, freq))
+            last = pos
+
+        secs = 0
+        for steps, freq in segs:
+            secs += steps / freq
+
+        self.swingSteps = s
+        self.segs = segs
+        self.topHz = top
+        self.swingSecs = secs
+
+        print("Built rock profile. swingDeg:", self.swingDeg, "swingSteps:", s, "topHz:", int(top), "segments:", len(segs), "swingSecs:", round(secs, 3), "idealSecs:", round(self.idealSecs, 3))
+
+    def rockRamp(self, minPulseWidth=0.00055):
+        """Returns a full rock (out fwd, back, out rev, back, with a dwell before each) as a list
+        of dicts in the same format as StepperAgitator.rockRamp. The agitator's step period is
+        its minPulseWidth plus pw * 0.1, so we need its minPulseWidth to get the pw for a freq."""
+
+        def halfSwing(isFwd):
+            out = [{'pause':True, 'dur':self.dwellSecs}]
+            for steps, freq in self.segs:
+                # Can't step faster than the high part of the pulse alone
+                pw = max(1 / freq - minPulseWidth, 0) / 0.1
+                out.append({'pw':pw, 'steps':steps, 'dir':isFwd})
+            return out
+
+        return halfSwing(True) + halfSwing(False) + halfSwing(False) + halfSwing(True)
+
+    def rockSecs(self):
+        """How long one full rock takes, dwells and all."""
+        return 4 * (self.swingSecs + self.dwellSecs)
+
+    def dump(self):
+        print("Rock profile half swing (steps, freq):")
+        for steps, freq in self.segs:
+            print("  ", steps, freq)
+        print("rockSecs:", round(self.rockSecs(), 3))
@@ -0,0 +1,101 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This keeps the agitator rocking in step with the elevator scoops
+
+import asyncio
+import math
+
+class ScoopSync:
+    """The agitator's rocking is supposed to push marbles into the onramp pipe right before
+    each scoop on the elevator belt comes by to pick one up. Nothing used to tie the two motors
+    together, so the flapper pushed at random times relative to the scoops.
+
+    We know where the belt is from the loopback step counter. Every stepsPerScoop steps another
+    scoop passes the bottom of the pipe, so (total steps - scoopPhaseOffsetSteps) % stepsPerScoop
+    tells us how far we are into the current scoop's cycle. From that and the elevator's real
+    step rate we work out when the next scoop arrives, and trigger each agitator half swing (base
+    out to the end, or back) so it finishes leadSecs before then. Every half swing pushes, so
+    this lines up a push with each scoop it can make, not just one per full rock.
+
+    The agitator needs to be a StepperAgitator from stepper_tmc2209_agitator.py (the rocking one).
+    We turn on its isSynced mode, so it waits for us before each half swing. We ask it how long
+    the next half swing takes each time we plan one, since the half swings aren't all the same
+    length and setRockProfile() can change them while we run.
+
+    Dashboard in main_kitchensink.py creates us and runs asyncTaskSyncSwings() as a task when
+    its agitatorRocks is True. Then its startMotors() and stopMotors() just start and stop the
+    rocking, and we pick when each swing goes."""
+
+    def __init__(self, elevator, agitator, marbleCounter):
+
+        self.elevator = elevator
+        self.agitator = agitator
+        self.mc = marbleCounter
+
+        # There's one scoop per marble, so it's the same number of steps
+        self.stepsPerScoop = marbleCounter.stepsPerMarble
+
+        # There's no home sensor on the belt, so this says how many steps past a scoop
+        # passing the pipe our step count was at boot. Tune it on the wall.
+        self.scoopPhaseOffsetSteps = 0
+
+        # How long before the scoop passes we want the swing to be done
+        self.leadSecs = 0.1
+
+        # How often we re-check while waiting for the right moment, since the elevator may
+        # still be changing speed
+        self.recheckSecs = 0.1
+
+        self.swingCtr = 0
+
+        agitator.isSynced = True
+
+    def scoopPhase(self):
+        """Returns how many steps we are past the last scoop passing the pipe."""
+        return (self.mc.pollSteps() - self.scoopPhaseOffsetSteps) % self.stepsPerScoop
+
+    def secsUntilSwing(self):
+        """Returns how long to wait before starting the next swing, or None if the elevator
+        isn't moving so there's no scoop to sync to."""
+
+        freq = self.elevator.getActualFreq()
+        if self.elevator.isIdle() or freq <= 0:
+            return None
+
+        # How long the next half swing takes. The push into the pipe happens at the end of it.
+        swingSecs = self.agitator.nextSwingSecs()
+
+        scoopSecs = self.stepsPerScoop / freq
+        secsToScoop = (self.stepsPerScoop - self.scoopPhase()) / freq
+        startIn = secsToScoop - swingSecs - self.leadSecs
+
+        # If we've missed this scoop, aim for the next one we can make. If a half swing takes
+        # longer than a scoop, this means we end up swinging every few scoops.
+        if startIn < 0:
+            startIn += math.ceil(-startIn / scoopSecs) * scoopSecs
+        return startIn
+
+    async def asyncTaskSyncSwings(self):
+        """Infinite loop task that triggers each agitator half swing in time with the scoops."""
+
+        print("Starting infinite async scoop sync task...")
+
+        while True:
+
+            startIn = self.secsUntilSwing()
+
+            if startIn == None or not self.agitator.isRocking():
+                # Nothing to sync to right now
+                await asyncio.sleep(0.5)
+
+            elif startIn > self.recheckSecs:
+                # Not time yet. The elevator may still be ramping, so check again in a bit.
+                await asyncio.sleep(self.recheckSecs)
+
+            else:
+                await asyncio.sleep(startIn)
+                self.agitator.triggerSwing()
+                self.swingCtr += 1
+                # print("ScoopSync triggered swing. phase:", self.scoopPhase(), "swingCtr:", self.swingCtr)
+
+                # Wait for this half swing to finish before we plan the next one
+                await self.agitator.waitSwingDone()
@@ -0,0 +1,150 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This learns how fast the elevator can reliably run and remembers it across reboots
+
+class SpeedLearner:
+    """freqMax and accel on the elevator are hand picked, but as the belt stretches and the
+    marble load changes, how fast the elevator can really run drifts. This watches each run
+    and slowly tunes them.
+
+    After goodRunsToRaise clean runs that cruised at freqMax for at least minCruiseSecs, we raise
+    freqMax by raiseHz and accel by raiseAccel. A run is clean if the step verifier saw no
+    mismatches and the driver flagged no diag faults. On any anomaly we back off right away by
+    backoffHz and backoffAccel, and wait goodRunsAfterBackoff clean runs before raising again.
+    We never go outside freqFloor/freqCeiling or accelFloor/accelCeiling.
+
+    The learned freqMax and accel go in a small text file on flash, so the next boot starts from
+    the tuned values instead of the constants. We only write the file when the values change
+    so we don't wear out the flash.
+
+    Call load() at boot to apply the stored values. The elevator calls runDone() when each run
+    stops and fault() when its diag pin fires (see Stepper.setSpeedLearner()).
+
+    The step verifier counts the pulses we send, not belt motion, so it can't see a stall. Only
+    the driver can, and only a TMC2209 with SGTHRS set (see Tmc2209Driver.setStallThreshold()).
+    Without that a stall never shows up, so we'd just keep raising freqMax. So learning is off
+    by default, and even when on we only ever back off unless the driver can detect a stall."""
+
+    def __init__(self, elevator):
+
+        self.elevator = elevator
+
+        # Set to True to learn. Off by default, since we can only raise safely if the driver
+        # can detect a stall (see runDone()).
+        self.isLearning = False
+
+        self.fileName = "elevator_tune.txt"
+
+        self.raiseHz = 20
+        self.raiseAccel = 50
+        self.backoffHz = 100
+        self.backoffAccel = 200
+
+        self.freqFloor = 600
+        self.freqCeiling = elevator.maxFineFreq()
+        self.accelFloor = 400
+        self.accelCeiling = 2400
+
+        # A run has to cruise at freqMax this long to tell us anything about freqMax
+        self.minCruiseSecs = 3
+        self.goodRunsToRaise = 3
+        self.goodRunsAfterBackoff = 10
+
+        self.goodRuns = 0
+        self.goodRunsNeeded = self.goodRunsToRaise
+        self.raiseCtr = 0
+        self.backoffCtr = 0
+        self._isFaulted = False
+
+    def load(self):
+        """Read our tuned freqMax and accel from flash and apply them to the elevator. Returns
+        False if we don't have a file yet, in which case the elevator keeps its defaults."""
+
+        try:
+            f = open(self.fileName, "r")
+        except OSError:
+            print("Speed learner no tuned profile on disk yet. freqMax:", self.elevator.freqMax, "accel:", self.elevator.accel)
+            return False
+
+        vals = f.readline().strip().split(",")
+        f.close()
+
+        if len(vals) != 2:
+            print("Speed learner tuned profile on disk is bad:", vals)
+            return False
+
+        self.elevator.freqMax = min(max(int(vals[0]), self.freqFloor), self.freqCeiling)
+        self.elevator.accel = min(max(int(vals[1]), self.accelFloor), self.accelCeiling)
+        print("Speed learner loaded tuned profile from disk. freqMax:", self.elevator.freqMax, "accel:", self.elevator.accel)
+        return True
+
+    def save(self):
+        """Write our tuned freqMax and accel to flash. If the drive isn't writable we just
+        keep learning in memory."""
+
+        try:
+            f = open(self.fileName, "w")
+            f.write("{},{}\n".format(self.elevator.freqMax, self.elevator.accel))
+            f.flush()
+            f.close()
+        except OSError as e:
+            print("Speed learner could not save tuned profile to disk. err:", e)
+
+    def fault(self):
+        """The elevator calls this when its diag pin flags a fault."""
+        self._isFaulted = True
+
+    def runDone(self, report, cruiseSecs):
+        """The elevator calls this when a run stops. report is the step verifier's run report
+        (or None) and cruiseSecs is how long the run spent cruising at freqMax."""
+
+        if not self.isLearning:
+            self._isFaulted = False
+            return
+
+        mismatches = 0
+        if report != None:
+            mismatches = report['mismatches']
+
+        if self._isFaulted or mismatches > 0:
+            self._isFaulted = False
+            self.backoff(mismatches)
+            return
+
+        if cruiseSecs < self.minCruiseSecs:
+            # Too short to learn anything about freqMax
+            return
+
+        if not self.elevator.driver.canDetectStall():
+            # A clean run doesn't mean much if a stall wouldn't have shown up, so never raise
+            return
+
+        self.goodRuns += 1
+        if self.goodRuns >= self.goodRunsNeeded:
+            self.goodRuns = 0
+            self.goodRunsNeeded = self.goodRunsToRaise
+
+            freqMax = min(self.elevator.freqMax + self.raiseHz, self.freqCeiling)
+            accel = min(self.elevator.accel + self.raiseAccel, self.accelCeiling)
+            if freqMax == self.elevator.freqMax and accel == self.elevator.accel:
+                return
+
+            self.raiseCtr += 1
+            print("Speed learner raising. freqMax:", self.elevator.freqMax, "->", freqMax, "accel:", self.elevator.accel, "->", accel)
+            self.apply(freqMax, accel)
+
+    def backoff(self, mismatches):
+
+        self.goodRuns = 0
+        self.goodRunsNeeded = self.goodRunsAfterBackoff
+        self.backoffCtr += 1
+
+        freqMax = max(self.elevator.freqMax - self.backoffHz, self.freqFloor)
+        accel = max(self.elevator.accel - self.backoffAccel, self.accelFloor)
+        print("Speed learner backing off. mismatches:", mismatches, "freqMax:", self.elevator.freqMax, "->", freqMax, "accel:", self.elevator.accel, "->", accel)
+        self.apply(freqMax, accel)
+
+    def apply(self, freqMax, accel):
+        # The elevator rebuilds its ramp table from these the next time it turns on
+        self.elevator.freqMax = freqMax
+        self.elevator.accel = accel
+        self.save()
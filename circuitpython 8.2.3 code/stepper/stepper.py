@@ -2,6 +2,8 @@
 import digitalio
 import board
 import time
+import asyncio
+from stepper.pulse_train import PulseTrain
 
 
 class Stepper:
@@ -20,6 +22,9 @@ class Stepper:
 
         self._minPulseWidth = 0.001
 
+        # The pwm hardware sends our step pulses for move() so we don't have to toggle the pin
+        self._pulseTrain = PulseTrain(self._pinStepPin)
+
         # open pins
         self._pinEnable = digitalio.DigitalInOut(self._pinEnablePin)
         self._pinEnable.direction = digitalio.Direction.OUTPUT
@@ -87,20 +92,45 @@ class Stepper:
         time.sleep(self._minPulseWidth)
 
     def steps(self, cnt):
+        """Blocking, like it always was, at our default rate. From async code await move() instead."""
         print("Stepping", cnt, "steps...")
-        for i in range(cnt):
-            self.step()
+        self.moveBlocking(cnt, self.defaultRate())
         print("Done stepping", cnt, "steps")
 
     # Do steps, but enable/disable as part of it
     def stepsEnDis(self, cnt):
         self.enable()
         print("Enabling. Stepping", cnt, "steps...")
-        for i in range(cnt):
-            self.step()
+        self.moveBlocking(cnt, self.defaultRate())
         self.disable()
         print("Disabled. Done stepping", cnt, "steps")
 
+    def defaultRate(self):
+        """Steps/sec we used to get from step(), i.e. one high and one low of _minPulseWidth."""
+        return 1 / (2 * self._minPulseWidth)
+
+    async def move(self, steps, rate):
+        """Emit steps step pulses at rate steps/sec. The pwm hardware makes the pulses as one
+        burst, and other tasks run while it goes, except for the last few ms (see PulseTrain)."""
+
+        # The pwm hardware needs the step pin to itself while it runs
+        self._pinStep.deinit()
+        try:
+            await self._pulseTrain.send(steps, rate)
+        finally:
+            self._pinStep = digitalio.DigitalInOut(self._pinStepPin)
+            self._pinStep.direction = digitalio.Direction.OUTPUT
+
+    def moveBlocking(self, steps, rate):
+        """Same as move(), but doesn't need an event loop. Returns once all the steps are out."""
+
+        self._pinStep.deinit()
+        try:
+            self._pulseTrain.sendBlocking(steps, rate)
+        finally:
+            self._pinStep = digitalio.DigitalInOut(self._pinStepPin)
+            self._pinStep.direction = digitalio.Direction.OUTPUT
+
     def enable(self):
         # Enable Motor Outputs (GND=on, VIO=off)
         # enable driver
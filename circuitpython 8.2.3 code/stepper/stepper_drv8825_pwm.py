@@ -0,0 +1,32 @@
+# The Liberty Christian Stepper Motor Library for CircuitPython
+# This drives the main elevator stepper motor on the older DRV8825 boards
+
+from stepper.ramp_engine import RampEngine, StepperState
+from stepper.driver_drv8825 import Drv8825Driver
+from stepper import board_config
+
+class Stepper(RampEngine):
+    """The elevator on a DRV8825 board. It gets the same PWM ramp, state callbacks and async
+    task as the TMC2209 board (see ramp_engine.py), with the DRV8825 driver backend plugged in.
+    Microstep switching at speed works thru the M0/M1/M2 pins, if they're wired to pins. We
+    can't lower the current to hold the belt, so holding would run the driver at full current,
+    which it doesn't like for long. So holdSecs stays 0 here and we disable right away when we stop.
+    Current boost and adaptiveAccel need a TMC2209 and don't apply here.
+
+    Step/dir/enable/fault are on the same pins as the TMC2209 board. In main use this instead:
+        from stepper.stepper_drv8825_pwm import Stepper
+
+    Where M0/M1/M2/Sleep/Reset go depends on the board. Without a driver we use
+    board_config.DRV8825_PINS, which has them jumpered so they don't clash with the display
+    and button. For other wiring pass in Drv8825Driver(**board_config.DRV8825_PINS_ORIGINAL)
+    or your own pins as driver."""
+
+    def __init__(self, onAccelCb=None, onMaxSpeedCb=None, onDecelCb=None, onStoppedCb=None, onFaultCb=None, driver=None):
+
+        if driver == None:
+            driver = Drv8825Driver(**board_config.DRV8825_PINS)
+
+        super().__init__(driver, onAccelCb, onMaxSpeedCb, onDecelCb, onStoppedCb, onFaultCb)
+
+        # Holding would be at full current, so disable as soon as we stop. Don't turn it on in main.
+        self.holdSecs = 0
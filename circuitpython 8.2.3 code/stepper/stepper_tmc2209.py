@@ -3,6 +3,7 @@ import digitalio
 import board
 import time
 import asyncio
+from stepper.pulse_train import PulseTrain
 
 class Stepper:
     def __init__(self, *args):
@@ -17,6 +18,13 @@ class Stepper:
 
         self._minPulseWidth = 0.001 #0.00055
 
+        # The pwm hardware sends our step pulses for move() and spinning so we don't have to toggle the pin
+        self._pulseTrain = PulseTrain(self._pinStepPin)
+
+        # While spinning we check this often if they want to stop, so that's about how long it
+        # takes spinAsyncStop() to take effect
+        self.spinCheckSecs = 0.1
+
         # open pins
         self._pinEnable = digitalio.DigitalInOut(self._pinEnablePin)
         self._pinEnable.direction = digitalio.Direction.OUTPUT
@@ -70,20 +78,57 @@ class Stepper:
         time.sleep(self._minPulseWidth)
 
     def steps(self, cnt):
+        """Blocking, like it always was, at our default rate. From async code await move() instead."""
         print("Stepping", cnt, "steps...")
-        for i in range(cnt):
-            self.step()
+        self.moveBlocking(cnt, self.defaultRate())
         print("Done stepping", cnt, "steps")
 
     # Do steps, but enable/disable as part of it
     def stepsEnDis(self, cnt):
         self.enable()
         print("Enabling. Stepping", cnt, "steps...")
-        for i in range(cnt):
-            self.step()
+        self.moveBlocking(cnt, self.defaultRate())
         self.disable()
         print("Disabled. Done stepping", cnt, "steps")
 
+    def defaultRate(self):
+        """Steps/sec we used to get from step(), i.e. one high and one low of _minPulseWidth."""
+        return 1 / (2 * self._minPulseWidth)
+
+    async def move(self, steps, rate):
+        """Emit steps step pulses at rate steps/sec. The pwm hardware makes the pulses as one
+        burst, and other tasks run while it goes, except for the last few ms (see PulseTrain)."""
+
+        # The pwm hardware needs the step pin to itself while it runs
+        self._pinStep.deinit()
+        try:
+            await self._pulseTrain.send(steps, rate)
+        finally:
+            self._pinStep = digitalio.DigitalInOut(self._pinStepPin)
+            self._pinStep.direction = digitalio.Direction.OUTPUT
+
+    def moveBlocking(self, steps, rate):
+        """Same as move(), but doesn't need an event loop. Returns once all the steps are out."""
+
+        self._pinStep.deinit()
+        try:
+            self._pulseTrain.sendBlocking(steps, rate)
+        finally:
+            self._pinStep = digitalio.DigitalInOut(self._pinStepPin)
+            self._pinStep.direction = digitalio.Direction.OUTPUT
+
+    def spinPulseStart(self, rate):
+        """Hand the step pin to the pwm hardware and start stepping at rate until spinPulseStop()."""
+        self._pinStep.deinit()
+        self._pulseTrain.start(rate)
+        self._pulseTrain.run()
+
+    def spinPulseStop(self):
+        """Spin is over, so take the step pin back."""
+        self._pulseTrain.stop()
+        self._pinStep = digitalio.DigitalInOut(self._pinStepPin)
+        self._pinStep.direction = digitalio.Direction.OUTPUT
+
     def enable(self):
         # Enable Motor Outputs (GND=on, VIO=off)
         # enable driver
@@ -111,6 +156,8 @@ class Stepper:
         self._minPulseWidth = seconds
 
     def deinit(self):
+        # If we got stopped mid spin the pwm hardware still has the step pin
+        self._pulseTrain.stop()
         self._pinEnable.deinit()
         self._pinDir.deinit()
         self._pinStep.deinit()
@@ -132,14 +179,14 @@ class Stepper:
         self._isAsyncSpinning = True
 
         print("Starting async spin...")
-        while self._isAsyncSpinning == True:
-            self._pinStep.value = True
-            # Let another task run.
-            await asyncio.sleep(self._minPulseWidth)
-            
-            self._pinStep.value = False
-            # Let another task run.
-            await asyncio.sleep(self._minPulseWidth)
+        rate = self.defaultRate()
+        self.spinPulseStart(rate)
+        try:
+            while self._isAsyncSpinning == True:
+                # The pwm hardware does the stepping, so we just check back now and then
+                await asyncio.sleep(self.spinCheckSecs)
+        finally:
+            self.spinPulseStop()
         
         print("Exiting out of async spin")
 
@@ -158,20 +205,18 @@ class Stepper:
             # each time through loop we should check if they want to start or stop steps
             if self._isAsyncSpinning:
 
-                # print("doing a step")
-                # They want spin, so do a step
-                self._pinStep.value = True
-                # Let another task run.
-                await asyncio.sleep(self._minPulseWidth)
-                
-                self._pinStep.value = False
-                # Let another task run.
-                await asyncio.sleep(self._minPulseWidth)
+                # print("spinning")
+                # They want spin, so have the pwm hardware step for us, and check back in a bit
+                if not self._pulseTrain.isStarted():
+                    self.spinPulseStart(self.defaultRate())
+                await asyncio.sleep(self.spinCheckSecs)
 
                 # during debug wait a long time
                 # await asyncio.sleep(2)
             else:
                 # print("not doing a step")
+                if self._pulseTrain.isStarted():
+                    self.spinPulseStop()
 
                 # They don't want spin so skip and yield to other events
                 await asyncio.sleep(0)
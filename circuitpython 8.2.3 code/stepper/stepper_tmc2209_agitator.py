@@ -4,8 +4,17 @@ import board
 import time
 import asyncio
 import pwmio
+import countio
+from array import array
+from stepper.loop_stats import LoopStats
 
 class StepperAgitator:
+
+    # Bits in rockFlags for each rock ramp segment
+    ROCK_FWD = 0x01     # dir is fwd (True)
+    ROCK_PAUSE = 0x02   # pause for the segment's secs rather than stepping
+    ROCK_SWING = 0x04   # a half swing (base out to the end, or back) starts at this segment
+
     def __init__(self, *args):
 
         print("Initting Agitator Stepper library...")
@@ -43,6 +52,107 @@ class StepperAgitator:
         # Set to true to force exit the infinite loop
         self._isAsyncForceStop = False
 
+        # While rockAsyncTask() runs, the step pin is a pwm output and each segment of the rock
+        # ramp is a burst at that segment's step rate. The pin can't count its own pulses, so we
+        # work out how many steps each burst did from how long it ran, and keep track of how far
+        # off the flapper is from where it should be in rockPosErr (in steps, + is fwd). Each
+        # segment asks for its steps plus rockPosErr, so the little timing errors don't build up.
+        # If you jumper the step pin to a spare pin and set _pinCountPin to it, we count the real
+        # pulses with countio instead, and end each burst on the count.
+        self._pinCountPin = None
+        # With a counter, we sleep until this long before the burst should be done, then
+        # check the counter every rockCountPollSecs
+        self.rockCountSlackSecs = 0.005
+        self.rockCountPollSecs = 0.001
+        self.rockPosErr = 0
+        self._rockPwm = None
+        self._rockCounter = None
+        self._segSign = 0
+        self._segFreq = 0
+        self._segStartNs = 0
+        self._segCountStart = 0
+        # Wakeups per swing so you can see how little loop time we take
+        self.loopStats = LoopStats("Agitator rock")
+
+        # This stepper motor is 1.8deg per step
+        # That means 360/1.8 = 200 steps per revolution
+        # 45 degrees = 45/1.8 = 25 steps
+        # We are at 8 microsteps, so multiply all by 8
+        # 45 degrees = 45/1.8 = 25 steps * 8 = 200
+        # Heads up, the table below actually adds up to 45*3 + 135*2 = 540 steps each way, which
+        # is 540/8*1.8 = 121.5 degrees, not 45. RockProfile(swingDeg=121.5) gives the same swing.
+        # Rather than hand tuning this table, see setRockProfile() and stepper/rock_profile.py.
+
+        # We need some variables for speed/accel
+        # ramp = []
+        # Start accel from base position to pos 45 deg
+        self.rockRamp = [
+            {'pause':True, 'dur':0.1},
+            {'pw':0.01, 'steps':45, 'dir':True},  # Fwd
+            {'pw':0.008, 'steps':45, 'dir':True},
+            {'pw':0.006, 'steps':45, 'dir':True},
+            # max speed
+            {'pw':0.004, 'steps':45*3, 'dir':True},
+            {'pw':0.004, 'steps':45*3, 'dir':True},
+            # Slow down to end of 1st 45 degree swing
+            {'pw':0.006, 'steps':45, 'dir':True},
+            {'pw':0.008, 'steps':45, 'dir':True},
+            {'pw':0.01, 'steps':45, 'dir':True},
+            # Pause at top of 45 deg
+            {'pause':True, 'dur':0.1},
+            # Start accel back towards base
+            {'pw':0.01, 'steps':45, 'dir':False}, # Rev
+            {'pw':0.008, 'steps':45, 'dir':False},
+            {'pw':0.006, 'steps':45, 'dir':False},
+            # max speed
+            {'pw':0.004, 'steps':45*3, 'dir':False},
+            {'pw':0.004, 'steps':45*3, 'dir':False},
+            # Slow down to end of 1st 45 degree swing back to base
+            {'pw':0.006, 'steps':45, 'dir':False},
+            {'pw':0.008, 'steps':45, 'dir':False},
+            {'pw':0.01, 'steps':45, 'dir':False},
+            # Pause at base
+            {'pause':True, 'dur':0.1},
+            # Start accel from base position to neg 45 deg
+            {'pw':0.01, 'steps':45, 'dir':False}, # Fwd
+            {'pw':0.008, 'steps':45, 'dir':False},
+            {'pw':0.006, 'steps':45, 'dir':False},
+            # max speed
+            {'pw':0.004, 'steps':45*3, 'dir':False},
+            {'pw':0.004, 'steps':45*3, 'dir':False},
+            # Slow down to end of 1st 45 degree swing
+            {'pw':0.006, 'steps':45, 'dir':False},
+            {'pw':0.008, 'steps':45, 'dir':False},
+            {'pw':0.01, 'steps':45, 'dir':False},
+            # Pause at top of neg 45 deg
+            {'pause':True, 'dur':0.1},
+            # Start accel back towards base
+            {'pw':0.01, 'steps':45, 'dir':True}, # Rev
+            {'pw':0.008, 'steps':45, 'dir':True},
+            {'pw':0.006, 'steps':45, 'dir':True},
+            # max speed
+            {'pw':0.004, 'steps':45*3, 'dir':True},
+            {'pw':0.004, 'steps':45*3, 'dir':True},
+            # Slow down to end of 2nd 45 degree swing back to base
+            {'pw':0.006, 'steps':45, 'dir':True},
+            {'pw':0.008, 'steps':45, 'dir':True},
+            {'pw':0.01, 'steps':45, 'dir':True},
+            # Pause at base
+            {'pause':True, 'dur':0.2}
+        ]
+
+        # The list of dicts above is nice to read and edit, but looking up string keys for every
+        # step is slow and churns memory. So we compile it once into parallel arrays, one entry
+        # per segment, and rockAsyncTask() only ever reads those.
+        self.compileRockRamp()
+
+        # If synced, rockAsyncTask waits for triggerSwing() before starting each half swing of
+        # the ramp, so something else (like ScoopSync) can decide exactly when each push happens.
+        # _swingDoneEvent gets set each time we finish a half swing.
+        self.isSynced = False
+        self._swingTriggerEvent = asyncio.Event()
+        self._swingDoneEvent = asyncio.Event()
+
     def dump(self):
         # print vals of pins on init
         print("---DUMP----")
@@ -126,6 +236,173 @@ class StepperAgitator:
 
     def rockAsyncForceStop(self):
         self._isAsyncForceStop = True
+        # In case we're synced and waiting on a trigger, let the loop see the force stop
+        self._swingTriggerEvent.set()
+
+    def triggerSwing(self):
+        """When synced, start the next half swing of the rock ramp now."""
+        self._swingDoneEvent.clear()
+        self._swingTriggerEvent.set()
+
+    def isRocking(self):
+        return self._isAsyncSpinning
+
+    async def waitSwingDone(self):
+        """Wait until we finish the half swing that triggerSwing() started."""
+        await self._swingDoneEvent.wait()
+
+    def nextSwingSecs(self):
+        """How long from triggerSwing() until the next half swing is done moving, which is when
+        it pushes. This is worked out from the ramp rockAsyncTask is really running, so it
+        follows setRockProfile() once the task picks the new ramp up."""
+        return self._nextSwingSecs
+
+    def compileRockRamp(self):
+        """Compile rockRamp into rockSteps (steps per segment), rockWaitSecs (the low time of each
+        step, which is pw * 0.1, or the pause duration) and rockFlags (ROCK_FWD/ROCK_PAUSE/
+        ROCK_SWING bits). Call this again if you change rockRamp. rockAsyncTask() picks it up
+        the next time it starts over at the top of the ramp.
+
+        A half swing starts at the top of the ramp and at every pause that comes right after a
+        move, as long as there's another move after it. So a pause at the very end (like the
+        pause at base in the hand written table) is part of the last half swing. rockSwingSecs
+        has, at each half swing's first segment, how long until its last move is done."""
+
+        steps = []
+        secs = []
+        flags = []
+        for seg in self.rockRamp:
+            if 'pause' in seg:
+                steps.append(0)
+                secs.append(seg['dur'])
+                flags.append(self.ROCK_PAUSE)
+            else:
+                steps.append(seg['steps'])
+                secs.append(seg['pw'] * 0.1)
+                flags.append(self.ROCK_FWD if seg['dir'] else 0)
+
+        # Mark where each half swing starts
+        lastMove = -1
+        for i in range(len(flags)):
+            if not flags[i] & self.ROCK_PAUSE:
+                lastMove = i
+        for i in range(len(flags)):
+            if i == 0 or (flags[i] & self.ROCK_PAUSE and not flags[i-1] & self.ROCK_PAUSE and i < lastMove):
+                flags[i] |= self.ROCK_SWING
+
+        # Time from each half swing's start to the end of its last move
+        swingSecs = [0] * len(flags)
+        start = 0
+        elapsed = 0
+        moveDone = 0
+        for i in range(len(flags) + 1):
+            if i == len(flags) or (i > 0 and flags[i] & self.ROCK_SWING):
+                swingSecs[start] = moveDone
+                start = i
+                elapsed = 0
+                moveDone = 0
+            if i == len(flags):
+                break
+            if flags[i] & self.ROCK_PAUSE:
+                elapsed += secs[i]
+            else:
+                elapsed += steps[i] * (self._minPulseWidth + secs[i])
+                moveDone = elapsed
+
+        self.rockSteps = array('H', steps)
+        self.rockWaitSecs = array('f', secs)
+        self.rockFlags = array('B', flags)
+        self.rockSwingSecs = array('f', swingSecs)
+
+        # Until rockAsyncTask is running, the next half swing is the first one
+        if self._rockPwm == None:
+            self._nextSwingSecs = swingSecs[0]
+
+    def setRockProfile(self, profile):
+        """Replace our hand written rockRamp with the one a RockProfile (see
+        stepper/rock_profile.py) worked out from swing angle, speed, accel and dwell."""
+        self.rockRamp = profile.rockRamp(self._minPulseWidth)
+        self.compileRockRamp()
+        print("Agitator using rock profile. segments:", len(self.rockRamp), "rockSecs:", round(self.rockSecs(), 3))
+
+    def rockSecs(self):
+        """How long one pass thru the rock ramp takes, from our pulse widths and pauses. Each
+        step segment runs as a pwm burst, so this is pretty close to what happens on the wall."""
+        secs = 0
+        for i in range(len(self.rockSteps)):
+            if self.rockFlags[i] & self.ROCK_PAUSE:
+                secs += self.rockWaitSecs[i]
+            else:
+                secs += self.rockSteps[i] * (self._minPulseWidth + self.rockWaitSecs[i])
+        return secs
+
+    def rockSegmentStart(self, steps, lowSecs, isFwd):
+        """Start the PWM burst for one step segment of the rock ramp, right where the last one
+        left off. Returns how many steps we want out of it (the segment's steps plus whatever
+        the earlier segments came up short or went over) and the real pwm frequency."""
+
+        pwm = self._rockPwm
+
+        if pwm.duty_cycle != 0 and self._pinDir.value != isFwd:
+            # Changing direction, so stop before flipping dir
+            pwm.duty_cycle = 0
+        self.rockSegmentEnd()
+        self.dir(isFwd)
+
+        # Same step rate the old one step per await loop was going for
+        pwm.frequency = int(1 / (self._minPulseWidth + lowSecs) + 0.5)
+        freq = pwm.frequency
+
+        sign = 1 if isFwd else -1
+        self.rockPosErr += sign * steps
+        want = max(sign * self.rockPosErr, 0)
+
+        self._segSign = sign
+        self._segFreq = freq
+        self._segStartNs = time.monotonic_ns()
+        if self._rockCounter != None:
+            self._segCountStart = self._rockCounter.count
+
+        if pwm.duty_cycle == 0:
+            pwm.duty_cycle = 2 ** 15
+
+        return want, freq
+
+    def rockSegmentEnd(self):
+        """The segment that was running just ended, since we're about to change frequency,
+        direction or stop. Take the steps it really did off rockPosErr. With a loopback counter
+        we know exactly, otherwise we work it out from how long it ran."""
+
+        if self._segSign == 0:
+            return
+
+        if self._rockCounter != None:
+            emitted = self._rockCounter.count - self._segCountStart
+        else:
+            emitted = int((time.monotonic_ns() - self._segStartNs) * self._segFreq / 1000000000 + 0.5)
+
+        self.rockPosErr -= self._segSign * emitted
+        self._segSign = 0
+
+    def rockStopPwm(self):
+        if self._rockPwm.duty_cycle != 0:
+            self._rockPwm.duty_cycle = 0
+        self.rockSegmentEnd()
+
+    async def rockSegmentWait(self, want, freq):
+        """Let the current segment run until it has done want steps."""
+
+        if self._rockCounter == None:
+            await asyncio.sleep(want / freq)
+            self.loopStats.wake("step")
+            return
+
+        # Sleep until we're almost there, then watch the counter for the last few steps
+        await asyncio.sleep(max(want / freq - self.rockCountSlackSecs, 0))
+        self.loopStats.wake("step")
+        while self._rockCounter.count - self._segCountStart < want:
+            await asyncio.sleep(self.rockCountPollSecs)
+            self.loopStats.wake("poll")
 
     async def rockAsyncTask(self):
         """This method starts an infinite loop task to rock the stepper motor. Rocking the motor
@@ -134,138 +411,107 @@ class StepperAgitator:
         happen in sync with each pick up of a marble by the scoopers.
         It does not actually rock the motor when first called, rather just starts the watch loop.
         To start rocking the motor, call rockAsyncStart(). To stop rocking the motor, call
-        rockAsyncStop()."""
+        rockAsyncStop().
+
+        We used to toggle the step pin ourselves with an await after every edge, which is
+        thousands of trips thru the event loop per swing and starved the display and counter
+        tasks. Now each segment of the rock ramp runs as a PWM burst at the segment's step rate,
+        and we only wake up when it's time for the next segment. Segments in the same direction
+        run back to back without stopping the pwm, so the ramp is just a series of frequency
+        changes. See rockSegmentStart() for how we keep the flapper from drifting."""
 
         print("Starting infinite async rocker task...")
 
         self._isAsyncForceStop = False
 
-        # This stepper motor is 1.8deg per step
-        # That means 360/1.8 = 200 steps per revolution
-        # 45 degrees = 45/1.8 = 25 steps
-        # We are at 8 microsteps, so multiply all by 8
-        # 45 degrees = 45/1.8 = 25 steps * 8 = 200
-
-        # We need some variables for speed/accel
-        # ramp = []
-        # Start accel from base position to pos 45 deg
-        ramp = [
-            {'pause':True, 'dur':0.1},
-            {'pw':0.01, 'steps':45, 'dir':True},  # Fwd
-            {'pw':0.008, 'steps':45, 'dir':True},
-            {'pw':0.006, 'steps':45, 'dir':True},
-            # max speed
-            {'pw':0.004, 'steps':45*3, 'dir':True},
-            {'pw':0.004, 'steps':45*3, 'dir':True},
-            # Slow down to end of 1st 45 degree swing
-            {'pw':0.006, 'steps':45, 'dir':True},
-            {'pw':0.008, 'steps':45, 'dir':True},
-            {'pw':0.01, 'steps':45, 'dir':True},
-            # Pause at top of 45 deg
-            {'pause':True, 'dur':0.1},
-            # Start accel back towards base
-            {'pw':0.01, 'steps':45, 'dir':False}, # Rev
-            {'pw':0.008, 'steps':45, 'dir':False},
-            {'pw':0.006, 'steps':45, 'dir':False},
-            # max speed
-            {'pw':0.004, 'steps':45*3, 'dir':False},
-            {'pw':0.004, 'steps':45*3, 'dir':False},
-            # Slow down to end of 1st 45 degree swing back to base
-            {'pw':0.006, 'steps':45, 'dir':False},
-            {'pw':0.008, 'steps':45, 'dir':False},
-            {'pw':0.01, 'steps':45, 'dir':False},
-            # Pause at base
-            {'pause':True, 'dur':0.1},
-            # Start accel from base position to neg 45 deg
-            {'pw':0.01, 'steps':45, 'dir':False}, # Fwd
-            {'pw':0.008, 'steps':45, 'dir':False},
-            {'pw':0.006, 'steps':45, 'dir':False},
-            # max speed
-            {'pw':0.004, 'steps':45*3, 'dir':False},
-            {'pw':0.004, 'steps':45*3, 'dir':False},
-            # Slow down to end of 1st 45 degree swing
-            {'pw':0.006, 'steps':45, 'dir':False},
-            {'pw':0.008, 'steps':45, 'dir':False},
-            {'pw':0.01, 'steps':45, 'dir':False},
-            # Pause at top of neg 45 deg
-            {'pause':True, 'dur':0.1},
-            # Start accel back towards base
-            {'pw':0.01, 'steps':45, 'dir':True}, # Rev
-            {'pw':0.008, 'steps':45, 'dir':True},
-            {'pw':0.006, 'steps':45, 'dir':True},
-            # max speed
-            {'pw':0.004, 'steps':45*3, 'dir':True},
-            {'pw':0.004, 'steps':45*3, 'dir':True},
-            # Slow down to end of 2nd 45 degree swing back to base
-            {'pw':0.006, 'steps':45, 'dir':True},
-            {'pw':0.008, 'steps':45, 'dir':True},
-            {'pw':0.01, 'steps':45, 'dir':True},
-            # Pause at base
-            {'pause':True, 'dur':0.2}
-        ]
-        # # Continue loop...
+        # The pwm needs the step pin to itself while we rock
+        self._pinStep.deinit()
+        self._rockPwm = pwmio.PWMOut(self._pinStepPin, frequency=1000, duty_cycle=0, variable_frequency=True)
+        if self._pinCountPin != None:
+            self._rockCounter = countio.Counter(self._pinCountPin, edge=countio.Edge.RISE)
+
+        # Our compiled rock ramp. We grab these again at the start of each swing in case
+        # compileRockRamp() got called.
+        rampSteps = self.rockSteps
+        rampSecs = self.rockWaitSecs
+        rampFlags = self.rockFlags
+        rampSwingSecs = self.rockSwingSecs
         
         # Loop index variable
         liv = 0
 
         while True and self._isAsyncForceStop == False:
 
-            # print("in while loop of rockAsyncTask. isAsyncSpinning:", self._isAsyncSpinning, "liv:", liv, "ramp[liv]:", ramp[liv])
+            # print("in while loop of rockAsyncTask. isAsyncSpinning:", self._isAsyncSpinning, "liv:", liv, "flags:", rampFlags[liv])
 
             # each time through loop we should check if they want to start or stop steps
             if self._isAsyncSpinning:
 
+                if liv == 0:
+                    rampSteps = self.rockSteps
+                    rampSecs = self.rockWaitSecs
+                    rampFlags = self.rockFlags
+                    rampSwingSecs = self.rockSwingSecs
+
+                flags = rampFlags[liv]
+
+                if flags & self.ROCK_SWING:
+                    # The last half swing is done and the next one starts here
+                    self._nextSwingSecs = rampSwingSecs[liv]
+                    self._swingDoneEvent.set()
+
+                    # If we're synced, wait until we're told to start each half swing
+                    if self.isSynced:
+                        self.rockStopPwm()
+                        await self._swingTriggerEvent.wait()
+                        self._swingTriggerEvent.clear()
+                        self.loopStats.wake("sync")
+                        if self._isAsyncForceStop:
+                            break
+
                 # Let's see if we're in a pause mode or a step mode
-                if 'pause' in ramp[liv]:
+                if flags & self.ROCK_PAUSE:
 
                     # They want a pause
-                    print("Pausing for dur:", ramp[liv]['dur'])
-                    await asyncio.sleep(ramp[liv]['dur'])
+                    self.rockStopPwm()
+                    print("Pausing for dur:", rampSecs[liv])
+                    await asyncio.sleep(rampSecs[liv])
+                    self.loopStats.wake("pause")
 
                 else:
 
-                    # They want a step move. We are given steps so do a range
-                    print("Doing range of steps:", ramp[liv]['steps'], "pw:", ramp[liv]['pw'], "dir:", ramp[liv]['dir'])
-                    
-                    # Set the direction
-                    self.dir(ramp[liv]['dir'])
-                    # if ramp[liv].dir and :
-                    #     self.fwd()
-                    # else:
-                    #     self.rev()
-
-                    for x in range(ramp[liv]['steps']):
-
-                        # print("doing a step")
-                        # They want spin, so do a step
-                        self._pinStep.value = True
-                        # Let another task run for our pulsewidth
-                        await asyncio.sleep(self._minPulseWidth)
-                        # await asyncio.sleep(ramp[liv]['pw'] * 0.1)
-                        
-                        self._pinStep.value = False
-                        # Let another task run for our pulsewidth
-                        await asyncio.sleep(ramp[liv]['pw'] * 0.1)
-
-                        # during debug wait a long time
-                        # await asyncio.sleep(2)
+                    # They want a step move at this segment's rate
+                    want, freq = self.rockSegmentStart(rampSteps[liv], rampSecs[liv], (flags & self.ROCK_FWD) != 0)
+                    print("Doing range of steps:", rampSteps[liv], "want:", want, "freq:", freq, "flags:", flags)
+                    await self.rockSegmentWait(want, freq)
 
                 # Increment loop index variable
                 liv += 1
 
                 # See if we went past end of array
-                if liv >= len(ramp):
-                    print("Going back to start of ramp array. liv:", liv)
+                if liv >= len(rampSteps):
+                    print("Going back to start of ramp array. liv:", liv, "rockPosErr:", self.rockPosErr)
                     liv = 0
+                    self.loopStats.report()
+                    self.loopStats.reset()
 
             else:
                 # print("not doing a step")
+                self.rockStopPwm()
 
                 # They don't want spin so skip and yield to other events
                 # wait a decent amount of time to not overload the system
                 await asyncio.sleep(0.1)
 
         # They want to fully exit this infinite loop
+        self.rockStopPwm()
+        self._rockPwm.deinit()
+        self._rockPwm = None
+        if self._rockCounter != None:
+            self._rockCounter.deinit()
+            self._rockCounter = None
+        self._pinStep = digitalio.DigitalInOut(self._pinStepPin)
+        self._pinStep.direction = digitalio.Direction.OUTPUT
         print("Exiting the rockAsyncTask infinite loop")
             
 
@@ -296,6 +542,76 @@ async def testAsyncRock():
     s.disable()
     s.deinit()
 
+def testRockTableCost():
+    """Measures what the rock ramp costs in memory and per step, the old list of dicts vs the
+    compiled arrays. The motor doesn't move. The sleeps are left out so we only time our own
+    overhead per step, and we watch gc.mem_free() to see if the step loop allocates."""
+    import gc
+
+    s = StepperAgitator()
+    pin = s._pinStep
+
+    gc.collect()
+    free = gc.mem_free()
+    ramp = [dict(seg) for seg in s.rockRamp]
+    gc.collect()
+    print("Rock ramp list of dicts bytes:", free - gc.mem_free())
+
+    # Throw away the arrays from init so we only count the new ones
+    s.rockSteps = None
+    s.rockWaitSecs = None
+    s.rockFlags = None
+    gc.collect()
+    free = gc.mem_free()
+    s.compileRockRamp()
+    gc.collect()
+    print("Rock ramp compiled arrays bytes:", free - gc.mem_free())
+
+    # Old way. Look up the segment dict and its keys for every step.
+    gc.collect()
+    free = gc.mem_free()
+    steps = 0
+    t = time.monotonic_ns()
+    for liv in range(len(ramp)):
+        if 'pause' in ramp[liv]:
+            continue
+        s.dir(ramp[liv]['dir'])
+        for x in range(ramp[liv]['steps']):
+            pin.value = True
+            w = s._minPulseWidth
+            pin.value = False
+            w = ramp[liv]['pw'] * 0.1
+            steps += 1
+    ns = time.monotonic_ns() - t
+    print("Rock old per step us:", ns / steps / 1000, "bytes allocated:", free - gc.mem_free(), "steps:", steps)
+
+    # New way, walking the compiled arrays
+    gc.collect()
+    free = gc.mem_free()
+    steps = 0
+    rampSteps = s.rockSteps
+    rampSecs = s.rockWaitSecs
+    rampFlags = s.rockFlags
+    t = time.monotonic_ns()
+    for liv in range(len(rampSteps)):
+        flags = rampFlags[liv]
+        if flags & s.ROCK_PAUSE:
+            continue
+        s.dir((flags & s.ROCK_FWD) != 0)
+        highSecs = s._minPulseWidth
+        lowSecs = rampSecs[liv]
+        for x in range(rampSteps[liv]):
+            pin.value = True
+            w = highSecs
+            pin.value = False
+            w = lowSecs
+            steps += 1
+    ns = time.monotonic_ns() - t
+    print("Rock compiled per step us:", ns / steps / 1000, "bytes allocated:", free - gc.mem_free(), "steps:", steps)
+
+    s.deinit()
+
 # test()
-asyncio.run(testAsyncRock())
+# asyncio.run(testAsyncRock())
+# testRockTableCost()
 
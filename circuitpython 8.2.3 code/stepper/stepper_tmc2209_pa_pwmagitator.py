@@ -4,6 +4,8 @@ import board
 import time
 import asyncio
 import pwmio
+from stepper.diag_watcher import DiagWatcher
+from stepper.loop_stats import LoopStats
 
 class StepperAgitator:
     def __init__(self, *args):
@@ -24,13 +26,23 @@ class StepperAgitator:
         self._pinDir = digitalio.DigitalInOut(self._pinDirPin)
         self._pinDir.direction = digitalio.Direction.OUTPUT
         self._pinDir.value = False
-        self._pinDiag = digitalio.DigitalInOut(self._pinDiagPin)
-        self._pinDiag.direction = digitalio.Direction.INPUT
+        # Watch the diag pin for driver faults in the background rather than polling it each tick
+        self.diag = DiagWatcher(self._pinDiagPin, "Agitator", self.onDiagFault)
 
         # setup pinStep as PWM output
         self.freqMin = 10   # we can't go below this (pwm hardware won't support it)
         self.freqMax = 200 #1000 # we can't go above as motor would turn too fast
-        self.freqStep = 3 * 100 # since doing 0.1 sleep, if 0.01 sleep use 3  # when accel/decel on stepper this is the amount of ramp
+        self.freqStep = 3 * 100 # Hz of ramp per freqStepSecs. when accel/decel on stepper this is the amount of ramp
+        self.freqStepSecs = 0.1
+        # How long we sleep each time thru our async spin loop while ramping. We take a
+        # proportionally smaller piece of freqStep each tick, so the ramp takes the same time but
+        # in smaller steps.
+        self.tickSecs = 0.01
+        # While at max speed (or stopped) there's nothing to ramp, so we only wake up this often.
+        # spinAsyncStart()/spinAsyncStop() wake us right away so we don't react late.
+        self.cruiseTickSecs = 0.25
+        # Wakeups per state and ramp smoothness for each run
+        self.loopStats = LoopStats("Agitator")
         self._pinStep = pwmio.PWMOut(
             self._pinStepPin, 
             frequency=self.freqMax, # Not allowed to set to 0, so use duty_cycle as our method of turning off stepper
@@ -63,19 +75,20 @@ class StepperAgitator:
         # so if it becomes True, we can exit the async process
         self._isAsyncSpinning = False
 
+        # While the motor is fully stopped our async spin task parks on this event rather
+        # than waking up every tick. spinAsyncStart() sets it to wake the task back up.
+        self._wakeEvent = asyncio.Event()
+
         # print vals of pins on init
         self.dump()
 
-        # setup a time.monotonic() so our diag check doesn't error out
-        self._lastTimeDiagShown = time.time()
-
     def dump(self):
         # print vals of pins on init
         print("---AGITATOR DUMP----")
         print("Enable:", self._pinEnable.value)
         print("Dir:", self._pinDir.value)
         print("Step: Freq:", self._pinStep.frequency, "Duty:", self._pinStep.duty_cycle)
-        print("Diag:", self._pinDiag.value)
+        print("Diag: Faulted:", self.diag.isFaulted, "FaultCtr:", self.diag.faultCtr)
         # print("MS1:", self._pinMs1.value)
         # print("MS2:", self._pinMs2.value)
         print("-------")
@@ -109,6 +122,8 @@ class StepperAgitator:
         self._pinEnable.value = False 
         # self._pinEnable.pull = digitalio.Pull.DOWN
         print("Agitator Enabled")
+        # Now that the driver is on, start watching for faults
+        self.diag.arm()
 
     def disable(self):
         # Enable Motor Outputs (GND=on, VIO=off)
@@ -116,6 +131,7 @@ class StepperAgitator:
         self._pinEnable.value = True 
         # self._pinEnable.pull = digitalio.Pull.UP
         print("Agitator Disabled")
+        self.diag.disarm()
 
     def fwd(self):
         print("Agitator Going fwd")
@@ -137,16 +153,35 @@ class StepperAgitator:
         self._pinEnable.deinit()
         self._pinDir.deinit()
         self._pinStep.deinit()
-        self._pinDiag.deinit()
+        self.diag.deinit()
         # self._pinMs1.deinit()
         # self._pinMs2.deinit()
         print("Agitator Deinitted")
 
     def spinAsyncStop(self):
         self._isAsyncSpinning = False
+        # If we're at max speed on the slow tick, wake up and start ramping down now
+        self._wakeEvent.set()
 
     def spinAsyncStart(self):
         self._isAsyncSpinning = True
+        self._wakeEvent.set()
+
+    def setFreqMax(self, freq):
+        """Change how fast we agitate, any time. While running we ramp up or down to the new
+        freqMax at our normal ramp rate."""
+        self.freqMax = int(max(freq, self.freqMin))
+        # If we're cruising on the slow tick, wake up and start ramping now
+        self._wakeEvent.set()
+
+    def isIdle(self):
+        """Returns True if the motor is fully stopped and nobody wants it spinning, which
+        means our async spin task can park until spinAsyncStart() is called."""
+        return not self._isAsyncSpinning and self._pinStep.duty_cycle == 0
+
+    def rampStepHz(self):
+        """How much to change freq by each tick while ramping, i.e. our share of freqStep."""
+        return max(1, int(self.freqStep * self.tickSecs / self.freqStepSecs + 0.5))
 
     async def spinAsyncTaskPwm(self):
         """This method starts an infinite loop task to spin the stepper motor.
@@ -159,10 +194,18 @@ class StepperAgitator:
         as it stops."""
 
         print("Agitator Starting infinite async spin PWM task...")
+
+        # Start our diag fault watcher. It runs on its own so faults get handled right away
+        # rather than waiting for our next tick.
+        self._diagTask = asyncio.create_task(self.diag.asyncTaskWatchDiag())
         
         # define preFreq out here so it doesn't get recreated each time thru while loop
         prevFreq = -1
 
+        # What we were doing last time thru the loop, so we know how long to sleep and which state
+        # to count our wakeup against
+        stateName = "stopped"
+
         while True:
 
             # print("in while loop of spinAsyncTask. isAsyncSpinning:", self._isAsyncSpinning)
@@ -184,6 +227,9 @@ class StepperAgitator:
             #                       Turn duty cycle to 0 to turn off motor.
 
             prevFreq = self.freq
+
+            # Count this wakeup against the state we were sleeping in
+            self.loopStats.wake(stateName)
                 
             # each time through loop we should check if they want to start or stop steps
             if self._isAsyncSpinning:
@@ -195,24 +241,29 @@ class StepperAgitator:
                     # 1st turn on. Need to turn on duty cycle to 50%. Then set freq.
                     self._pinStep.duty_cycle = 32768
                     self._pinStep.frequency = self.freq
+                    self.loopStats.reset()
+                    stateName = "accel"
                     print("Agitator 1st turn on. Setting duty to 50%. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency, "duty:", self._pinStep.duty_cycle)
 
                 elif self.freq == self.freqMax:
                     # They are at max speed. So leave alone.
                     # print("At max freq. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
-                    pass 
+                    stateName = "maxspeed"
 
                 elif self.freq > self.freqMax:
-                    # They are at max speed. So leave alone.
-                    # This is not really an error as the pwm subsystem doesn't always
-                    # set at exactly the value you ask for.
-                    # print("Agitator ERROR: self.freq is > than freqMax. Huh? This should never happen. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
-                    pass 
+                    # Someone lowered freqMax while we were running (see setFreqMax()), so ease
+                    # back down to it rather than staying up here
+                    self.freq = max(self.freq - self.rampStepHz(), self.freqMax)
+                    self._pinStep.frequency = self.freq
+                    self.loopStats.rampStep(prevFreq, self.freq)
+                    stateName = "decel"
                 
                 else:
-                    # Just increase freq
-                    self.freq = self.freq + self.freqStep
+                    # Just increase freq. Don't overshoot freqMax.
+                    self.freq = min(self.freq + self.rampStepHz(), self.freqMax)
                     self._pinStep.frequency = self.freq
+                    self.loopStats.rampStep(prevFreq, self.freq)
+                    stateName = "accel"
                     # print("Increase freq. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
 
             else:
@@ -223,23 +274,39 @@ class StepperAgitator:
                     if self._pinStep.duty_cycle > 0:
                         self._pinStep.duty_cycle = 0
                         print("Agitator Just turned off motor. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency, "duty:", self._pinStep.duty_cycle)
+                        self.loopStats.report()
                     else:
                         # do nothing as motor is off and we should just ignore
                         # print("Motor is idle. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
                         pass
+                    stateName = "stopped"
                 else:
-                    # Decrease freq
-                    self.freq = self.freq - self.freqStep
+                    # Decrease freq. Don't go below freqMin in case freqStep got changed mid ramp.
+                    self.freq = max(self.freq - self.rampStepHz(), self.freqMin)
                     self._pinStep.frequency = self.freq
+                    self.loopStats.rampStep(prevFreq, self.freq)
+                    stateName = "decel"
                     # print("Decrease freq. prevFreq:", prevFreq, "newFreq:", self.freq, "actual:", self._pinStep.frequency)
 
-            # check to see if diag pin went high and print error
-            self.checkDiag()
-
             # Yield to other events
             # await asyncio.sleep(0)
-            # during debug/run wait a long time so as not to call ourself back too often
-            await asyncio.sleep(0.1)
+            if self.isIdle():
+                # Motor is fully stopped, so there's nothing to ramp. Rather than waking up every tick
+                # all day long, park here until spinAsyncStart() wakes us back up.
+                print("Agitator spin task parking until next start")
+                self._wakeEvent.clear()
+                await self._wakeEvent.wait()
+            elif stateName == "maxspeed" or stateName == "stopped":
+                # Nothing to ramp, so wake up on the slow tick, or right away if
+                # spinAsyncStart()/spinAsyncStop() gets called
+                self._wakeEvent.clear()
+                try:
+                    await asyncio.wait_for(self._wakeEvent.wait(), self.cruiseTickSecs)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Ramping, so come back quick for the next step of the ramp
+                await asyncio.sleep(self.tickSecs)
 
     async def spinAsyncExitTimer(self, duration):
         print("Starting timer")
@@ -248,12 +315,16 @@ class StepperAgitator:
         self.spinAsyncStop()
         print("Ended timer")
 
-    def checkDiag(self):
-        """This method checks the value of the Diag pin to see if it is high. If it is, we print an error."""
+    def onDiagFault(self):
+        """Our diag watcher calls this as soon as the driver flags a fault. We stop the motor
+        right away rather than ramping down."""
 
-        if self._pinDiag.value == True and time.time() - self._lastTimeDiagShown > 1:
-            print("Agitator Diag Pin ERROR!!!")
-            self._lastTimeDiagShown = time.time()
+        print("Agitator Diag Pin FAULT!!! Stopping motor. freq:", self.freq)
+
+        self._isAsyncSpinning = False
+        self._pinStep.duty_cycle = 0
+        self.freq = self.freqMin
+        self.disable()
             
 # Test Code
 
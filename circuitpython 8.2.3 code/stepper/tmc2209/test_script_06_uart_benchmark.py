@@ -0,0 +1,203 @@
+from tmc.tmc_2209_uart import TMC_UART
+import gc
+import struct
+import time
+
+
+print("---")
+print("SCRIPT START")
+print("---")
+
+
+
+#-----------------------------------------------------------------------
+# microbenchmark for the TMC UART layer
+#
+# shows register transactions per second and how many bytes each one
+# allocates, for the old way (list frames, slices, bytes(), bit by bit
+# crc, struct.unpack) and for TMC_UART now (preallocated bytearray
+# frames, crc lookup table, memoryview, readinto).
+#
+# by default it talks to a fake TMC that answers instantly out of
+# preallocated buffers, so we time just our own code and not the
+# 115200 baud wire or the communication_pause sleeps. set USE_CHIP to
+# True to run it against the real TMC2209 on the board's UART too.
+#-----------------------------------------------------------------------
+USE_CHIP = False
+LOOPS = 500
+
+IFCNT = 0x02
+GCONF = 0x00
+
+
+#-----------------------------------------------------------------------
+# a fake TMC on the single wire UART. everything we write (reads and
+# writes) gets echoed back like the real wire does, then reads get a
+# proper reply frame. like the board's UART, received bytes wait in a
+# buffer until read, and once it's full new ones get dropped
+#-----------------------------------------------------------------------
+class FakeTmcSerial:
+
+    RX_SIZE = 64
+
+    def __init__(self):
+        self.uart = TMC_UART(0, 115200, ser=self)
+        self.reply = bytearray([0x05, 0xFF, IFCNT, 0, 0, 0, 42, 0])
+        self.reply[7] = self.uart.compute_crc8_atm(self.reply, 0, 7)
+        self.rx = bytearray(self.RX_SIZE)
+        self.rx_len = 0
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def receive(self, buf, length):
+        for i in range(length):
+            if self.rx_len < self.RX_SIZE:
+                self.rx[self.rx_len] = buf[i]
+                self.rx_len += 1
+
+    def write(self, buf):
+        self.receive(buf, len(buf))
+        # a 4 byte frame is a read request, so answer it
+        if len(buf) == 4:
+            self.receive(self.reply, 8)
+        return len(buf)
+
+    def any(self):
+        return self.rx_len
+
+    def read(self):
+        buf = bytes(self.rx[:self.rx_len])
+        self.rx_len = 0
+        return buf
+
+    def readinto(self, buf):
+        n = min(len(buf), self.rx_len)
+        for i in range(n):
+            buf[i] = self.rx[i]
+        for i in range(n, self.rx_len):
+            self.rx[i - n] = self.rx[i]
+        self.rx_len -= n
+        return n
+
+    def close(self):
+        pass
+
+
+#-----------------------------------------------------------------------
+# the old read/write, kept here only so we have something to compare to
+#-----------------------------------------------------------------------
+def old_crc8_atm(datagram, initial_value=0):
+    crc = initial_value
+    for byte in datagram:
+        for _ in range(0, 8):
+            if (crc >> 7) ^ (byte & 0x01):
+                crc = ((crc << 1) ^ 0x07) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+            byte = byte >> 1
+    return crc
+
+rFrame = [0x55, 0, 0, 0]
+wFrame = [0x55, 0, 0, 0, 0, 0, 0, 0]
+
+def old_read_int(ser, reg):
+    rFrame[2] = reg
+    rFrame[3] = old_crc8_atm(rFrame[:-1])
+    ser.write(bytes(rFrame))
+    time.sleep(uart.communication_pause)
+    rtn = ser.read()
+    time.sleep(uart.communication_pause)
+    return struct.unpack(">i", rtn[7:11])[0]
+
+def old_write_reg(ser, reg, val):
+    wFrame[2] = reg | 0x80
+    wFrame[3] = 0xFF & (val>>24)
+    wFrame[4] = 0xFF & (val>>16)
+    wFrame[5] = 0xFF & (val>>8)
+    wFrame[6] = 0xFF & val
+    wFrame[7] = old_crc8_atm(wFrame[:-1])
+    ser.write(bytes(wFrame))
+    time.sleep(uart.communication_pause)
+    return True
+
+
+#-----------------------------------------------------------------------
+# bytes allocated per transaction. on CircuitPython we turn the gc off
+# and watch gc.mem_free() over all the loops. a computer has no
+# gc.mem_free(), and frees things right away, so there we use
+# tracemalloc's peak for one transaction, less what tracemalloc sees
+# for a transaction that does nothing at all. a computer still shows
+# a little for TMC_UART, since it builds a range iterator for the crc
+# loop, which CircuitPython doesn't
+#-----------------------------------------------------------------------
+if hasattr(gc, "mem_free"):
+    tracemalloc = None
+else:
+    import tracemalloc
+    tracemalloc.start()
+
+def bytes_per_transaction(transaction):
+    gc.collect()
+    if tracemalloc != None:
+        peaks = []
+        for t in (lambda: None, transaction):
+            gc.collect()
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            t()
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+        return max(peaks[1] - peaks[0], 0)
+    gc.disable()
+    free = gc.mem_free()
+    for i in range(LOOPS):
+        transaction()
+    used = free - gc.mem_free()
+    gc.enable()
+    return used / LOOPS
+
+def bench(name, transaction):
+    # one call first so any one time setup isn't counted
+    transaction()
+    used = bytes_per_transaction(transaction)
+    t = time.monotonic_ns()
+    for i in range(LOOPS):
+        transaction()
+    ns = time.monotonic_ns() - t
+    print(name, "transactions/sec:", int(LOOPS * 1000000000 / ns), "bytes/transaction:", used)
+
+
+fake = FakeTmcSerial()
+uart = fake.uart
+uart.communication_pause = 0
+
+bench("old read_int ", lambda: old_read_int(fake, IFCNT))
+bench("new read_int ", lambda: uart.read_int(IFCNT))
+bench("old write_reg", lambda: old_write_reg(fake, GCONF, 0x1C0))
+bench("new write_reg", lambda: uart.write_reg(GCONF, 0x1C0))
+
+print("read_int got:", uart.read_int(IFCNT), "expected: 42")
+
+# the write's echo has to be gone before the read, or the read comes back
+# shifted over by 8 bytes
+uart.write_reg(GCONF, 0x1C0)
+print("write_reg then read_int got:", uart.read_int(IFCNT), "expected: 42")
+uart.write_reg(GCONF, 0x1C0)
+uart.write_reg(GCONF, 0x1C0)
+print("2 write_regs then read_int got:", uart.read_int(IFCNT), "expected: 42")
+
+
+if USE_CHIP:
+    print("---\n---")
+    print("against the TMC2209 on the UART, communication_pause:", 500/115200)
+    chip = TMC_UART(2, 115200)
+    LOOPS = 50
+    bench("chip read_int ", lambda: chip.read_int(IFCNT))
+    gconf = chip.read_int(GCONF)
+    bench("chip write_reg", lambda: chip.write_reg(GCONF, gconf))
+    del chip
+
+
+print("---")
+print("SCRIPT FINISHED")
+print("---")
@@ -7,28 +7,78 @@ import struct
 import board
 from board import UART
 
+#-----------------------------------------------------------------------
+# CRC8-ATM lookup table
+#
+# the TMC feeds each byte into the crc LSB first, but shifts the crc
+# register MSB first (poly 0x07). so we keep the crc bit reversed while
+# we go, which lets us do a whole byte with one lookup:
+#   crc = CRC8_TABLE[crc ^ byte]
+# and flip it back with BIT_REVERSE at the end.
+# both tables are built once at import and are 256 bytes each
+#-----------------------------------------------------------------------
+def _crc8_atm_bitwise(byte):
+    crc = 0
+    for _ in range(0, 8):
+        if (crc >> 7) ^ (byte & 0x01):
+            crc = ((crc << 1) ^ 0x07) & 0xFF
+        else:
+            crc = (crc << 1) & 0xFF
+        byte = byte >> 1
+    return crc
+
+def _bit_reverse(byte):
+    rev = 0
+    for _ in range(0, 8):
+        rev = (rev << 1) | (byte & 0x01)
+        byte = byte >> 1
+    return rev
+
+BIT_REVERSE = bytes([_bit_reverse(i) for i in range(256)])
+CRC8_TABLE = bytes([BIT_REVERSE[_crc8_atm_bitwise(i)] for i in range(256)])
+
 #-----------------------------------------------------------------------
 # TMC_UART
 #
 # this class is used to communicate with the TMC via UART
 # it can be used to change the settings of the TMC.
 # like the current or the microsteppingmode
+#
+# all the frames and the receive buffer are allocated once here, and
+# a register read or write only fills them in, so talking to the TMC
+# doesn't allocate anything (see test_script_06_uart_benchmark.py)
 #-----------------------------------------------------------------------
 class TMC_UART:
 
     mtr_id=0
     ser = None
-    rFrame  = [0x55, 0, 0, 0  ]
-    wFrame  = [0x55, 0, 0, 0 , 0, 0, 0, 0 ]
     communication_pause = 0
     
 #-----------------------------------------------------------------------
 # constructor
+# pass in ser to talk thru something other than the board's UART
 #-----------------------------------------------------------------------
-    def __init__(self, serialport, baudrate):
-        self.ser = UART(serialport, baudrate=115200, tx=16, rx=17) 
+    def __init__(self, serialport, baudrate, ser=None):
+        if ser != None:
+            self.ser = ser
+        else:
+            self.ser = UART(serialport, baudrate=115200, tx=16, rx=17) 
         self.mtr_id=0
         self.ser.init(115200 , bits=8, parity=None, stop=1)
+
+        # sync byte, slave address, register, crc
+        self.rFrame = bytearray([0x55, 0, 0, 0])
+        # sync byte, slave address, register | write bit, 4 data bytes, crc
+        self.wFrame = bytearray([0x55, 0, 0, 0, 0, 0, 0, 0])
+        # on a read we get our own 4 byte request echoed back (single wire),
+        # then the 8 byte reply: sync, master address, register, 4 data bytes, crc
+        self.rBuf = bytearray(12)
+        self.rData = memoryview(self.rBuf)[7:11]
+        # the first n bytes of rBuf, for n = 0 to 12. the UART's readinto waits
+        # for the whole buffer to fill, so to throw away just what's waiting we
+        # need a buffer exactly that long, and slicing one each time allocates
+        rBufView = memoryview(self.rBuf)
+        self.rBufHeads = [rBufView[:n] for n in range(13)]
         #self.ser.timeout = 20000/baudrate            # adjust per baud and hardware. Sequential reads without some delay fail.
         self.communication_pause = 500/baudrate     # adjust per baud and hardware. Sequential reads without some delay fail.
 
@@ -43,48 +93,52 @@ class TMC_UART:
 
 #-----------------------------------------------------------------------
 # this function calculates the crc8 parity bit
-#-----------------------------------------------------------------------
-    def compute_crc8_atm(self, datagram, initial_value=0):
-        crc = initial_value
-        # Iterate bytes in data
-        for byte in datagram:
-            # Iterate bits in byte
-            for _ in range(0, 8):
-                if (crc >> 7) ^ (byte & 0x01):
-                    crc = ((crc << 1) ^ 0x07) & 0xFF
-                else:
-                    crc = (crc << 1) & 0xFF
-                # Shift to next bit
-                byte = byte >> 1
-        return crc
+# over the first length bytes of datagram (all of it by default)
+#-----------------------------------------------------------------------
+    def compute_crc8_atm(self, datagram, initial_value=0, length=None):
+        if length == None:
+            length = len(datagram)
+        table = CRC8_TABLE
+        crc = BIT_REVERSE[initial_value]
+        # CircuitPython turns a for over range() into a plain counter, so unlike
+        # iterating the buffer itself this doesn't allocate an iterator
+        for i in range(length):
+            crc = table[crc ^ datagram[i]]
+        return BIT_REVERSE[crc]
     
 #-----------------------------------------------------------------------
 # reads the registry on the TMC with a given address.
 # returns the binary value of that register
+# the 4 data bytes come back as a memoryview into our receive buffer,
+# so they're only good until the next read
 #-----------------------------------------------------------------------
     def read_reg(self, reg):
         
-        rtn = ""
         #self.ser.reset_output_buffer()
         #self.ser.reset_input_buffer()
+        # anything still waiting (like write_reg()'s echo) would end up in
+        # front of our reply and shift it over
+        self.flushSerialBuffer()
         
-        self.rFrame[1] = self.mtr_id
-        self.rFrame[2] = reg
-        self.rFrame[3] = self.compute_crc8_atm(self.rFrame[:-1])
+        frame = self.rFrame
+        frame[1] = self.mtr_id
+        frame[2] = reg
+        frame[3] = self.compute_crc8_atm(frame, 0, 3)
 
-        rt = self.ser.write(bytes(self.rFrame))
-        if rt != len(self.rFrame):
-            print("TMC2209: Err in write {}".format(__), file=sys.stderr)
-            return False
+        rt = self.ser.write(frame)
+        if rt != 4:
+            print("TMC2209: Err in write")
+            return b""
         time.sleep(self.communication_pause)  # adjust per baud and hardware. Sequential reads without some delay fail.
+        n = None
         if self.ser.any():
-            rtn = self.ser.read()#read what it self 
+            n = self.ser.readinto(self.rBuf)#read what it self 
         time.sleep(self.communication_pause)  # adjust per baud and hardware. Sequential reads without some delay fail.
-        if rtn == None:
+        if n == None or n < 11:
             print("TMC2209: Err in read")
-            return ""
-#         print("received "+str(len(rtn))+" bytes; "+str(len(rtn)*8)+" bits")
-        return(rtn[7:11])
+            return b""
+#         print("received "+str(n)+" bytes; "+str(n*8)+" bits")
+        return(self.rData)
 #-----------------------------------------------------------------------
 # this function tries to read the registry of the TMC 10 times
 # if a valid answer is returned, this function returns it as an integer
@@ -102,7 +156,10 @@ class TMC_UART:
                 print("TMC2209: after 10 tries not valid answer. exiting")
                 print("TMC2209: is Stepper Powersupply switched on ?")
                 raise SystemExit
-        val = struct.unpack(">i",rtn)[0]
+        # same as struct.unpack(">i",rtn)[0], but without building a tuple
+        val = (rtn[0] << 24) | (rtn[1] << 16) | (rtn[2] << 8) | rtn[3]
+        if val & 0x80000000:
+            val -= 0x100000000
         return(val)
 
 #-----------------------------------------------------------------------
@@ -116,21 +173,25 @@ class TMC_UART:
         #self.ser.reset_output_buffer()
         #self.ser.reset_input_buffer()
         
-        self.wFrame[1] = self.mtr_id
-        self.wFrame[2] =  reg | 0x80;  # set write bit
+        frame = self.wFrame
+        frame[1] = self.mtr_id
+        frame[2] =  reg | 0x80;  # set write bit
         
-        self.wFrame[3] = 0xFF & (val>>24)
-        self.wFrame[4] = 0xFF & (val>>16)
-        self.wFrame[5] = 0xFF & (val>>8)
-        self.wFrame[6] = 0xFF & val
+        frame[3] = 0xFF & (val>>24)
+        frame[4] = 0xFF & (val>>16)
+        frame[5] = 0xFF & (val>>8)
+        frame[6] = 0xFF & val
         
-        self.wFrame[7] = self.compute_crc8_atm(self.wFrame[:-1])
+        frame[7] = self.compute_crc8_atm(frame, 0, 7)
 
-        rtn = self.ser.write(bytes(self.wFrame))
-        if rtn != len(self.wFrame):
-            print("TMC2209: Err in write {}".format(__), file=sys.stderr)
+        rtn = self.ser.write(frame)
+        if rtn != 8:
+            print("TMC2209: Err in write")
             return False
         time.sleep(self.communication_pause)
+        # the single wire echoes our 8 bytes back. the TMC doesn't answer a
+        # write, so throw the echo away rather than leave it for the next read
+        self.flushSerialBuffer()
 
         return(True)
 
@@ -156,11 +217,17 @@ class TMC_UART:
             return True
 
 #-----------------------------------------------------------------------
-# this function clear the communication buffers of the Raspberry Pi
+# this function throws away whatever is waiting in the receive buffer
+# it only reads what any() says is there, so it never waits on the wire,
+# and it reads into rBuf, so it doesn't allocate
 #-----------------------------------------------------------------------
     def flushSerialBuffer(self):
         #self.ser.reset_output_buffer()
         #self.ser.reset_input_buffer()
+        n = self.ser.any()
+        while n > 0:
+            self.ser.readinto(self.rBufHeads[min(n, 12)])
+            n = self.ser.any()
         return
 
 #-----------------------------------------------------------------------